@@ -0,0 +1,84 @@
+"""Сериализация постов в JSON по одному объекту за раз.
+
+Ответ собирается генератором: список отдаётся поэлементно, и страница
+целиком в памяти не строится.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+
+JSON_OPTIONS = {"cls": DjangoJSONEncoder, "ensure_ascii": False}
+
+
+def _image(post, request):
+    if not post.image:
+        return None
+    return request.build_absolute_uri(post.image.url)
+
+
+def _url(post, request):
+    return request.build_absolute_uri(
+        reverse("posts:post_detail", kwargs={"post_id": post.pk})
+    )
+
+
+POST_FIELDS = {
+    "id": lambda post, request: post.pk,
+    "text": lambda post, request: post.text,
+    "pub_date": lambda post, request: post.pub_date,
+    "author": lambda post, request: post.author.username,
+    "group": lambda post, request: post.group.slug if post.group else None,
+    "image": _image,
+    "comments_count": lambda post, request: post.comments_count,
+    "url": _url,
+}
+
+
+def parse_fields(raw, allowed):
+    """Разбирает ?fields=id,text. Пустой параметр — все поля.
+
+    Неизвестное поле — ValueError.
+    """
+    if not raw:
+        return list(allowed)
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def serialize_post(post, fields, request):
+    return {
+        field: POST_FIELDS[field](post, request)
+        for field in fields
+        if field in POST_FIELDS
+    }
+
+
+def serialize_comment(comment):
+    return {
+        "id": comment.pk,
+        "author": comment.author.username,
+        "text": comment.text,
+        "created": comment.created,
+    }
+
+
+def _members(data):
+    return json.dumps(data, **JSON_OPTIONS)[1:-1]
+
+
+def stream_json(key, items, before=None, after=None):
+    """Отдаёт JSON-объект, в котором список key пишется по элементу.
+
+    before — поля перед списком, after — функция, возвращающая поля
+    после него: например, курсор, известный только в конце страницы.
+    """
+    head = _members(before or {})
+    yield "{" + (head + ", " if head else "") + json.dumps(key) + ": ["
+    for index, item in enumerate(items):
+        yield (", " if index else "") + json.dumps(item, **JSON_OPTIONS)
+    tail = _members(after() if after else {})
+    yield "]" + (", " + tail if tail else "") + "}"
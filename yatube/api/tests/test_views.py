@@ -0,0 +1,157 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts.models import Comment, Group, Post
+
+
+User = get_user_model()
+
+
+def read_json(response):
+    if response.streaming:
+        content = b"".join(response.streaming_content)
+    else:
+        content = response.content
+    if response.get("Content-Encoding") == "gzip":
+        content = gzip.decompress(content)
+    return json.loads(content)
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f"Текст {i}", group=cls.group)
+            for i in range(13)
+        )
+        cls.ordered = list(
+            Post.objects.order_by("-pub_date", "-pk").values_list(
+                "pk", flat=True
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_walk_by_cursor(self):
+        urls = (
+            reverse("api:index"),
+            reverse("api:group_list", kwargs={"slug": self.group.slug}),
+            reverse("api:profile", kwargs={"username": self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = read_json(self.client.get(url))
+                ids = [post["id"] for post in data["results"]]
+                self.assertEqual(ids, self.ordered[:10])
+                data = read_json(self.client.get(data["next"]))
+                ids = [post["id"] for post in data["results"]]
+                self.assertEqual(ids, self.ordered[10:])
+                self.assertIsNone(data["next"])
+
+    def test_sparse_fields_and_limit(self):
+        response = self.client.get(
+            reverse("api:index"), {"fields": "id,text", "limit": 2}
+        )
+        data = read_json(response)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(set(data["results"][0]), {"id", "text"})
+        self.assertIn("limit=2", data["next"])
+
+    def test_bad_parameters(self):
+        for params in (
+            {"fields": "id,password"},
+            {"limit": 0},
+            {"limit": "many"},
+            {"cursor": "garbage"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse("api:index"), params)
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("api:group_list", kwargs={"slug": "missing"})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_etag_not_modified_with_one_key_query(self):
+        url = reverse("api:index")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with run_on_commit():
+            Post.objects.create(author=self.user, text="Новый пост")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_edit_changes_etag(self):
+        url = reverse("api:post_detail", kwargs={"post_id": self.ordered[0]})
+        etag = self.client.get(url)["ETag"]
+        post = Post.objects.get(pk=self.ordered[0])
+        post.text = "Исправленный текст"
+        with run_on_commit():
+            post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_json(response)["text"], "Исправленный текст")
+
+    def test_etag_does_not_depend_on_cache(self):
+        url = reverse("api:post_detail", kwargs={"post_id": self.ordered[0]})
+        etag = self.client.get(url)["ETag"]
+        # Правка в другом процессе не меняет кэш этого процесса.
+        Post.objects.filter(pk=self.ordered[0]).update(
+            text="Другой процесс", version=F("version") + 1
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_json(response)["text"], "Другой процесс")
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip(self):
+        response = self.client.get(
+            reverse("api:index"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith("W/"))
+        self.assertEqual(len(read_json(response)["results"]), 10)
+
+    def test_post_detail_streams_comments(self):
+        post = Post.objects.get(pk=self.ordered[0])
+        Comment.objects.create(post=post, author=self.user, text="Первый")
+        Comment.objects.create(post=post, author=self.user, text="Второй")
+        url = reverse("api:post_detail", kwargs={"post_id": post.pk})
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        data = read_json(response)
+        self.assertEqual(data["id"], post.pk)
+        self.assertEqual(data["group"], self.group.slug)
+        self.assertEqual(data["comments_count"], 2)
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]],
+            ["Первый", "Второй"],
+        )
+        data = read_json(self.client.get(url, {"fields": "text"}))
+        self.assertEqual(data, {"text": post.text})
+
+    def test_feed_page_query_count(self):
+        # Ключи страницы для ETag и сами посты.
+        with self.assertNumQueries(2):
+            read_json(self.client.get(reverse("api:index")))
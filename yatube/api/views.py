@@ -0,0 +1,184 @@
+"""Лёгкий JSON API лент поверх тех же querysets, что и HTML-страницы.
+
+Ленты листаются курсором вперёд (?cursor=, ?limit=), поля выбираются
+через ?fields=. ETag строится из самих данных страницы: id и версий
+её постов (версия меняется при правке поста, его комментариях, смене
+имени автора и группы). Поколения posts.page_cache для этого не годятся:
+кэш по умолчанию у каждого процесса свой. Ответ 304 стоит одного
+лёгкого запроса ключей страницы.
+"""
+import hashlib
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from posts.models import Group, Post, User
+from posts.utils import CursorPaginator
+from .serializers import (
+    POST_FIELDS,
+    parse_fields,
+    serialize_comment,
+    serialize_post,
+    stream_json,
+)
+
+CONTENT_TYPE = "application/json"
+
+
+def error(message, status=400):
+    return JsonResponse({"detail": message}, status=status)
+
+
+def _etag(request, versions):
+    """ETag по парам (id, версия) отдаваемых постов и адресу запроса."""
+    raw = f"{list(versions)}:{request.get_full_path()}"
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _not_modified(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
+def _limit(request):
+    raw = request.GET.get("limit")
+    if raw is None:
+        return settings.NUMBER_POSTS
+    message = f"limit должен быть от 1 до {settings.API_MAX_PAGE_SIZE}"
+    if not raw.isdigit():
+        raise ValueError(message)
+    limit = int(raw)
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise ValueError(message)
+    return limit
+
+
+def _position(request):
+    cursor = request.GET.get("cursor")
+    if not cursor:
+        return None
+    position = CursorPaginator.decode_cursor(cursor)
+    if position is None or position[2] != CursorPaginator.NEXT:
+        raise ValueError("Неверный курсор")
+    return position[:2]
+
+
+def _stream(content, etag):
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPE)
+    response["ETag"] = etag
+    return response
+
+
+def feed_response(request, get_queryset):
+    """Страница ленты; get_queryset возвращает None, если ленты нет."""
+    try:
+        fields = parse_fields(request.GET.get("fields"), POST_FIELDS)
+        limit = _limit(request)
+        position = _position(request)
+    except ValueError as exc:
+        return error(str(exc))
+
+    queryset = get_queryset()
+    if queryset is None:
+        return error("Не найдено", status=404)
+    if position is None:
+        queryset = queryset.order_by("-pub_date", "-pk")
+    else:
+        queryset = CursorPaginator.after(queryset, *position)
+    # Лишняя запись входит в ключ: от неё зависит ссылка next.
+    etag = _etag(request, queryset.values_list("pk", "version")[:limit + 1])
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    return _stream(page_content(request, queryset, limit, fields), etag)
+
+
+def page_content(request, queryset, limit, fields):
+    state = {"last": None, "has_next": False}
+
+    def items():
+        # Лишняя запись только показывает, что есть следующая страница.
+        for index, post in enumerate(queryset[:limit + 1].iterator()):
+            if index == limit:
+                state["has_next"] = True
+                return
+            state["last"] = post
+            yield serialize_post(post, fields, request)
+
+    def pagination():
+        if not state["has_next"]:
+            return {"next": None}
+        query = request.GET.copy()
+        query["cursor"] = CursorPaginator.encode_cursor(
+            state["last"], CursorPaginator.NEXT
+        )
+        return {"next": request.build_absolute_uri(f"?{query.urlencode()}")}
+
+    return stream_json("results", items(), after=pagination)
+
+
+@gzip_page
+@require_safe
+def index(request):
+    return feed_response(request, Post.objects.feed)
+
+
+@gzip_page
+@require_safe
+def group_posts(request, slug):
+    def get_queryset():
+        group = Group.objects.filter(slug=slug).first()
+        return group.posts.feed() if group else None
+
+    return feed_response(request, get_queryset)
+
+
+@gzip_page
+@require_safe
+def profile(request, username):
+    def get_queryset():
+        author = User.objects.filter(username=username).first()
+        return author.posts.feed() if author else None
+
+    return feed_response(request, get_queryset)
+
+
+@gzip_page
+@require_safe
+def post_detail(request, post_id):
+    allowed = [*POST_FIELDS, "comments"]
+    try:
+        fields = parse_fields(request.GET.get("fields"), allowed)
+    except ValueError as exc:
+        return error(str(exc))
+    # Комментарии меняют версию поста вместе со счётчиком.
+    versions = list(
+        Post.objects.filter(pk=post_id).values_list("pk", "version")
+    )
+    if not versions:
+        return error("Не найдено", status=404)
+    etag = _etag(request, versions)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    post = Post.objects.feed().filter(pk=post_id).first()
+    if post is None:
+        return error("Не найдено", status=404)
+    data = serialize_post(post, fields, request)
+    if "comments" not in fields:
+        response = JsonResponse(
+            data, json_dumps_params={"ensure_ascii": False}
+        )
+        response["ETag"] = etag
+        return response
+    comments = post.comments.select_related("author").iterator()
+    content = stream_json(
+        "comments", map(serialize_comment, comments), before=data
+    )
+    return _stream(content, etag)
@@ -0,0 +1,218 @@
+"""ASGI-вход для Django 2.2 без сторонних пакетов.
+
+В Django 2.2 нет ни асинхронных view, ни асинхронно-безопасного ORM,
+поэтому ASGIHandler не переписывает view, а переносит их с цикла
+событий в пул из ASGI_THREADS потоков. Цикл событий (uvicorn, daphne,
+hypercorn) держит тысячи соединений, а медленный запрос занимает
+только свой поток пула.
+
+Запрос от начала до конца — вызов view, чтение тела ответа и его
+закрытие с сигналом request_finished — идёт в одном потоке: соединения
+с базой, закрепление за основной базой (core.routing) и замеры
+(core.perf) живут в локальном хранилище потока. Куски потокового
+ответа передаются в цикл через ограниченную очередь.
+
+Если задачу запроса отменили (сервер закрывает соединения), цикл
+очередь больше не читает: поток пула замечает флаг отмены, пока ждёт
+места в очереди, закрывает ответ и освобождается.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+_END = object()
+# Как часто поток пула, ждущий места в очереди, проверяет отмену.
+STOP_POLL_SECONDS = 0.5
+
+
+class Cancelled(Exception):
+    """Запрос отменён: отдавать ответ больше некому."""
+
+
+def build_environ(scope, body):
+    """WSGI environ по ASGI scope запроса."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        # WSGI ждёт байты пути в строке latin-1.
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": str(client[0]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", ()):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = environ[name] + separator + value
+        environ[name] = value
+    # Тело уже прочитано целиком. Без Content-Length (chunked, HTTP/2)
+    # WSGIRequest прочёл бы 0 байт и потерял данные POST.
+    body.seek(0, os.SEEK_END)
+    environ["CONTENT_LENGTH"] = str(body.tell())
+    body.seek(0)
+    return environ
+
+
+class ASGIHandler:
+    """ASGI 3 приложение поверх WSGI-обработчика Django."""
+
+    def __init__(self, wsgi_application=None):
+        self.wsgi_application = wsgi_application or get_wsgi_application()
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_THREADS, thread_name_prefix="asgi"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Неподдерживаемый тип ASGI: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return None
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                body.seek(0)
+                return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=settings.ASGI_RESPONSE_QUEUE_SIZE)
+        stopped = threading.Event()
+
+        def put(item):
+            if stopped.is_set():
+                raise Cancelled
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=STOP_POLL_SECONDS)
+                except TimeoutError:
+                    if stopped.is_set():
+                        future.cancel()
+                        raise Cancelled
+
+        worker = loop.run_in_executor(
+            self.executor, self.run, build_environ(scope, body), put
+        )
+        ended = [False]
+        try:
+            await self.relay(queue, send, ended)
+            await worker
+        except asyncio.CancelledError:
+            # Очередь больше никто не прочтёт: поток бросит put по флагу.
+            stopped.set()
+            raise
+        finally:
+            # Клиент ушёл — поток пула ещё пишет в очередь.
+            if not stopped.is_set():
+                await self.drain(queue, ended, worker, stopped)
+
+    async def drain(self, queue, ended, worker, stopped):
+        """Дочитывает очередь, чтобы поток пула закрыл ответ."""
+        try:
+            while not ended[0]:
+                ended[0] = await queue.get() is _END
+            await worker
+        except asyncio.CancelledError:
+            stopped.set()
+            raise
+
+    def run(self, environ, put):
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            start["status"] = int(status.split(" ", 1)[0])
+            start["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+
+        try:
+            try:
+                result = self.wsgi_application(environ, start_response)
+                try:
+                    put(start)
+                    for chunk in result:
+                        if chunk:
+                            put(chunk)
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+            finally:
+                put(_END)
+        except Cancelled:
+            pass
+        finally:
+            # Тело закрывает поток: после отмены view ещё может его читать.
+            environ["wsgi.input"].close()
+
+    async def relay(self, queue, send, ended):
+        """Передаёт ответ из очереди; ended[0] — очередь дочитана."""
+        start = await queue.get()
+        if start is _END:
+            ended[0] = True
+            return
+        await send(
+            {
+                "type": "http.response.start",
+                "status": start["status"],
+                "headers": start["headers"],
+            }
+        )
+        while True:
+            chunk = await queue.get()
+            if chunk is _END:
+                ended[0] = True
+                break
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": True,
+                }
+            )
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,221 @@
+"""Бэкенды кэша со счётчиками попаданий, промахов и вытеснений.
+
+FileBasedCache — общий кэш для всех воркеров одной машины без внешних
+сервисов. TieredCache добавляет перед ним ограниченный по размеру LRU
+в памяти процесса (L1) с коротким таймаутом: запись сбрасывает L1 только
+в своём процессе, поэтому соседние воркеры видят изменение не позже
+чем через L1_TIMEOUT секунд.
+"""
+import time
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased, locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import perf
+
+_MISSING = object()
+_stats = {}
+_stats_lock = Lock()
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = Counter()
+
+    def incr(self, name, delta=1):
+        if delta:
+            with self._lock:
+                self._counters[name] += delta
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+def get_stats(name):
+    """Счётчики кэша общие для всех потоков процесса."""
+    with _stats_lock:
+        return _stats.setdefault(name, CacheStats())
+
+
+def all_stats():
+    return {name: stats.snapshot() for name, stats in _stats.items()}
+
+
+class StatsMixin:
+    def _init_stats(self, name):
+        self.stats = get_stats(f"{type(self).__name__}:{name}")
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.stats.incr("misses")
+            perf.record_cache(misses=1)
+            return default
+        self.stats.incr("hits")
+        perf.record_cache(hits=1)
+        return value
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._init_stats(name)
+
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        self.stats.incr("evictions", before - len(self._cache))
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._init_stats(dir)
+
+    def _cull(self):
+        before = len(self._list_cache_files())
+        super()._cull()
+        self.stats.incr("evictions", before - len(self._list_cache_files()))
+
+
+_l1_caches = {}
+_l1_locks = {}
+
+
+class TieredCache(BaseCache):
+    """L1 — LRU в памяти процесса, L2 — кэш из settings.CACHES[L2].
+
+    OPTIONS: L2 (алиас общего кэша), L1_MAX_ENTRIES, L1_TIMEOUT.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = options.get("L2", "shared")
+        self._l1_max_entries = int(options.get("L1_MAX_ENTRIES", 1000))
+        self._l1_timeout = float(options.get("L1_TIMEOUT", 5))
+        self._l1 = _l1_caches.setdefault(name, OrderedDict())
+        self._lock = _l1_locks.setdefault(name, Lock())
+        self.stats = get_stats(f"{type(self).__name__}:{name}")
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return value
+
+    def _l1_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._l1_timeout
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            ttl = min(ttl, timeout - time.time())
+        if ttl <= 0:
+            return self._l1_delete(key)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, value)
+            self._l1.move_to_end(key)
+            evicted = 0
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+                evicted += 1
+        self.stats.incr("l1_evictions", evicted)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_key(key, version=version)
+        value = self._l1_get(l1_key)
+        if value is not _MISSING:
+            self.stats.incr("l1_hits")
+            perf.record_cache(hits=1)
+            return value
+        # Промахи и попадания L2 считает сам L2.
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.stats.incr("misses")
+            return default
+        self.stats.incr("l2_hits")
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        rest = []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version=version))
+            if value is _MISSING:
+                rest.append(key)
+            else:
+                found[key] = value
+        self.stats.incr("l1_hits", len(found))
+        perf.record_cache(hits=len(found))
+        if rest:
+            from_l2 = self.l2.get_many(rest, version=version)
+            self.stats.incr("l2_hits", len(from_l2))
+            self.stats.incr("misses", len(rest) - len(from_l2))
+            for key, value in from_l2.items():
+                self._l1_set(self.make_key(key, version=version), value)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version=version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._l1_set(self.make_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self.make_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self.make_key(key, version=version))
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version=version))
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_key(key, version=version))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
@@ -0,0 +1,28 @@
+import functools
+
+from django.urls import get_script_prefix, reverse
+
+# Ссылки шапки без параметров: ключ в шаблоне -> имя маршрута.
+NAV_VIEWS = {
+    "index": "posts:index",
+    "author": "about:author",
+    "tech": "about:tech",
+    "post_create": "posts:post_create",
+    "follow": "posts:follow_index",
+    "password_change": "password_change",
+    "logout": "users:logout",
+    "login": "users:login",
+    "signup": "users:signup",
+    "search": "posts:search",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def nav_urls(script_prefix):
+    """Адреса ссылок шапки; reverse выполняется раз на процесс."""
+    return {key: reverse(name) for key, name in NAV_VIEWS.items()}
+
+
+def nav(request):
+    """Добавляет готовые адреса навигации вместо {% url %} в шапке."""
+    return {"nav": nav_urls(get_script_prefix())}
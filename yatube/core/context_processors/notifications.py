@@ -0,0 +1,9 @@
+from posts import notifications
+
+
+def unread_posts(request):
+    """Добавляет число новых постов в подписках пользователя."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"unread_posts": 0}
+    return {"unread_posts": notifications.unread_count(user)}
@@ -0,0 +1,100 @@
+"""Настройка соединений SQLite и запись с повтором при блокировке.
+
+На каждое новое соединение SQLite выполняются PRAGMA из SQLITE_PRAGMAS:
+в профиле production это WAL (читатели не ждут писателя), synchronous
+NORMAL, mmap и кэш страниц побольше и busy_timeout — сколько ждать
+занятую базу, прежде чем вернуть "database is locked".
+
+В WAL писатель всё равно один. Транзакция, которая начала с чтения,
+получает блокировку сразу, без ожидания, если базу успели изменить
+после её снимка. Поэтому write_transaction открывает транзакцию через
+BEGIN IMMEDIATE: блокировка записи берётся в самом начале, занятую
+базу ждёт busy_timeout, а при "database is locked" с паузой повторяется
+только BEGIN — код транзакции ещё не выполнялся, и его побочные
+действия (файлы, кэш) не повторяются. Записи из потоков одного
+процесса идут по очереди. Работу с файлами и рендеринг пишущие view
+делают вне write_transaction.
+"""
+import functools
+import random
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from threading import RLock
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Повторный вход — из on_commit, который выполняется при выходе из блока.
+_write_lock = RLock()
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def is_locked(error):
+    return "database is locked" in str(error)
+
+
+def _begin_immediate(connection):
+    connection.cursor().execute("BEGIN IMMEDIATE")
+
+
+@contextmanager
+def _immediate(connection):
+    """atomic внутри блока начинает транзакцию с BEGIN IMMEDIATE."""
+    connection._start_transaction_under_autocommit = functools.partial(
+        _begin_immediate, connection
+    )
+    try:
+        yield
+    finally:
+        del connection._start_transaction_under_autocommit
+
+
+def write_transaction(func=None, using=None):
+    """transaction.atomic для записей, ждущий блокировку SQLite заранее.
+
+    Повторяется только BEGIN IMMEDIATE, сама func выполняется один раз.
+    Вложенный блок и другие базы — обычный transaction.atomic.
+    """
+    if func is None:
+        return functools.partial(write_transaction, using=using)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        connection = connections[using or "default"]
+        if connection.vendor != "sqlite" or connection.in_atomic_block:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        with _serialized(), ExitStack() as stack:
+            for attempt in range(settings.SQLITE_WRITE_RETRIES + 1):
+                try:
+                    with _immediate(connection):
+                        stack.enter_context(transaction.atomic(using=using))
+                    break
+                except OperationalError as error:
+                    if (
+                        not is_locked(error)
+                        or attempt == settings.SQLITE_WRITE_RETRIES
+                    ):
+                        raise
+                # Случайная добавка разводит повторы соседних процессов.
+                delay = settings.SQLITE_WRITE_RETRY_DELAY * 2 ** attempt
+                time.sleep(delay * (1 + random.random()))
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _serialized():
+    if settings.SQLITE_SERIALIZE_WRITES:
+        return _write_lock
+    return nullcontext()
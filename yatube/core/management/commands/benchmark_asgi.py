@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.asgi import ASGIHandler
+from posts import benchmark
+
+READ_VIEWS = (
+    "posts:index",
+    "posts:group_list",
+    "posts:profile",
+    "posts:post_detail",
+    "posts:follow_index",
+)
+
+
+def slowed(application, delay):
+    """WSGI-приложение, которое перед ответом ждёт delay секунд.
+
+    Так изображается медленный ввод-вывод: миниатюра, внешний сервис.
+    """
+
+    def wrapper(environ, start_response):
+        time.sleep(delay)
+        return application(environ, start_response)
+
+    return wrapper
+
+
+async def fetch(app, path, cookie):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie)],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0] if status else None
+
+
+async def load(app, urls, cookie, concurrency, total):
+    """concurrency клиентов по очереди берут адреса, пока не сделают total."""
+    queue = asyncio.Queue()
+    for number in range(total):
+        queue.put_nowait(urls[number % len(urls)])
+    latencies = []
+    errors = [0]
+
+    async def client():
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            status = await fetch(app, path, cookie)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "rps": total / elapsed,
+        "p50_ms": benchmark.percentile(latencies, 50) * 1000,
+        "p95_ms": benchmark.percentile(latencies, 95) * 1000,
+        "errors": errors[0],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает ASGI-вход (core.asgi) изнутри процесса: несколько "
+        "одновременных клиентов гоняют ленты и страницу поста. Печатает "
+        "запросы в секунду и задержки для каждой степени параллельности."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            action="append",
+            help="Число одновременных клиентов (по умолчанию 1, 4 и 16).",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--delay-ms",
+            type=float,
+            default=0,
+            help="Добавить к каждому запросу ожидание ввода-вывода.",
+        )
+        parser.add_argument(
+            "--page-cache",
+            action="store_true",
+            help="Не выключать кэш страниц для анонимных.",
+        )
+
+    def handle(self, *args, **options):
+        client = Client()
+        client.force_login(benchmark.viewer())
+        cookie = "; ".join(
+            f"{name}={morsel.value}" for name, morsel in client.cookies.items()
+        ).encode()
+        urls = [
+            url
+            for name, url in benchmark.discover(("posts.urls",))
+            if name in READ_VIEWS
+        ]
+        app = ASGIHandler(
+            slowed(get_wsgi_application(), options["delay_ms"] / 1000)
+        )
+        self.stdout.write("клиентов  запросов/с  p50, мс  p95, мс  ошибок")
+        # Под нагрузкой запросы ждут GIL, и журнал медленных запросов
+        # со своими EXPLAIN только исказил бы замер.
+        with override_settings(
+            PAGE_CACHE_ENABLED=options["page_cache"], QUERY_LOG_ENABLED=False
+        ):
+            for concurrency in options["concurrency"] or (1, 4, 16):
+                row = asyncio.run(
+                    load(app, urls, cookie, concurrency, options["requests"])
+                )
+                self.stdout.write(
+                    f"{concurrency:>8}  {row['rps']:>10.1f}  "
+                    f"{row['p50_ms']:>7.1f}  {row['p95_ms']:>7.1f}  "
+                    f"{row['errors']:>6}"
+                )
+        app.executor.shutdown()
@@ -0,0 +1,193 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+from core import db
+
+SCHEMA = (
+    "CREATE TABLE bench_post (id INTEGER PRIMARY KEY, text TEXT, "
+    "pub_date REAL, comments_count INTEGER DEFAULT 0)",
+    "CREATE TABLE bench_comment (id INTEGER PRIMARY KEY, post_id INTEGER, "
+    "text TEXT, created REAL)",
+    "CREATE INDEX bench_post_date ON bench_post (pub_date)",
+    "CREATE INDEX bench_comment_post ON bench_comment (post_id, created)",
+)
+FEED = (
+    "SELECT id, text, comments_count FROM bench_post "
+    "ORDER BY pub_date DESC LIMIT 10"
+)
+COMMENTS = (
+    "SELECT id, text FROM bench_comment WHERE post_id = %s "
+    "ORDER BY created DESC LIMIT 20"
+)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняет читателей и писателей в потоках на временной базе SQLite "
+        "в каждом профиле SQLITE_PROFILES и печатает пропускную "
+        "способность и число ошибок \"database is locked\". Запись похожа "
+        "на add_comment: чтение поста, вставка и обновление счётчика."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=5.0)
+        parser.add_argument("--posts", type=int, default=1000)
+        parser.add_argument(
+            "--profile",
+            choices=list(settings.SQLITE_PROFILES),
+            action="append",
+            help="Профиль из SQLITE_PROFILES (по умолчанию все).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'профиль':<12}  чтений/с  записей/с  блокировок  "
+            "запись p95, мс"
+        )
+        for profile in options["profile"] or settings.SQLITE_PROFILES:
+            row = self.run_profile(profile, options)
+            self.stdout.write(
+                f"{profile:<12}  {row['reads']:>8.0f}  {row['writes']:>9.0f}"
+                f"  {row['locked']:>10}  {row['write_p95_ms']:>14.1f}"
+            )
+
+    def run_profile(self, profile, options):
+        directory = tempfile.mkdtemp()
+        alias = f"benchmark_{profile}"
+        connections.databases[alias] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(directory, "bench.sqlite3"),
+        }
+        production = profile == "production"
+        try:
+            with override_settings(
+                SQLITE_PRAGMAS=settings.SQLITE_PROFILES[profile],
+                SQLITE_SERIALIZE_WRITES=production,
+            ):
+                self.prepare(alias, options["posts"])
+                return self.race(alias, production, options)
+        finally:
+            connections[alias].close()
+            del connections.databases[alias]
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def prepare(self, alias, posts):
+        now = time.time()
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                cursor.executemany(
+                    "INSERT INTO bench_post (text, pub_date) VALUES (%s, %s)",
+                    [(f"Пост {i}", now - i) for i in range(posts)],
+                )
+
+    def race(self, alias, production, options):
+        if production:
+            write = db.write_transaction(add_comment, using=alias)
+        else:
+            write = transaction.atomic(using=alias)(add_comment)
+        return Race(alias, write, options).run(
+            options["readers"], options["writers"]
+        )
+
+
+def add_comment(cursor, post_id):
+    cursor.execute("SELECT id FROM bench_post WHERE id = %s", [post_id])
+    cursor.fetchone()
+    cursor.execute(
+        "INSERT INTO bench_comment (post_id, text, created) "
+        "VALUES (%s, %s, %s)",
+        [post_id, "Комментарий", time.time()],
+    )
+    cursor.execute(
+        "UPDATE bench_post SET comments_count = comments_count + 1 "
+        "WHERE id = %s",
+        [post_id],
+    )
+
+
+class Race:
+    """Читатели и писатели в потоках до истечения duration секунд."""
+
+    def __init__(self, alias, write, options):
+        self.alias = alias
+        self.write = write
+        self.posts = options["posts"]
+        self.deadline = time.perf_counter() + options["duration"]
+        self.totals = {"reads": 0, "writes": 0, "locked": 0}
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def reader(self, rnd):
+        done = 0
+        with connections[self.alias].cursor() as cursor:
+            while time.perf_counter() < self.deadline:
+                cursor.execute(FEED)
+                cursor.fetchall()
+                cursor.execute(COMMENTS, [rnd.randint(1, self.posts)])
+                cursor.fetchall()
+                done += 1
+        connections[self.alias].close()
+        with self.lock:
+            self.totals["reads"] += done
+
+    def writer(self, rnd):
+        done = locked = 0
+        spent = []
+        with connections[self.alias].cursor() as cursor:
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    self.write(cursor, rnd.randint(1, self.posts))
+                except OperationalError as error:
+                    if not db.is_locked(error):
+                        raise
+                    locked += 1
+                    continue
+                spent.append(time.perf_counter() - start)
+                done += 1
+        connections[self.alias].close()
+        with self.lock:
+            self.totals["writes"] += done
+            self.totals["locked"] += locked
+            self.latencies.extend(spent)
+
+    def run(self, readers, writers):
+        threads = [
+            threading.Thread(target=self.reader, args=(random.Random(i),))
+            for i in range(readers)
+        ] + [
+            threading.Thread(target=self.writer, args=(random.Random(-i),))
+            for i in range(1, writers + 1)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            "reads": self.totals["reads"] / elapsed,
+            "writes": self.totals["writes"] / elapsed,
+            "locked": self.totals["locked"],
+            "write_p95_ms": percentile(self.latencies, 95) * 1000,
+        }
@@ -0,0 +1,63 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер очереди задач core.tasks. Процессов можно запустить "
+        "несколько: задачи между ними не повторяются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и выйти.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.TASKS_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=settings.TASKS_POLL_INTERVAL,
+            help="Пауза в секундах, когда задач нет.",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Текущая пачка дорабатывается, новая уже не берётся.
+        previous = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            done = self.work(options)
+        finally:
+            for signum, action in previous.items():
+                signal.signal(signum, action)
+        self.stdout.write(f"Обработано задач: {done}")
+
+    def work(self, options):
+        done = 0
+        while not self.stopping:
+            count = tasks.run_batch(options["batch_size"])
+            done += count
+            if count:
+                continue
+            tasks.purge()
+            if options["once"]:
+                break
+            # Постоянное соединение не держит читающую транзакцию в паузе.
+            connection.close()
+            time.sleep(options["sleep"])
+        return done
+
+    def stop(self, signum, frame):
+        self.stopping = True
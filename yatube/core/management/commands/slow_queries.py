@@ -0,0 +1,54 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import querylog
+
+
+class Command(BaseCommand):
+    help = (
+        "Печатает самые дорогие медленные SQL-запросы из журнала "
+        "QUERY_LOG_FILE, сгруппированные по отпечатку, с view и планом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=settings.QUERY_LOG_FILE,
+            help="Файл журнала.",
+        )
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--view", help="Только запросы этого view.")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Очистить журнал после отчёта.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        if not path or not os.path.exists(path):
+            raise CommandError(f"Журнал медленных запросов не найден: {path}")
+        groups = querylog.summarize(
+            querylog.read_log(path), options["view"], options["top"]
+        )
+        if not groups:
+            self.stdout.write("Медленных запросов нет")
+        for number, group in enumerate(groups, 1):
+            views = ", ".join(
+                f"{view} ({count})"
+                for view, count in sorted(
+                    group["views"].items(), key=lambda item: -item[1]
+                )
+            )
+            self.stdout.write(
+                f"\n#{number}  {group['count']} раз, всего "
+                f"{group['total_ms']:.1f} мс, максимум "
+                f"{group['max_ms']:.1f} мс\nview: {views}\n"
+                f"{group['fingerprint']}"
+            )
+            for line in group["plan"] or ():
+                self.stdout.write(f"  {line}")
+        if options["clear"]:
+            open(path, "w").close()
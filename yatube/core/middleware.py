@@ -0,0 +1,110 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import perf, querylog, routing
+
+logger = logging.getLogger("core.perf")
+
+
+def server_timing(values):
+    return ", ".join(
+        [
+            f'db;dur={values["db_ms"]:.1f};desc="{values["db_queries"]} q"',
+            f'tpl;dur={values["render_ms"]:.1f}',
+            f'cache;desc="{values["cache_hits"]} hit '
+            f'{values["cache_misses"]} miss"',
+            f'thumb;dur={values["thumbnail_ms"]:.1f}',
+            f'total;dur={values["total_ms"]:.1f}',
+        ]
+    )
+
+
+class PerformanceMiddleware:
+    """Метрики запроса: заголовок Server-Timing, строка лога в JSON
+    и гистограммы процесса по имени view (core.perf).
+
+    Время считается до возврата ответа: тело потоковых ответов
+    отдаётся уже после замера. Обёртка журнала медленных запросов
+    (core.querylog) стоит снаружи: её EXPLAIN не входит во время SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        perf.install_template_timer()
+
+    def __call__(self, request):
+        if not settings.PERF_INSTRUMENTATION:
+            return self.get_response(request)
+        with perf.collect() as metrics, ExitStack() as stack:
+            for connection in connections.all():
+                if settings.QUERY_LOG_ENABLED:
+                    stack.enter_context(
+                        connection.execute_wrapper(querylog.wrapper)
+                    )
+                stack.enter_context(
+                    connection.execute_wrapper(perf.db_wrapper)
+                )
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else "unresolved"
+        values = metrics.as_dict()
+        perf.observe(view_name, values)
+        if settings.PERF_SERVER_TIMING:
+            response["Server-Timing"] = server_timing(values)
+        level = (
+            logging.INFO
+            if values["total_ms"] >= settings.PERF_SLOW_REQUEST_MS
+            else logging.DEBUG
+        )
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                json.dumps(
+                    {
+                        "view": view_name,
+                        "method": request.method,
+                        "status": response.status_code,
+                        **{
+                            key: round(value, 2)
+                            for key, value in values.items()
+                        },
+                    }
+                ),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = perf.current()
+        if metrics is not None:
+            metrics.view_name = request.resolver_match.view_name
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет браузер за основной базой после его записи.
+
+    Стоит перед SessionMiddleware, чтобы заметить и запись сессии
+    при входе на сайт (core.routing).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = routing.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.end()
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
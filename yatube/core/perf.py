@@ -0,0 +1,205 @@
+"""Замеры запросов: SQL, шаблоны, кэш и построение миниатюр.
+
+PerformanceMiddleware заводит на запрос RequestMetrics в локальном
+хранилище потока. Счётчики пополняют обёртка SQL (execute_wrapper),
+обёртка Template.render, кэши core.cache и posts.thumbnails. Вне запроса
+current() возвращает None, и обёртки ничего не делают, кроме одной
+проверки.
+
+Гистограммы копятся в памяти процесса по имени view: у каждого
+воркера свои, сбрасываются при перезапуске.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.template.base import Template
+
+# Верхние границы корзин гистограмм в миллисекундах (или штуках).
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    __slots__ = (
+        "started",
+        "view_name",
+        "db_queries",
+        "db_time",
+        "render_time",
+        "render_depth",
+        "cache_hits",
+        "cache_misses",
+        "thumbnail_time",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.thumbnail_time = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        """Итог запроса: времена в миллисекундах."""
+        return {
+            "total_ms": self.elapsed() * 1000,
+            "db_queries": self.db_queries,
+            "db_ms": self.db_time * 1000,
+            "render_ms": self.render_time * 1000,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "thumbnail_ms": self.thumbnail_time * 1000,
+        }
+
+
+def current():
+    return getattr(_local, "metrics", None)
+
+
+@contextmanager
+def collect():
+    """Собирает метрики кода внутри блока в новый RequestMetrics."""
+    previous = current()
+    metrics = _local.metrics = RequestMetrics()
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: время и число запросов."""
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def record_cache(hits=0, misses=0):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def thumbnail_timer():
+    """Время построения миниатюр: в запрос и в гистограмму процесса.
+
+    Миниатюры строятся и в фоновых потоках, где запроса нет, поэтому
+    время всегда попадает в гистограмму "thumbnails".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spent = time.perf_counter() - start
+        metrics = current()
+        if metrics is not None:
+            metrics.thumbnail_time += spent
+        observe("thumbnails", {"thumbnail_ms": spent * 1000})
+
+
+def _timed_render(original):
+    def render(self, context):
+        metrics = current()
+        if metrics is None:
+            return original(self, context)
+        # Вложенные шаблоны входят во время внешнего.
+        metrics.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render_time += time.perf_counter() - start
+
+    render.perf_timed = True
+    return render
+
+
+def install_template_timer():
+    if not getattr(Template.render, "perf_timed", False):
+        Template.render = _timed_render(Template.render)
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попал квантиль q."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else None
+        return None
+
+    def snapshot(self):
+        labels = [f"<={bound}" for bound in BUCKETS] + [f">{BUCKETS[-1]}"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {
+                label: count
+                for label, count in zip(labels, self.buckets)
+                if count
+            },
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(view_name, values):
+    """Добавляет значения метрик запроса в гистограммы view."""
+    with _histograms_lock:
+        histograms = _histograms.setdefault(view_name, {})
+        for name, value in values.items():
+            histograms.setdefault(name, Histogram()).add(value)
+
+
+def snapshot():
+    with _histograms_lock:
+        return {
+            view_name: {
+                name: histogram.snapshot()
+                for name, histogram in histograms.items()
+            }
+            for view_name, histograms in _histograms.items()
+        }
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
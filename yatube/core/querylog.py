@@ -0,0 +1,201 @@
+"""Журнал медленных SQL-запросов и сводка по отпечаткам запросов.
+
+PerformanceMiddleware оборачивает соединения в wrapper. Каждый запрос
+помечается именем view, в котором он выполнен, и сводится к отпечатку:
+литералы, параметры и списки IN заменены на "?". Время по отпечаткам
+копится в памяти процесса, хранятся только QUERY_LOG_FINGERPRINTS самых
+дорогих по суммарному времени.
+
+Запросы дольше QUERY_LOG_SLOW_MS пишутся в лог core.querylog и строкой
+JSON в QUERY_LOG_FILE вместе с планом EXPLAIN QUERY PLAN. Параметры
+запроса в журнал не попадают. Сводку по файлу печатает
+manage.py slow_queries, по памяти процесса — /stats/queries/.
+"""
+import json
+import logging
+import re
+import time
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from core import perf
+
+logger = logging.getLogger("core.querylog")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Текст запроса без значений: одинаковый для запросов одной формы."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class QueryStats:
+    __slots__ = ("count", "total", "slowest", "views")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.views = {}
+
+    def add(self, duration, view_name):
+        self.count += 1
+        self.total += duration
+        self.slowest = max(self.slowest, duration)
+        view_name = view_name or "-"
+        self.views[view_name] = self.views.get(view_name, 0) + 1
+
+
+_stats = {}
+_stats_lock = Lock()
+_file_lock = Lock()
+
+
+def _trim():
+    # Отпечатки вытесняются пачкой, чтобы сортировка шла редко.
+    keep = sorted(_stats.items(), key=lambda item: -item[1].total)
+    _stats.clear()
+    _stats.update(keep[: settings.QUERY_LOG_FINGERPRINTS // 2 or 1])
+
+
+def explain(connection, sql, params):
+    """Строки плана запроса или None, если план не получить.
+
+    Курсор берётся мимо обёрток Django: план не попадает в замеры
+    и в connection.queries. Ошибки драйвера приводятся к DatabaseError
+    Django явно, иначе упавший EXPLAIN сломал бы сам запрос.
+    """
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    try:
+        with connection.wrap_database_errors:
+            prefix = connection.ops.explain_query_prefix()
+            cursor = connection.create_cursor()
+            try:
+                cursor.execute(f"{prefix} {sql}", params)
+                return [str(row[-1]) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except DatabaseError:
+        return None
+
+
+def write(entry):
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+    if settings.QUERY_LOG_FILE:
+        with _file_lock, open(settings.QUERY_LOG_FILE, "a") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def record(sql, params, many, duration, connection):
+    metrics = perf.current()
+    view_name = metrics.view_name if metrics else None
+    key = fingerprint(sql)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = QueryStats()
+            if len(_stats) > settings.QUERY_LOG_FINGERPRINTS:
+                _trim()
+        stats.add(duration, view_name)
+    if duration * 1000 < settings.QUERY_LOG_SLOW_MS:
+        return
+    write(
+        {
+            "time": timezone.now().isoformat(),
+            "view": view_name,
+            "ms": round(duration * 1000, 2),
+            "fingerprint": key,
+            "sql": sql,
+            "plan": None if many else explain(connection, sql, params),
+        }
+    )
+
+
+def wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper."""
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    record(
+        sql, params, many, time.perf_counter() - start, context["connection"]
+    )
+    return result
+
+
+def top(limit=20):
+    """Самые дорогие по суммарному времени отпечатки процесса."""
+    with _stats_lock:
+        items = sorted(_stats.items(), key=lambda item: -item[1].total)
+        return [
+            {
+                "fingerprint": key,
+                "count": stats.count,
+                "total_ms": round(stats.total * 1000, 2),
+                "max_ms": round(stats.slowest * 1000, 2),
+                "views": dict(stats.views),
+            }
+            for key, stats in items[:limit]
+        ]
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def read_log(path):
+    """Записи файла журнала; битые строки пропускаются."""
+    with open(path) as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def summarize(entries, view_name=None, limit=20):
+    """Сводка медленных запросов по отпечаткам, дорогие первыми.
+
+    Для каждого отпечатка остаётся текст и план самого долгого запуска.
+    """
+    groups = {}
+    for entry in entries:
+        if view_name is not None and entry.get("view") != view_name:
+            continue
+        group = groups.setdefault(
+            entry["fingerprint"],
+            {
+                "fingerprint": entry["fingerprint"],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "views": {},
+                "sql": None,
+                "plan": None,
+            },
+        )
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        view = entry.get("view") or "-"
+        group["views"][view] = group["views"].get(view, 0) + 1
+        if entry["ms"] >= group["max_ms"]:
+            group["max_ms"] = entry["ms"]
+            group["sql"] = entry.get("sql")
+            group["plan"] = entry.get("plan")
+    return sorted(groups.values(), key=lambda group: -group["total_ms"])[
+        :limit
+    ]
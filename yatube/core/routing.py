@@ -0,0 +1,106 @@
+"""Чтение с реплик и чтение своих записей.
+
+Реплики перечислены в DATABASE_REPLICAS. Читать с них разрешено только
+внутри view с декоратором replica_reads: ленты и страница поста.
+Всё остальное — записи, формы, команды, фоновые задачи — идёт в default.
+
+Реплика отстаёт от основной базы. Чтобы пользователь сразу видел свой
+пост, комментарий или подписку, ReplicaPinMiddleware замечает запись
+в default за время запроса (ReplicaRouter.db_for_write) и ставит куку
+REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS. Пока кука жива, этот
+браузер читает только из default. Кэши, которые заполняются сразу
+после записи, читают данные внутри primary_reads.
+
+Реплика выбирается одна на запрос: у реплик разное отставание, и
+запросы одной страницы с разных реплик видели бы разные данные.
+"""
+import functools
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_local = threading.local()
+
+
+class RequestState:
+    __slots__ = ("pinned", "primary", "replica", "use_replica", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.primary = False
+        self.replica = None
+        self.use_replica = False
+        self.wrote = False
+
+
+def current():
+    return getattr(_local, "state", None)
+
+
+def begin(request):
+    state = RequestState(pinned=settings.REPLICA_PIN_COOKIE in request.COOKIES)
+    if settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+    _local.state = state
+    return state
+
+
+def end():
+    _local.state = None
+
+
+@contextmanager
+def primary_reads():
+    """Запросы внутри блока читают default, даже в view с replica_reads."""
+    state = current()
+    if state is None or state.primary:
+        yield
+        return
+    state.primary = True
+    try:
+        yield
+    finally:
+        state.primary = False
+
+
+def replica_reads(view):
+    """Разрешает view читать с реплики, если браузер не закреплён."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = current()
+        if state is None or state.pinned or not settings.DATABASE_REPLICAS:
+            return view(request, *args, **kwargs)
+        state.use_replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current()
+        if state is not None and state.use_replica and not state.primary:
+            return state.replica
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплику приносит репликация вместе с данными.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,194 @@
+"""Очередь фоновых задач в таблице базы, без внешнего брокера.
+
+Обработчик регистрируется декоратором handler и получает список данных
+задач одного вида: воркер берёт задачи пачкой, и поиск, например,
+переиндексирует сто постов одним вызовом.
+
+enqueue пишет задачу в текущую транзакцию (outbox): задача пропадает
+вместе с откатом поста или комментария и видна воркеру только после
+коммита. Задача с уже известным ключом key не ставится второй раз,
+пока запись о первой хранится (TASKS_KEEP_DONE).
+
+Воркер — manage.py run_tasks, таких процессов можно запустить несколько.
+Пачку забирает один UPDATE с условием на статус, поэтому два воркера
+одну задачу не возьмут. Если пачка упала, её задачи выполняются
+по одной, и повторяются только упавшие: через
+TASKS_RETRY_DELAY * 2 ** (попытка - 1) секунд, после TASKS_MAX_ATTEMPTS
+попыток задача остаётся со статусом failed. Обработчик поэтому может
+выполниться для одних данных несколько раз. Пачку воркера, который
+не уложился в TASKS_LEASE_SECONDS, забирает другой воркер.
+
+С TASKS_EAGER (режим отладки и тесты) задача выполняется сразу
+в enqueue, без записи в таблицу.
+"""
+import json
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_outside_transaction = set()
+
+
+def handler(name, atomic=True):
+    """Регистрирует обработчик задач name: func(список данных).
+
+    Обработчик с atomic=False выполняется вне транзакции очереди и сам
+    коммитит свои записи: долгая работа не держит блокировку записи.
+    """
+
+    def decorator(func):
+        _handlers[name] = func
+        if not atomic:
+            _outside_transaction.add(name)
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    if name not in _handlers:
+        raise ValueError(f"Неизвестная задача: {name}")
+    raw = json.dumps(payload)
+    if settings.TASKS_EAGER:
+        _handlers[name]([json.loads(raw)])
+        return
+    Task.objects.bulk_create(
+        [
+            Task(
+                name=name,
+                payload=raw,
+                key=key,
+                max_attempts=settings.TASKS_MAX_ATTEMPTS,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+        ],
+        # Задача с тем же ключом уже есть: вставка молча пропускается.
+        ignore_conflicts=key is not None,
+    )
+
+
+def _due(now):
+    return Q(status=Task.PENDING, run_at__lte=now) | Q(
+        status=Task.RUNNING,
+        locked_until__lt=now,
+        attempts__lt=F("max_attempts"),
+    )
+
+
+@write_transaction
+def claim(batch_size):
+    """Забирает пачку задач одного вида: (имя, метка, задачи)."""
+    now = timezone.now()
+    Task.objects.filter(
+        status=Task.RUNNING,
+        locked_until__lt=now,
+        attempts__gte=F("max_attempts"),
+    ).update(
+        status=Task.FAILED,
+        finished=now,
+        last_error="Воркер не завершил задачу за TASKS_LEASE_SECONDS",
+    )
+    due = Task.objects.filter(_due(now)).order_by("run_at", "pk")
+    name = due.values_list("name", flat=True).first()
+    if name is None:
+        return None, None, []
+    ids = list(due.filter(name=name).values_list("pk", flat=True)[:batch_size])
+    token = uuid.uuid4().hex
+    Task.objects.filter(_due(now), pk__in=ids).update(
+        status=Task.RUNNING,
+        claim=token,
+        locked_until=now + timedelta(seconds=settings.TASKS_LEASE_SECONDS),
+        attempts=F("attempts") + 1,
+    )
+    return name, token, list(Task.objects.filter(claim=token).order_by("pk"))
+
+
+@write_transaction
+def _finish(token, tasks):
+    Task.objects.filter(
+        pk__in=[task.pk for task in tasks], claim=token, status=Task.RUNNING
+    ).update(status=Task.DONE, finished=timezone.now(), locked_until=None)
+
+
+@write_transaction
+def _run_and_finish(func, payloads, token, tasks):
+    # Записи обработчика и отметка о выполнении коммитятся вместе.
+    func(payloads)
+    _finish(token, tasks)
+
+
+def _execute(name, token, tasks):
+    func = _handlers[name]
+    payloads = [json.loads(task.payload) for task in tasks]
+    if name in _outside_transaction:
+        func(payloads)
+        _finish(token, tasks)
+    else:
+        _run_and_finish(func, payloads, token, tasks)
+
+
+def _execute_one_by_one(name, token, tasks):
+    for task in tasks:
+        try:
+            _execute(name, token, [task])
+        except Exception:
+            logger.exception("Задача %s #%s не выполнена", name, task.pk)
+            _fail(token, [task], traceback.format_exc())
+
+
+@write_transaction
+def _fail(token, tasks, error):
+    now = timezone.now()
+    for task in tasks:
+        if task.attempts >= task.max_attempts:
+            changes = {"status": Task.FAILED, "finished": now}
+        else:
+            delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+            changes = {
+                "status": Task.PENDING,
+                "run_at": now + timedelta(seconds=delay),
+            }
+        Task.objects.filter(pk=task.pk, claim=token).update(
+            locked_until=None, last_error=error, **changes
+        )
+
+
+def run_batch(batch_size=None):
+    """Выполняет одну пачку; возвращает число задач в ней."""
+    name, token, tasks = claim(batch_size or settings.TASKS_BATCH_SIZE)
+    if not tasks:
+        return 0
+    if name not in _handlers:
+        _fail(token, tasks, f"Неизвестная задача: {name}")
+        return len(tasks)
+    try:
+        _execute(name, token, tasks)
+    except Exception:
+        if len(tasks) > 1:
+            # Одна плохая задача не должна валить соседей по пачке.
+            _execute_one_by_one(name, token, tasks)
+        else:
+            logger.exception("Задачи %s не выполнены", name)
+            _fail(token, tasks, traceback.format_exc())
+    return len(tasks)
+
+
+@write_transaction
+def purge():
+    """Удаляет выполненные задачи старше TASKS_KEEP_DONE."""
+    border = timezone.now() - timedelta(seconds=settings.TASKS_KEEP_DONE)
+    deleted, _ = Task.objects.filter(
+        status=Task.DONE, finished__lt=border
+    ).delete()
+    return deleted
@@ -0,0 +1,21 @@
+"""Помощники тестов."""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет on_commit, зарегистрированные внутри блока.
+
+    TestCase не коммитит транзакцию, поэтому Django 2.2 их не вызывает;
+    в Django 3.2 то же делает captureOnCommitCallbacks(execute=True).
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        while len(connection.run_on_commit) > start:
+            _, callback = connection.run_on_commit.pop(start)
+            callback()
@@ -1,4 +1,44 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.template import engines
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import db, perf, querylog, routing, tasks, warmup
+from core.asgi import ASGIHandler
+from core.cache import TieredCache
+from core.models import Task
+from posts import search
+from posts.models import Comment, Post
+
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +46,788 @@ class ViewTestClass(TestCase):
         response = self.client.get("/nonexist-page/")
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.cache = TieredCache(
+            "test-l1",
+            {"OPTIONS": {"L2": "default", "L1_MAX_ENTRIES": 2}},
+        )
+        self.cache.clear()
+        self.cache.stats.reset()
+
+    def test_l1_serves_repeated_reads(self):
+        self.cache.set("key", "value")
+        self.assertEqual(self.cache.get("key"), "value")
+        caches["default"].delete("key")
+        self.assertEqual(self.cache.get("key"), "value")
+        self.assertEqual(self.cache.stats.snapshot()["l1_hits"], 2)
+
+    def test_l1_evicts_least_recently_used(self):
+        for key in ("a", "b", "c"):
+            self.cache.set(key, key)
+        caches["default"].clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get_many(["b", "c"]), {"b": "b", "c": "c"})
+        stats = self.cache.stats.snapshot()
+        self.assertEqual(stats["l1_evictions"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_delete_reaches_both_levels(self):
+        self.cache.set("key", "value")
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertIsNone(caches["default"].get("key"))
+
+
+class CacheStatsViewTest(TestCase):
+    def test_cache_stats_for_staff_only(self):
+        url = reverse("core:cache_stats")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_login(staff)
+        caches["default"].get("missing-key")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        counters = response.json().values()
+        self.assertTrue(any("misses" in counter for counter in counters))
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        perf.reset()
+        self.user = User.objects.create_user(username="Vasy")
+        self.client.force_login(self.user)
+
+    def timing(self, response):
+        return dict(
+            re.findall(r"(\w+);(?:dur=([\d.]+))?", response["Server-Timing"])
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("posts:index"))
+        header = response["Server-Timing"]
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="[1-9]\d* q"')
+        self.assertRegex(header, r'cache;desc="\d+ hit [1-9]\d* miss"')
+        self.assertGreater(float(self.timing(response)["tpl"]), 0)
+        self.assertGreater(float(self.timing(response)["total"]), 0)
+
+    def test_histograms_by_view_name(self):
+        for _ in range(3):
+            self.client.get(reverse("posts:index"))
+        self.client.get("/nonexist-page/")
+        stats = perf.snapshot()
+        self.assertEqual(stats["posts:index"]["total_ms"]["count"], 3)
+        self.assertEqual(stats["posts:index"]["db_queries"]["count"], 3)
+        self.assertIn("unresolved", stats)
+
+    def test_perf_stats_for_staff_only(self):
+        url = reverse("core:perf_stats")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse("posts:index"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("posts:index", response.json())
+
+    def test_thumbnail_time_counted(self):
+        with perf.collect() as metrics, perf.thumbnail_timer():
+            pass
+        self.assertGreater(metrics.thumbnail_time, 0)
+        thumbnails = perf.snapshot()["thumbnails"]
+        self.assertEqual(thumbnails["thumbnail_ms"]["count"], 1)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_as_json(self):
+        with self.assertLogs("core.perf", "INFO") as logs:
+            self.client.get(reverse("posts:index"))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "posts:index")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["db_queries"], 0)
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_can_be_disabled(self):
+        response = self.client.get(reverse("posts:index"))
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(perf.snapshot(), {})
+
+    def test_histogram_quantiles(self):
+        histogram = perf.Histogram()
+        for value in (0.5, 3, 3, 40, 4000):
+            histogram.add(value)
+        self.assertEqual(histogram.quantile(0.5), 5)
+        self.assertEqual(histogram.quantile(0.95), 5000)
+        self.assertEqual(histogram.snapshot()["buckets"]["<=5"], 2)
+
+
+class QueryLogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        querylog.reset()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "slow.log")
+        self.user = User.objects.create_user(username="Vasy")
+
+    def get(self, url):
+        with self.settings(QUERY_LOG_SLOW_MS=0, QUERY_LOG_FILE=self.path):
+            with self.assertLogs("core.querylog", "WARNING"):
+                return self.client.get(url)
+
+    def report(self, *args):
+        out = StringIO()
+        call_command("slow_queries", *args, file=self.path, stdout=out)
+        return out.getvalue()
+
+    def test_fingerprint_hides_values(self):
+        self.assertEqual(
+            querylog.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s)\n"
+                "LIMIT 10"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?",
+        )
+        self.assertEqual(
+            querylog.fingerprint('SELECT "t1"."id" FROM "t1" WHERE id = 5'),
+            'SELECT "t1"."id" FROM "t1" WHERE id = ?',
+        )
+
+    def test_slow_queries_logged_with_view_and_plan(self):
+        self.get(reverse("posts:profile", args=[self.user.username]))
+        entries = list(querylog.read_log(self.path))
+        self.assertTrue(entries)
+        self.assertEqual(
+            {entry["view"] for entry in entries} - {None}, {"posts:profile"}
+        )
+        selects = [
+            entry for entry in entries if entry["sql"].startswith("SELECT")
+        ]
+        self.assertTrue(all(entry["plan"] for entry in selects))
+
+    def test_failed_explain_does_not_break_request(self):
+        with mock.patch.object(
+            connection.ops,
+            "explain_query_prefix",
+            return_value="EXPLAIN NOT A PLAN",
+        ):
+            self.assertIsNone(
+                querylog.explain(connection, "SELECT 1", None)
+            )
+            response = self.get(reverse("posts:index"))
+        self.assertEqual(response.status_code, 200)
+        entries = list(querylog.read_log(self.path))
+        self.assertTrue(entries)
+        self.assertTrue(all(entry["plan"] is None for entry in entries))
+
+    def test_fast_queries_only_counted(self):
+        with self.settings(QUERY_LOG_FILE=self.path):
+            self.client.get(reverse("posts:index"))
+        self.assertFalse(os.path.exists(self.path))
+        top = querylog.top()
+        self.assertTrue(top)
+        self.assertTrue(any("posts:index" in row["views"] for row in top))
+
+    @override_settings(QUERY_LOG_FINGERPRINTS=4)
+    def test_top_is_bounded(self):
+        self.client.get(reverse("posts:index"))
+        self.client.get(reverse("posts:profile", args=[self.user.username]))
+        self.assertLessEqual(len(querylog.top(100)), 4)
+
+    def test_report_command(self):
+        self.get(reverse("posts:profile", args=[self.user.username]))
+        self.get(reverse("posts:index"))
+        report = self.report()
+        self.assertIn("posts:profile", report)
+        self.assertIn("posts:index", report)
+        report = self.report("--view", "posts:profile", "--clear")
+        self.assertNotIn("posts:index", report)
+        self.assertIn("Медленных запросов нет", self.report())
+
+    def test_report_without_log(self):
+        with self.assertRaises(CommandError):
+            self.report()
+
+    @override_settings(QUERY_LOG_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.client.get(reverse("posts:index"))
+        self.assertEqual(querylog.top(), [])
+
+    def test_query_stats_for_staff_only(self):
+        url = reverse("core:query_stats")
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json(), list)
+
+
+@override_settings(SQLITE_WRITE_RETRY_DELAY=0, SQLITE_WRITE_RETRIES=3)
+class SQLiteProfileTest(TransactionTestCase):
+    def flaky_begin(self, failures, message="database is locked"):
+        """BEGIN IMMEDIATE, который первые failures раз не проходит."""
+        begins = []
+        begin = db._begin_immediate
+
+        def flaky(connection):
+            begins.append(connection)
+            if len(begins) <= failures:
+                raise OperationalError(message)
+            begin(connection)
+
+        patcher = mock.patch("core.db._begin_immediate", flaky)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return begins
+
+    def write(self, error=None):
+        calls = []
+
+        @db.write_transaction
+        def write():
+            calls.append(connection.in_atomic_block)
+            if error is not None:
+                raise OperationalError(error)
+            return "ok"
+
+        return write, calls
+
+    def test_pragmas_applied_to_new_connection(self):
+        self.addCleanup(db.apply_pragmas, None, connection)
+        with self.settings(SQLITE_PRAGMAS={"busy_timeout": 1234}):
+            db.apply_pragmas(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+    def test_write_lock_taken_up_front(self):
+        write, calls = self.write()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(write(), "ok")
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+        self.assertEqual(calls, [True])
+
+    def test_locked_begin_retried(self):
+        begins = self.flaky_begin(2)
+        write, calls = self.write()
+        self.assertEqual(write(), "ok")
+        self.assertEqual(len(begins), 3)
+        self.assertEqual(calls, [True])
+        self.assertFalse(connection.in_atomic_block)
+
+    def test_retries_limited(self):
+        begins = self.flaky_begin(10)
+        write, calls = self.write()
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(begins), 4)
+        self.assertEqual(calls, [])
+        self.assertFalse(connection.in_atomic_block)
+
+    def test_other_errors_not_retried(self):
+        begins = self.flaky_begin(1, "no such table: posts_post")
+        write, calls = self.write()
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(begins), 1)
+
+    def test_locked_body_not_retried(self):
+        write, calls = self.write("database is locked")
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(calls, [True])
+
+    def test_write_from_on_commit(self):
+        inner, calls = self.write()
+
+        @db.write_transaction
+        def outer():
+            transaction.on_commit(inner)
+
+        outer()
+        self.assertEqual(calls, [True])
+
+    def test_nested_write_not_retried(self):
+        write, calls = self.write("database is locked")
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_sqlite",
+            readers=1,
+            writers=2,
+            duration=0.2,
+            posts=10,
+            stdout=out,
+        )
+        for profile in settings.SQLITE_PROFILES:
+            self.assertIn(profile, out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2", "replica3"])
+class ReplicaChoiceTest(SimpleTestCase):
+    def test_one_replica_per_request(self):
+        router = routing.ReplicaRouter()
+        state = routing.begin(RequestFactory().get("/"))
+        self.addCleanup(routing.end)
+        state.use_replica = True
+        aliases = {router.db_for_read(Post) for _ in range(30)}
+        self.assertEqual(aliases, {state.replica})
+
+
+@override_settings(DATABASE_REPLICAS=["replica_test"])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Основная база — тестовая, реплика — её снимок в файле SQLite.
+
+    Снимок снимается через backup(), который ждёт конца транзакции,
+    поэтому тесты идут без общей транзакции TestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases["replica_test"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+        self.addCleanup(connections.databases.pop, "replica_test")
+        self.addCleanup(connections.__delitem__, "replica_test")
+        self.addCleanup(connections["replica_test"].close)
+        self.author = User.objects.create_user(username="Fedy")
+        self.reader = User.objects.create_user(username="Vasy")
+        self.post = Post.objects.create(author=self.author, text="Старый")
+        self.sync_replica()
+
+    def sync_replica(self):
+        connections["replica_test"].close()
+        target = sqlite3.connect(
+            connections.databases["replica_test"]["NAME"]
+        )
+        connection.connection.backup(target)
+        target.close()
+
+    def texts(self, response):
+        return [post.text for post in response.context["page_obj"]]
+
+    def settle_caches(self):
+        """Поколения кэша старше отставания реплики."""
+        patcher = mock.patch(
+            "posts.page_cache.fill_reads", lambda versions: nullcontext()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_views_use_replica(self):
+        Post.objects.create(author=self.author, text="Новый")
+        self.settle_caches()
+        self.assertEqual(self.texts(self.client.get("/")), ["Старый"])
+        self.client.force_login(self.reader)
+        response = self.client.get(
+            reverse("posts:profile", args=[self.author.username])
+        )
+        self.assertEqual(self.texts(response), ["Старый"])
+
+    def test_writes_and_other_views_use_primary(self):
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse("posts:post_create"), {"text": "Новый"}
+        )
+        self.assertTrue(Post.objects.filter(text="Новый").exists())
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(
+            reverse("posts:post_edit", args=[self.post.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_writer_reads_own_writes(self):
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse("posts:add_comment", args=[self.post.pk]),
+            {"text": "Мой комментарий"},
+        )
+        response = self.client.get(
+            reverse("posts:post_detail", args=[self.post.pk])
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            ["Мой комментарий"],
+        )
+        self.settle_caches()
+        other = self.client_class()
+        other.force_login(self.author)
+        response = other.get(
+            reverse("posts:post_detail", args=[self.post.pk])
+        )
+        self.assertEqual(list(response.context["comments"]), [])
+
+    def test_fresh_caches_filled_from_primary(self):
+        Post.objects.create(author=self.author, text="Новый")
+        response = self.client.get("/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertEqual(self.texts(response), ["Новый", "Старый"])
+        Comment.objects.create(
+            post=self.post, author=self.author, text="Комментарий"
+        )
+        self.client.force_login(self.reader)
+        response = self.client.get(
+            reverse("posts:post_detail", args=[self.post.pk])
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            ["Комментарий"],
+        )
+
+    def test_follow_pins_follower(self):
+        self.client.force_login(self.reader)
+        self.client.get(
+            reverse("posts:profile_follow", args=[self.author.username])
+        )
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertEqual(self.texts(response), ["Старый"])
+        self.client.cookies.pop(settings.REPLICA_PIN_COOKIE)
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertEqual(self.texts(response), [])
+
+
+def asgi_request(app, path, method="GET", body=b"", headers=()):
+    """Прогоняет запрос через ASGI-приложение: статус, заголовки, куски."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "query_string": b"q=%D1%89",
+        "headers": [(b"host", b"localhost"), *headers],
+        "server": ("localhost", 8000),
+        "client": ("127.0.0.1", 5000),
+    }
+    messages = [
+        {"type": "http.request", "body": body[:3], "more_body": True},
+        {"type": "http.request", "body": body[3:], "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *chunks = sent
+    return (
+        start["status"],
+        dict(start["headers"]),
+        [chunk["body"] for chunk in chunks],
+    )
+
+
+class EchoApplication:
+    """WSGI-приложение: отдаёт environ и тело запроса по кускам."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __call__(self, environ, start_response):
+        self.threads.append(threading.current_thread())
+        start_response("201 Created", [("X-Echo", "yes")])
+        return self.response(environ)
+
+    def response(self, environ):
+        try:
+            yield environ["PATH_INFO"].encode("latin-1")
+            yield environ["QUERY_STRING"].encode()
+            yield environ["HTTP_COOKIE"].encode()
+            yield environ["wsgi.input"].read()
+        finally:
+            self.threads.append(threading.current_thread())
+
+
+class EndlessApplication:
+    """WSGI-приложение с бесконечным потоковым ответом."""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __call__(self, environ, start_response):
+        start_response("200 OK", [])
+        return self.response()
+
+    def response(self):
+        try:
+            while True:
+                yield b"chunk"
+        finally:
+            self.closed.set()
+
+
+@override_settings(ASGI_RESPONSE_QUEUE_SIZE=1)
+class ASGIHandlerTest(SimpleTestCase):
+    def test_streams_wsgi_response(self):
+        echo = EchoApplication()
+        app = ASGIHandler(echo)
+        self.addCleanup(app.executor.shutdown)
+        status, headers, chunks = asgi_request(
+            app,
+            "/группа/",
+            method="POST",
+            body=b"text=hello",
+            headers=[(b"cookie", b"a=1"), (b"cookie", b"b=2")],
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b"x-echo"], b"yes")
+        self.assertEqual(
+            chunks,
+            [
+                "/группа/".encode(),
+                b"q=%D1%89",
+                b"a=1; b=2",
+                b"text=hello",
+                b"",
+            ],
+        )
+        # Вызов и закрытие ответа — в одном потоке пула.
+        self.assertEqual(len(set(echo.threads)), 1)
+        self.assertNotEqual(echo.threads[0], threading.current_thread())
+
+    def test_body_without_content_length(self):
+        def form_application(environ, start_response):
+            request = WSGIRequest(environ)
+            start_response("200 OK", [])
+            return [request.POST["text"].encode()]
+
+        app = ASGIHandler(form_application)
+        self.addCleanup(app.executor.shutdown)
+        _, _, chunks = asgi_request(
+            app,
+            "/",
+            method="POST",
+            body=b"text=hello",
+            headers=[
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"transfer-encoding", b"chunked"),
+            ],
+        )
+        self.assertEqual(chunks[0], b"hello")
+
+    def test_cancelled_request_frees_thread(self):
+        endless = EndlessApplication()
+        app = ASGIHandler(endless)
+        self.addCleanup(app.executor.shutdown)
+        scope = {"type": "http", "method": "GET", "path": "/"}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            # Клиент не читает ответ: очередь потока переполнена.
+            await asyncio.Event().wait()
+
+        async def cancel():
+            request = asyncio.ensure_future(app(scope, receive, send))
+            await asyncio.sleep(0.1)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, endless.closed.wait, 5)
+
+        self.assertTrue(asyncio.run(cancel()))
+
+    def test_serves_django_pages(self):
+        app = ASGIHandler()
+        self.addCleanup(app.executor.shutdown)
+        status, headers, chunks = asgi_request(app, reverse("about:author"))
+        self.assertEqual(status, 200)
+        self.assertIn(b"text/html", headers[b"content-type"])
+        self.assertIn(b"</html>", b"".join(chunks))
+
+    def test_lifespan(self):
+        app = ASGIHandler(EchoApplication())
+        messages = [
+            {"type": "lifespan.startup"},
+            {"type": "lifespan.shutdown"},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(app({"type": "lifespan"}, receive, send))
+        self.assertEqual(
+            sent,
+            ["lifespan.startup.complete", "lifespan.shutdown.complete"],
+        )
+
+
+collected = []
+
+
+@tasks.handler("tests.collect")
+def collect(payloads):
+    if "fail" in payloads:
+        raise ValueError("Задача упала")
+    collected.append(payloads)
+
+
+outside = []
+
+
+@tasks.handler("tests.outside", atomic=False)
+def record_transaction(payloads):
+    # TestCase сам держит транзакцию, поэтому считаем вложенные блоки.
+    outside.append(len(connection.savepoint_ids))
+
+
+@override_settings(
+    TASKS_EAGER=False, TASKS_MAX_ATTEMPTS=2, TASKS_RETRY_DELAY=10
+)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        collected.clear()
+
+    def make_due(self):
+        Task.objects.update(run_at=timezone.now())
+
+    def test_task_is_rolled_back_with_transaction(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                tasks.enqueue("tests.collect", "a")
+                raise ValueError
+        self.assertFalse(Task.objects.exists())
+
+    def test_key_enqueues_task_once(self):
+        tasks.enqueue("tests.collect", "a", key="a")
+        tasks.enqueue("tests.collect", "a", key="a")
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            tasks.enqueue("tests.unknown")
+
+    def test_worker_batches_tasks_of_one_kind(self):
+        tasks.enqueue("tests.collect", "a")
+        tasks.enqueue("posts.index", [1])
+        tasks.enqueue("tests.collect", "b")
+        self.assertEqual(tasks.run_batch(), 2)
+        self.assertEqual(collected, [["a", "b"]])
+        self.assertEqual(tasks.run_batch(), 1)
+        self.assertEqual(tasks.run_batch(), 0)
+        self.assertEqual(
+            Task.objects.filter(status=Task.DONE).count(), 3
+        )
+
+    def test_failed_batch_is_retried_then_failed(self):
+        tasks.enqueue("tests.collect", "fail")
+        with self.assertLogs("core.tasks", "ERROR"):
+            tasks.run_batch()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertEqual(tasks.run_batch(), 0)
+        self.make_due()
+        with self.assertLogs("core.tasks", "ERROR"):
+            tasks.run_batch()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn("Задача упала", task.last_error)
+
+    def test_failed_task_does_not_fail_its_batch(self):
+        for payload in ("a", "fail", "b"):
+            tasks.enqueue("tests.collect", payload)
+        with self.assertLogs("core.tasks", "ERROR"):
+            self.assertEqual(tasks.run_batch(), 3)
+        self.assertEqual(collected, [["a"], ["b"]])
+        self.assertEqual(
+            dict(Task.objects.values_list("payload", "status")),
+            {'"a"': Task.DONE, '"fail"': Task.PENDING, '"b"': Task.DONE},
+        )
+
+    def test_handler_outside_transaction(self):
+        tasks.enqueue("tests.outside", "a")
+        tasks.run_batch()
+        self.assertEqual(outside, [len(connection.savepoint_ids)])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_expired_lease_is_taken_over(self):
+        tasks.enqueue("tests.collect", "a")
+        tasks.claim(10)
+        self.assertEqual(tasks.run_batch(), 0)
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(tasks.run_batch(), 1)
+        self.assertEqual(collected, [["a"]])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_purge_keeps_recent_tasks(self):
+        tasks.enqueue("tests.collect", "a")
+        tasks.enqueue("tests.collect", "b")
+        tasks.run_batch()
+        Task.objects.filter(payload='"a"').update(
+            finished=timezone.now() - timedelta(days=30)
+        )
+        self.assertEqual(tasks.purge(), 1)
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_at_once(self):
+        tasks.enqueue("tests.collect", "a")
+        self.assertEqual(collected, [["a"]])
+        self.assertFalse(Task.objects.exists())
+
+    def test_post_is_indexed_by_worker(self):
+        author = User.objects.create_user(username="Vasy")
+        post = Post.objects.create(author=author, text="Очередь задач")
+        backend = search.get_backend()
+        self.assertEqual(backend.search("очередь", 0, 10), [])
+        out = StringIO()
+        call_command("run_tasks", "--once", stdout=out)
+        self.assertEqual(backend.search("очередь", 0, 10), [post.pk])
+        self.assertIn("Обработано задач: 2", out.getvalue())
+
+
+class TemplateWarmupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_header_uses_precomputed_nav(self):
+        response = self.client.get(reverse("posts:index"))
+        nav = response.context["nav"]
+        self.assertEqual(nav["login"], reverse("users:login"))
+        self.assertEqual(nav["search"], reverse("posts:search"))
+        self.assertContains(response, f'href="{reverse("about:tech")}"')
+
+    @override_settings(TEMPLATE_CACHE=False)
+    def test_warm_up_needs_template_cache(self):
+        self.assertEqual(warmup.warm_up(), 0)
+
+    def test_warm_up_fills_cached_loader(self):
+        templates = [
+            {
+                **settings.TEMPLATES[0],
+                "APP_DIRS": False,
+                "OPTIONS": {
+                    **settings.TEMPLATES[0]["OPTIONS"],
+                    "loaders": settings.TEMPLATE_CACHED_LOADERS,
+                },
+            }
+        ]
+        with self.settings(TEMPLATES=templates, TEMPLATE_CACHE=True):
+            names = warmup.template_names(engines["django"].engine)
+            self.assertIn("includes/header.html", names)
+            self.assertIn("posts/email/digest.txt", names)
+            self.assertEqual(warmup.warm_up(), len(names))
+            loader = engines["django"].engine.template_loaders[0]
+            self.assertIn("base.html", loader.get_template_cache)
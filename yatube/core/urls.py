@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = "core"
+
+urlpatterns = [
+    path("cache/", views.cache_stats, name="cache_stats"),
+    path("perf/", views.perf_stats, name="perf_stats"),
+    path("queries/", views.query_stats, name="query_stats"),
+]
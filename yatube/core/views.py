@@ -1,5 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core import perf, querylog
+from core.cache import all_stats
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -17,3 +22,21 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=""):
     return render(request, "core/403csrf.html")
+
+
+@staff_member_required
+def cache_stats(request):
+    """Счётчики кэшей текущего процесса."""
+    return JsonResponse(all_stats())
+
+
+@staff_member_required
+def perf_stats(request):
+    """Гистограммы замеров запросов текущего процесса по view."""
+    return JsonResponse(perf.snapshot())
+
+
+@staff_member_required
+def query_stats(request):
+    """Самые дорогие отпечатки SQL-запросов текущего процесса."""
+    return JsonResponse(querylog.top(), safe=False)
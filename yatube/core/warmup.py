@@ -0,0 +1,55 @@
+"""Прогрев процесса до первого запроса.
+
+С TEMPLATE_CACHE шаблоны загружает cached.Loader: каждый шаблон
+читается и разбирается один раз на процесс. warm_up делает это
+при старте (yatube/wsgi.py, yatube/asgi.py), чтобы первый запрос
+каждого воркера не платил за разбор base.html, header.html и
+остальных, а заодно считает адреса навигации шапки.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_script_prefix
+
+from .context_processors.nav import nav_urls
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = (".html", ".txt")
+
+
+def template_names(engine):
+    """Имена всех шаблонов из папок движка и приложений."""
+    directories = [*engine.dirs, *get_app_template_dirs("templates")]
+    names = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                if file_name.endswith(TEMPLATE_EXTENSIONS):
+                    path = os.path.join(root, file_name)
+                    names.add(os.path.relpath(path, directory))
+    return sorted(name.replace(os.sep, "/") for name in names)
+
+
+def warm_templates():
+    """Загружает все шаблоны; возвращает число загруженных."""
+    engine = engines["django"].engine
+    loaded = 0
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError:
+            logger.exception("Шаблон %s не разобран", name)
+        else:
+            loaded += 1
+    return loaded
+
+
+def warm_up():
+    if not settings.TEMPLATE_CACHE:
+        return 0
+    nav_urls(get_script_prefix())
+    return warm_templates()
@@ -0,0 +1,330 @@
+"""Замер страниц через тестовый клиент Django: время и SQL-запросы.
+
+Адреса берутся из urlpatterns приложений, параметры маршрутов (slug,
+username, post_id) подставляются из засеянных данных (seed_data): самая
+большая группа, самый плодовитый автор, самый обсуждаемый пост.
+
+Для каждого адреса считаются число запросов, время рендеринга шаблонов
+и полное время ответа. Результаты сохраняются в файл базовой линии,
+с которым потом сравниваются новые замеры (compare).
+"""
+import json
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.db import connection
+from django.db.models import Count
+from django.template import Engine
+from django.template.base import Template
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Follow, Group, Post, User
+
+URL_MODULES = ("posts.urls", "users.urls", "about.urls", "core.urls")
+# Эти адреса меняют данные или сессию обычным GET — их не гоняем.
+SKIPPED = {
+    "posts:follow_seen",
+    "posts:profile_follow",
+    "posts:profile_unfollow",
+    "users:logout",
+}
+MODES = ("anonymous", "user")
+# Набор данных, на котором снята базовая линия (seeding.seed).
+BASELINE_DATASET = {
+    "users": 200,
+    "groups": 10,
+    "posts": 3000,
+    "comments": 3000,
+    "follows": 20,
+    "seed": 0,
+}
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def sample_kwargs():
+    """Значения параметров маршрутов на засеянных данных."""
+    group = (
+        Group.objects.annotate(posts_total=Count("posts"))
+        .order_by("-posts_total", "pk")
+        .first()
+    )
+    author = User.objects.order_by("-counters__posts_count", "pk").first()
+    post = Post.objects.order_by("-comments_count", "-pk").first()
+    return {
+        "slug": group.slug if group else None,
+        "username": author.username if author else None,
+        "post_id": post.pk if post else None,
+    }
+
+
+def viewer():
+    """Пользователь с самой длинной лентой подписок."""
+    follow = (
+        Follow.objects.values("user")
+        .annotate(total=Count("author"))
+        .order_by("-total", "user")
+        .first()
+    )
+    if follow is None:
+        return User.objects.order_by("pk").first()
+    return User.objects.get(pk=follow["user"])
+
+
+def discover(url_modules=URL_MODULES, kwargs=None):
+    """Пары (имя, адрес) для всех маршрутов, которые можно заполнить."""
+    kwargs = sample_kwargs() if kwargs is None else kwargs
+    for module_name in url_modules:
+        module = import_module(module_name)
+        for pattern in module.urlpatterns:
+            name = f"{module.app_name}:{pattern.name}"
+            params = list(pattern.pattern.converters)
+            if name in SKIPPED or any(
+                kwargs.get(param) is None for param in params
+            ):
+                continue
+            yield name, reverse(
+                name, kwargs={param: kwargs[param] for param in params}
+            )
+
+
+@contextmanager
+def render_timer():
+    """Считает время рендеринга шаблонов в секундах.
+
+    Вложенные шаблоны (include, extends) входят во время внешнего и
+    второй раз не складываются.
+    """
+    spent = [0.0]
+    depth = [0]
+    original = Template.render
+
+    def render(self, context):
+        depth[0] += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            depth[0] -= 1
+            if not depth[0]:
+                spent[0] += time.perf_counter() - start
+
+    Template.render = render
+    try:
+        yield spent
+    finally:
+        Template.render = original
+
+
+@contextmanager
+def template_timer():
+    """Загрузки и рендеринги по именам шаблонов, время в секундах.
+
+    Загрузка — поиск и разбор шаблона (Engine.find_template), с
+    cached.Loader она дорогая только в первый раз. Время рендеринга
+    шаблона включает вложенные в него шаблоны и блоки потомков.
+    """
+    stats = defaultdict(
+        lambda: {"loads": 0, "load": 0.0, "renders": 0, "render": 0.0}
+    )
+    original_find = Engine.find_template
+    original_render = Template._render
+
+    def find_template(self, name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_find(self, name, *args, **kwargs)
+        finally:
+            stats[name]["loads"] += 1
+            stats[name]["load"] += time.perf_counter() - start
+
+    def render(self, context):
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            row = stats[self.origin.template_name or self.origin.name]
+            row["renders"] += 1
+            row["render"] += time.perf_counter() - start
+
+    Engine.find_template = find_template
+    Template._render = render
+    try:
+        yield stats
+    finally:
+        Engine.find_template = original_find
+        Template._render = original_render
+
+
+def _read(response):
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+def measure(client, url, repeat, warmup):
+    """Гоняет GET url и возвращает сводку по времени и запросам."""
+    for _ in range(warmup):
+        _read(client.get(url))
+    timings = []
+    renders = []
+    queries = []
+    status = None
+    for _ in range(repeat):
+        with render_timer() as render, CaptureQueriesContext(
+            connection
+        ) as captured:
+            start = time.perf_counter()
+            response = client.get(url)
+            _read(response)
+            timings.append(time.perf_counter() - start)
+        renders.append(render[0])
+        queries.append(len(captured))
+        status = response.status_code
+    return {
+        "status": status,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "render_ms": percentile(renders, 50) * 1000,
+        "queries": max(queries),
+    }
+
+
+def run(repeat=20, warmup=2, modes=MODES, url_modules=URL_MODULES):
+    """Словарь "имя [режим]" -> сводка для всех найденных адресов."""
+    clients = {}
+    if "anonymous" in modes:
+        clients["anonymous"] = Client()
+    if "user" in modes:
+        clients["user"] = Client()
+        clients["user"].force_login(viewer())
+    results = {}
+    for name, url in discover(url_modules):
+        for mode, client in clients.items():
+            results[f"{name} [{mode}]"] = measure(client, url, repeat, warmup)
+    return results
+
+
+def measure_templates(client, urls, repeat):
+    """Загрузки и рендеринги шаблонов в среднем на одну страницу."""
+    with template_timer() as stats:
+        for _ in range(repeat):
+            for url in urls:
+                _read(client.get(url))
+    pages = repeat * len(urls)
+    return {
+        name: {
+            "loads": row["loads"] / pages,
+            "load_ms": row["load"] * 1000 / pages,
+            "renders": row["renders"] / pages,
+            "render_ms": row["render"] * 1000 / pages,
+        }
+        for name, row in stats.items()
+    }
+
+
+def format_templates(results):
+    width = max((len(name) for name in results), default=6)
+    lines = [
+        f"{'шаблон':<{width}}  загрузок  загрузка, мс  рендеров  "
+        "рендер, мс",
+    ]
+    for name, row in sorted(
+        results.items(), key=lambda item: -item[1]["render_ms"]
+    ):
+        lines.append(
+            f"{name:<{width}}  {row['loads']:>8.1f}  {row['load_ms']:>12.2f}"
+            f"  {row['renders']:>8.1f}  {row['render_ms']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def save_baseline(path, results, dataset=None):
+    results = {
+        name: {
+            key: round(value, 2) if isinstance(value, float) else value
+            for key, value in row.items()
+        }
+        for name, row in results.items()
+    }
+    with open(path, "w") as file:
+        json.dump(
+            {"dataset": dataset, "results": results},
+            file,
+            indent=2,
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        file.write("\n")
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(
+    results,
+    baseline,
+    query_slack=0,
+    time_tolerance=1.0,
+    time_floor_ms=5.0,
+    check_times=True,
+):
+    """Список регрессий относительно базовой линии.
+
+    Запросов не должно стать больше чем на query_slack. Время (медиана
+    ответа и рендеринг) может вырасти на долю time_tolerance, но не
+    меньше чем на time_floor_ms: так быстрые страницы не падают от шума
+    таймера. p95 на десятках замеров слишком шумный для проверки.
+    """
+    problems = []
+    for name, old in baseline["results"].items():
+        new = results.get(name)
+        if new is None:
+            problems.append(f"{name}: адрес пропал из замера")
+            continue
+        if new["status"] != old["status"]:
+            problems.append(
+                f"{name}: статус {old['status']} -> {new['status']}"
+            )
+        if new["queries"] > old["queries"] + query_slack:
+            problems.append(
+                f"{name}: запросов {old['queries']} -> {new['queries']}"
+            )
+        if not check_times:
+            continue
+        for key in ("p50_ms", "render_ms"):
+            limit = max(
+                old[key] * (1 + time_tolerance), old[key] + time_floor_ms
+            )
+            if new[key] > limit:
+                problems.append(
+                    f"{name}: {key} {old[key]:.1f} -> {new[key]:.1f}"
+                )
+    return problems
+
+
+def format_table(results):
+    width = max((len(name) for name in results), default=4)
+    lines = [
+        f"{'view':<{width}}  status  p50, мс  p95, мс  шаблоны, мс  "
+        "запросов",
+    ]
+    for name, row in results.items():
+        lines.append(
+            f"{name:<{width}}  {row['status']:>6}  {row['p50_ms']:>7.1f}  "
+            f"{row['p95_ms']:>7.1f}  {row['render_ms']:>11.1f}  "
+            f"{row['queries']:>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,62 @@
+"""Комментарии поста порциями по ключу (created, id).
+
+Страница поста показывает первые COMMENTS_PER_PAGE комментариев,
+остальные подгружаются фрагментами по курсору — последней показанной
+паре (created, id), без OFFSET. Авторы приходят тем же запросом.
+
+Первая порция кэшируется по версии ленты "post:<id>" (page_cache):
+новый или удалённый комментарий (add_comment, админка) меняет версию,
+и порция собирается заново; сразу после смены версии — из основной
+базы (page_cache.fill_reads). Браузер, закреплённый за основной базой
+после своей записи (core.routing), кэш не читает: иначе он мог бы
+получить порцию, собранную с отстающей реплики.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from core import routing
+
+from . import page_cache
+from .models import Comment
+from .utils import decode_position, encode_position
+
+FIRST_PAGE_KEY = "comments:first:{}:{}"
+
+
+def get_page(post_id, cursor=None, per_page=None):
+    """Порция комментариев после курсора и курсор следующей порции."""
+    per_page = per_page or settings.COMMENTS_PER_PAGE
+    queryset = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related("author")
+        .only("text", "created", "post", "author__username")
+        .order_by("created", "pk")
+    )
+    position = decode_position(cursor) if cursor else None
+    if position is not None:
+        created, pk = position
+        queryset = queryset.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        )
+    # Берём на одну запись больше, чтобы узнать, есть ли что-то дальше.
+    comments = list(queryset[: per_page + 1])
+    if len(comments) <= per_page:
+        return comments, None
+    comments = comments[:per_page]
+    last = comments[-1]
+    return comments, encode_position(last.created, last.pk)
+
+
+def first_page(post_id):
+    state = routing.current()
+    if state is not None and state.pinned:
+        return get_page(post_id)
+    versions = page_cache.generations(f"post:{post_id}")
+    key = FIRST_PAGE_KEY.format(post_id, ":".join(versions))
+    page = cache.get(key)
+    if page is None:
+        with page_cache.fill_reads(versions):
+            page = get_page(post_id)
+        cache.set(key, page, settings.COMMENTS_CACHE_TIMEOUT)
+    return page
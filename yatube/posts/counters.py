@@ -0,0 +1,101 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются в той же транзакции, что и сама запись, через
+UPDATE ... SET x = x + 1, поэтому шаблоны читают готовые значения
+без COUNT на каждый рендер. Пересчитать всё можно командой
+rebuild_counters.
+"""
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, UserCounter, User
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def rebuild_user(user_id):
+    counter, _ = UserCounter.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "posts_count": Post.objects.filter(author_id=user_id).count(),
+            "followers_count": Follow.objects.filter(author_id=user_id)
+            .count(),
+            "following_count": Follow.objects.filter(user_id=user_id).count(),
+        },
+    )
+    return counter
+
+
+def shifted(field, delta):
+    # Счётчик мог разойтись с данными: вычитание не уходит ниже нуля,
+    # иначе UPDATE нарушит CHECK положительного поля.
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def bump_user(user_id, create=True, **deltas):
+    """Сдвигает счётчики пользователя; строки нет — считает с нуля."""
+    updated = UserCounter.objects.filter(user_id=user_id).update(
+        **{field: shifted(field, delta) for field, delta in deltas.items()}
+    )
+    if not updated and create:
+        rebuild_user(user_id)
+
+
+def bump_comments(post_id, delta):
+    # Карточка поста показывает число комментариев, поэтому вместе
+    # со счётчиком меняется и её версия.
+    Post.objects.filter(pk=post_id).update(
+        comments_count=shifted("comments_count", delta),
+        version=F("version") + 1,
+    )
+
+
+def get_user_counters(user):
+    try:
+        return user.counters
+    except UserCounter.DoesNotExist:
+        return rebuild_user(user.pk)
+
+
+def rebuild_all():
+    Post.objects.update(comments_count=count_subquery(Comment, "post"))
+    counters = User.objects.annotate(
+        posts_total=count_subquery(Post, "author"),
+        followers_total=count_subquery(Follow, "author"),
+        following_total=count_subquery(Follow, "user"),
+    ).values_list("pk", "posts_total", "followers_total", "following_total")
+    # Флаг раскладки снимается только задачей push_author, с раскладкой.
+    pulled = set(
+        UserCounter.objects.filter(feed_pulled=True).values_list(
+            "user_id", flat=True
+        )
+    )
+    UserCounter.objects.all().delete()
+    UserCounter.objects.bulk_create(
+        (
+            UserCounter(
+                user_id=pk,
+                posts_count=posts,
+                followers_count=followers,
+                following_count=following,
+                feed_pulled=followers >= settings.FOLLOW_FEED_FANOUT_LIMIT
+                or pk in pulled,
+            )
+            for pk, posts, followers, following in counters.iterator()
+        ),
+        batch_size=500,
+    )
@@ -0,0 +1,42 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Анимацию и прочие форматы оставляем как есть.
+RESAVE_FORMATS = ("JPEG", "PNG", "WEBP")
+# Из info при сохранении остаётся только нужное для вида картинки:
+# EXIF, XMP и прочие метаданные save иначе запишет обратно.
+KEEP_INFO = ("transparency", "icc_profile")
+
+
+def normalize_upload(uploaded):
+    """Уменьшает загруженную картинку и убирает из неё EXIF."""
+    uploaded.seek(0)
+    image = Image.open(uploaded)
+    image_format = image.format
+    max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+    too_big = max(image.size) > max_side
+    if (
+        image_format not in RESAVE_FORMATS
+        or getattr(image, "is_animated", False)
+        or not (too_big or "exif" in image.info)
+    ):
+        uploaded.seek(0)
+        return uploaded
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEEP_INFO
+    }
+    options = {"optimize": True}
+    if image_format in ("JPEG", "WEBP"):
+        options["quality"] = settings.IMAGE_UPLOAD_QUALITY
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return SimpleUploadedFile(
+        uploaded.name, buffer.getvalue(), content_type=uploaded.content_type
+    )
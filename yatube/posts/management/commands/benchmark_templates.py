@@ -0,0 +1,89 @@
+import copy
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.warmup import warm_up
+from posts import benchmark, seeding, transfer
+
+PAGES = (
+    "posts:index",
+    "posts:group_list",
+    "posts:profile",
+    "posts:post_detail",
+    "posts:follow_index",
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def templates_setting(cached):
+    """TEMPLATES с cached.Loader или с теми же загрузчиками без кэша."""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = settings.TEMPLATE_CACHED_LOADERS
+    templates[0]["APP_DIRS"] = False
+    templates[0]["OPTIONS"]["loaders"] = loaders if cached else loaders[0][1]
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет загрузку и рендеринг каждого шаблона на страницах лент "
+        "и поста: без кэша шаблонов и в производственном режиме "
+        "(cached.Loader после прогрева core.warmup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument(
+            "--page",
+            action="append",
+            choices=PAGES,
+            help="Имя страницы (по умолчанию все ленты и пост).",
+        )
+        parser.add_argument(
+            "--fresh",
+            action="store_true",
+            help=(
+                "Засеять набор BASELINE_DATASET во временной транзакции "
+                "и откатить его после замера."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not options["fresh"]:
+            self.measure(options)
+            return
+        try:
+            with transaction.atomic():
+                seeding.seed(**benchmark.BASELINE_DATASET)
+                transfer.rebuild_derived(StringIO(), 1000)
+                self.measure(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, options):
+        pages = options["page"] or PAGES
+        urls = [url for name, url in benchmark.discover() if name in pages]
+        client = Client()
+        client.force_login(benchmark.viewer())
+        for cached in (False, True):
+            with override_settings(
+                TEMPLATES=templates_setting(cached),
+                TEMPLATE_CACHE=cached,
+                QUERY_LOG_ENABLED=False,
+            ):
+                warm_up()
+                results = benchmark.measure_templates(
+                    client, urls, options["repeat"]
+                )
+            title = "cached.Loader" if cached else "без кэша шаблонов"
+            self.stdout.write(f"\n{title}, на страницу:")
+            self.stdout.write(benchmark.format_templates(results))
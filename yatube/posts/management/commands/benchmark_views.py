@@ -0,0 +1,111 @@
+import json
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import benchmark, seeding, transfer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняет страницы posts, users, about и core через тестовый клиент "
+        "и печатает время ответа, время шаблонов и число SQL-запросов. "
+        "Умеет сохранять базовую линию и сверяться с ней."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--mode",
+            choices=benchmark.MODES,
+            action="append",
+            help="anonymous, user или оба (по умолчанию).",
+        )
+        parser.add_argument(
+            "--fresh",
+            action="store_true",
+            help=(
+                "Засеять набор BASELINE_DATASET во временной транзакции "
+                "и откатить его после замера."
+            ),
+        )
+        parser.add_argument(
+            "--baseline",
+            default=settings.BENCHMARK_BASELINE,
+            help="Файл базовой линии.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Записать результаты в файл базовой линии.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Завершиться ошибкой, если замер хуже базовой линии.",
+        )
+        parser.add_argument("--query-slack", type=int, default=0)
+        parser.add_argument("--time-tolerance", type=float, default=1.0)
+        parser.add_argument("--time-floor-ms", type=float, default=5.0)
+        parser.add_argument(
+            "--json", dest="json_path", help="Сохранить результаты в файл."
+        )
+
+    def handle(self, *args, **options):
+        results = self.measure(options)
+        self.stdout.write(benchmark.format_table(results))
+        if options["json_path"]:
+            with open(options["json_path"], "w") as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+        dataset = benchmark.BASELINE_DATASET if options["fresh"] else None
+        if options["save_baseline"]:
+            benchmark.save_baseline(options["baseline"], results, dataset)
+            self.stdout.write(f"Базовая линия: {options['baseline']}")
+        if options["check"]:
+            self.check_baseline(results, dataset, options)
+
+    def measure(self, options):
+        params = {
+            "repeat": options["repeat"],
+            "warmup": options["warmup"],
+            "modes": options["mode"] or benchmark.MODES,
+        }
+        if not options["fresh"]:
+            return benchmark.run(**params)
+        results = {}
+        try:
+            with transaction.atomic():
+                seeding.seed(**benchmark.BASELINE_DATASET)
+                transfer.rebuild_derived(StringIO(), 1000)
+                results = benchmark.run(**params)
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def check_baseline(self, results, dataset, options):
+        baseline = benchmark.load_baseline(options["baseline"])
+        if baseline["dataset"] != dataset:
+            self.stderr.write(
+                "Базовая линия снята на другом наборе данных: "
+                "сравнение может быть неточным."
+            )
+        problems = benchmark.compare(
+            results,
+            baseline,
+            query_slack=options["query_slack"],
+            time_tolerance=options["time_tolerance"],
+            time_floor_ms=options["time_floor_ms"],
+        )
+        if problems:
+            raise CommandError(
+                "Замер хуже базовой линии:\n" + "\n".join(problems)
+            )
+        self.stdout.write("Регрессий нет")
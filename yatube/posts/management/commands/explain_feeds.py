@@ -0,0 +1,124 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import TimelineFeed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Засевает базу во временной транзакции и печатает планы запросов "
+        "лент с индексами и без них. Данные откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.stdout.write("== С индексами ==")
+                self.explain_all("after")
+                self.drop_indexes()
+                self.stdout.write("\n== Без индексов ==")
+                self.explain_all("before")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        rnd = random.Random(options["seed"])
+        User.objects.bulk_create(
+            User(username=f"explain_user_{i}") for i in range(options["users"])
+        )
+        Group.objects.bulk_create(
+            Group(title=f"Группа {i}", slug=f"explain-{i}", description="-")
+            for i in range(options["groups"])
+        )
+        users = list(
+            User.objects.filter(username__startswith="explain_user_")
+        )
+        groups = list(Group.objects.filter(slug__startswith="explain-"))
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author=rnd.choice(users),
+                    group=rnd.choice(groups),
+                    text=f"Пост {i}",
+                )
+                for i in range(options["posts"])
+            ),
+            batch_size=500,
+        )
+        posts = list(Post.objects.values_list("pk", flat=True)[:500])
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post_id=rnd.choice(posts),
+                    author=rnd.choice(users),
+                    text="Комментарий",
+                )
+                for _ in range(options["posts"] // 2)
+            ),
+            batch_size=500,
+        )
+        pairs = {
+            tuple(rnd.sample(users, 2)) for _ in range(options["users"] * 10)
+        }
+        Follow.objects.bulk_create(
+            (Follow(user=user, author=author) for user, author in pairs),
+            batch_size=500,
+        )
+        self.user, self.author = next(iter(pairs))
+        self.group = groups[0]
+        self.post_id = posts[0]
+
+    def queries(self):
+        feed = Post.objects.feed()
+        return {
+            "index": feed[100:110],
+            "group_posts": feed.filter(group=self.group)[100:110],
+            "profile": feed.filter(author=self.author)[10:20],
+            "follow_index": feed.filter(
+                author__in=self.user.follower.values("author")
+            )[:10],
+            "follow_index timeline": TimelineFeed(self.user)
+            .entries()
+            .values_list("pub_date", "post_id")[:10],
+            "post_detail comments": Comment.objects.filter(
+                post_id=self.post_id
+            ).select_related("author"),
+            "profile_follow": Follow.objects.filter(
+                user=self.user, author=self.author
+            ),
+        }
+
+    def explain_all(self, label):
+        # Метка в тексте запроса не даёт sqlite3 взять план из кэша
+        # подготовленных выражений, собранный до удаления индексов.
+        with connection.cursor() as cursor:
+            for name, queryset in self.queries().items():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql} -- {label}", params)
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+                self.stdout.write(f"\n{name}:\n{plan}")
+
+    def drop_indexes(self):
+        # Уникальный индекс Follow входит в описание таблицы SQLite
+        # и удаляется только вместе с ней, поэтому он остаётся.
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f"DROP INDEX {connection.ops.quote_name(index.name)}"
+                    )
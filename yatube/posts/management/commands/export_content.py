@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает группы, посты, комментарии и подписки в каталог "
+        "вместе с картинками постов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог выгрузки.")
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default="ndjson"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с сохранённой контрольной точки.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = transfer.Checkpoint(
+            directory, transfer.EXPORT_CHECKPOINT, options["resume"]
+        )
+        verbose = options["verbosity"] > 1
+        for table in transfer.TABLES:
+            if checkpoint.is_done(table):
+                continue
+            exported = transfer.export_table(
+                table,
+                directory,
+                options["format"],
+                options["batch_size"],
+                checkpoint,
+                log=self.stdout.write if verbose else None,
+            )
+            self.stdout.write(f"{table.name}: выгружено {exported}")
+        checkpoint.remove()
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def generate(post_id):
+    try:
+        return thumbnails.generate(post_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры для уже загруженных картинок постов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Перестроить и те, у которых миниатюры уже есть.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help="0 — строить в текущем потоке.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").order_by("pk")
+        if not options["all"]:
+            posts = posts.filter(thumbnails="")
+        ids = posts.values_list("pk", flat=True)
+        done = failed = 0
+        last_id = 0
+        pool = None
+        if options["workers"] > 0:
+            pool = ThreadPoolExecutor(max_workers=options["workers"])
+        try:
+            # Пачки по ключу, а не iterator(): открытое чтение в SQLite
+            # не даёт воркерам записать результат.
+            while True:
+                batch = list(
+                    ids.filter(pk__gt=last_id)[:options["batch_size"]]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1]
+                batch_done, batch_failed = self.run(pool, batch)
+                done += batch_done
+                failed += batch_failed
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(f"Готово: {done}, с ошибками: {failed}")
+
+    def run(self, pool, batch):
+        """Строит миниатюры пачки, возвращает (успешно, с ошибками)."""
+        if pool is None:
+            calls = [partial(thumbnails.generate, pk) for pk in batch]
+        else:
+            calls = [pool.submit(generate, pk).result for pk in batch]
+        done = 0
+        for call in calls:
+            try:
+                call()
+                done += 1
+            except Exception as error:
+                self.stderr.write(f"{error!r}")
+        return done, len(calls) - done
@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает выгрузку export_content: строки пишутся bulk_create "
+        "пачками, каждая в своей транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог выгрузки.")
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default="ndjson"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с сохранённой контрольной точки.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not any(
+            os.path.exists(
+                transfer.table_path(directory, table, options["format"])
+            )
+            for table in transfer.TABLES
+        ):
+            raise CommandError(f"В {directory} нет файлов выгрузки.")
+        checkpoint = transfer.Checkpoint(
+            directory, transfer.IMPORT_CHECKPOINT, options["resume"]
+        )
+        verbose = options["verbosity"] > 1
+        for table in transfer.TABLES:
+            if checkpoint.is_done(table):
+                continue
+            try:
+                imported = transfer.import_table(
+                    table,
+                    directory,
+                    options["format"],
+                    options["batch_size"],
+                    checkpoint,
+                    log=self.stdout.write if verbose else None,
+                )
+            except transfer.ConflictError as error:
+                raise CommandError(
+                    f"{error}. Загрузка остановлена, продолжить можно "
+                    "с --resume."
+                )
+            self.stdout.write(f"{table.name}: прочитано {imported}")
+        checkpoint.remove()
+        transfer.rebuild_derived(self.stdout, options["batch_size"])
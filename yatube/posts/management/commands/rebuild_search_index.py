@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Строит поисковый индекс постов заново, читая посты пачками."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.SEARCH_REBUILD_BATCH_SIZE,
+            help="Сколько постов индексировать за один запрос.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = search.get_backend().rebuild(options["batch_size"])
+        self.stdout.write(f"Проиндексировано постов: {total}")
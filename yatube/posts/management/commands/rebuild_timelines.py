@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = "Пересобирает материализованные ленты подписок."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="Только ленты этих пользователей."
+        )
+
+    def handle(self, *args, **options):
+        if not timeline.is_enabled():
+            raise CommandError("FOLLOW_FEED_MATERIALIZED выключен.")
+        users = User.objects.filter(follower__isnull=False).distinct()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+        rebuilt = 0
+        for user in users.iterator():
+            timeline.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(f"Пересобрано лент: {rebuilt}")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding, transfer
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Засевает базу пользователями, группами, постами, комментариями "
+        "и подписками. Один и тот же --seed даёт те же данные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=200000)
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=30,
+            help="Подписок на одного пользователя.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Показатель распределения Ципфа для авторов.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Сначала удалить данные прошлого засева.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            seeding.clear()
+        elif User.objects.filter(
+            username__startswith=seeding.USERNAME_PREFIX
+        ).exists():
+            raise CommandError(
+                "База уже засеяна: запустите с --clear, чтобы пересоздать."
+            )
+        created = seeding.seed(
+            users=options["users"],
+            groups=options["groups"],
+            posts=options["posts"],
+            comments=options["comments"],
+            follows=options["follows"],
+            seed=options["seed"],
+            zipf_exponent=options["zipf"],
+            batch_size=options["batch_size"],
+        )
+        transfer.rebuild_derived(self.stdout, options["batch_size"])
+        for table, count in created.items():
+            self.stdout.write(f"{table}: {count}")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Рассылает дайджесты новых постов подписок через EMAIL_BACKEND. "
+        "Запускается по расписанию; частоту писем ограничивает "
+        "DIGEST_MIN_INTERVAL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.DIGEST_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        sent = notifications.send_digests(options["batch_size"])
+        self.stdout.write(f"Отправлено писем: {sent}")
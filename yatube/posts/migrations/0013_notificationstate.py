@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_states(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    NotificationState = apps.get_model('posts', 'NotificationState')
+    NotificationState.objects.bulk_create(
+        (
+            NotificationState(user_id=user_id)
+            for user_id in Follow.objects.values_list(
+                'user_id', flat=True
+            ).distinct()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('digest_sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(create_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gte=settings.FOLLOW_FEED_FANOUT_LIMIT
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_notificationstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='feed_pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 
 User = get_user_model()
@@ -14,6 +17,29 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводит карточка поста в лентах.
+    FEED_FIELDS = (
+        "text",
+        "pub_date",
+        "image",
+        "comments_count",
+        "version",
+        "thumbnails",
+        "author__username",
+        "author__first_name",
+        "author__last_name",
+        "group__title",
+        "group__slug",
+    )
+
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related("author", "group").only(
+            "author", "group", *self.FEED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Tекст поста")
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -29,13 +55,46 @@ class Post(models.Model):
         related_name="posts",
     )
     image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    # Версия карточки поста: входит в ключ кэша post_card.html.
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # JSON с адресами заранее подготовленных миниатюр (posts.thumbnails).
+    thumbnails = models.TextField(blank=True, default="", editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["-pub_date"]),
+            models.Index(fields=["author", "-pub_date"]),
+            models.Index(fields=["group", "-pub_date"]),
+        ]
 
     def __str__(self):
         return self.text
 
+    @property
+    def precomputed_thumbnails(self):
+        """Миниатюры, если они построены для текущей картинки."""
+        if not self.thumbnails or not self.image:
+            return {}
+        thumbnails = json.loads(self.thumbnails)
+        if thumbnails.pop("image", None) != self.image.name:
+            return {}
+        return thumbnails
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при смене группы нужно сбросить
+        # кэш обеих лент. Без group_id в выборке её дочитает pre_save.
+        if "group_id" in field_names:
+            instance._loaded_group_id = dict(zip(field_names, values))[
+                "group_id"
+            ]
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -47,6 +106,10 @@ class Comment(models.Model):
     text = models.TextField(verbose_name="Tекст комментария")
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ["created"]
+        indexes = [models.Index(fields=["post", "created"])]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -59,3 +122,67 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name="following",
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_follow"
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F("author")),
+                name="prevent_self_follow",
+            ),
+        ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="counters",
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам подписчиков (timeline).
+    feed_pulled = models.BooleanField(default=False)
+
+
+class NotificationState(models.Model):
+    """Новые посты подписок пользователя и его дайджест (notifications)."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_state",
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    # Посты подписок до seen_at пользователь уже видел в ленте.
+    seen_at = models.DateTimeField(default=timezone.now)
+    # Посты до digest_sent_at уже ушли в письмо.
+    digest_sent_at = models.DateTimeField(null=True, blank=True)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-pub_date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "-pub_date"])]
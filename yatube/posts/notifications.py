@@ -0,0 +1,160 @@
+"""Уведомления о новых постах подписок.
+
+Счётчик непрочитанных хранится в NotificationState: новый пост
+прибавляет единицу всем подписчикам автора одним UPDATE (задача
+очереди posts.notify), открытая лента подписок счётчик обнуляет. Шапка
+сайта читает готовое число, а не ленту подписок: оно приходит
+вместе с пользователем сессии (users.backends).
+
+Дайджест (manage.py send_digests) обходит пользователей с
+непрочитанными постами пачками по DIGEST_BATCH_SIZE: на пачку — один
+запрос постов подписок через join с Follow, один запрос карточек
+и одно соединение EMAIL_BACKEND для всех писем. Письмо получает
+не чаще раза в DIGEST_MIN_INTERVAL секунд, в нём не больше
+DIGEST_MAX_POSTS новых постов, которые не ушли в прошлое письмо
+и не были видны в ленте.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Follow, NotificationState, Post
+from .utils import batched
+
+
+def ensure_state(user_id):
+    NotificationState.objects.bulk_create(
+        [NotificationState(user_id=user_id)], ignore_conflicts=True
+    )
+
+
+def create_states(batch_size):
+    """Состояния подписчиков, созданных bulk_create без сигналов."""
+    user_ids = (
+        Follow.objects.filter(user__notification_state__isnull=True)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for batch in batched(user_ids.iterator(), batch_size):
+        NotificationState.objects.bulk_create(
+            [NotificationState(user_id=user_id) for user_id in batch],
+            ignore_conflicts=True,
+        )
+
+
+def unread_count(user):
+    # Пользователь сессии приходит с состоянием (users.backends).
+    try:
+        return user.notification_state.unread_count
+    except NotificationState.DoesNotExist:
+        return 0
+
+
+def mark_seen(user):
+    NotificationState.objects.filter(user=user).update(
+        unread_count=0, seen_at=timezone.now()
+    )
+
+
+def count_new_posts(post_ids):
+    """Прибавляет посты к непрочитанным у подписчиков их авторов."""
+    posts = Post.objects.filter(pk__in=post_ids).values_list(
+        "author_id", "pub_date"
+    )
+    for author_id, pub_date in posts:
+        # Запрос на пост, а не на подписчика. Кто уже открыл ленту
+        # после публикации, видел пост и без счётчика.
+        NotificationState.objects.filter(
+            user__follower__author_id=author_id, seen_at__lt=pub_date
+        ).update(unread_count=F("unread_count") + 1)
+
+
+def collect(states, until):
+    """{id пользователя: id новых постов подписок}, свежие первыми."""
+    prefix = "author__following__user__notification_state__"
+    # Граница у каждого подписчика своя: её сравнивает сама база.
+    rows = (
+        Post.objects.filter(
+            Q(**{f"{prefix}digest_sent_at__isnull": True})
+            | Q(pub_date__gt=F(f"{prefix}digest_sent_at")),
+            author__following__user_id__in=[
+                state.user_id for state in states
+            ],
+            pub_date__gt=F(f"{prefix}seen_at"),
+            pub_date__lte=until,
+        )
+        .order_by("-pub_date", "-pk")
+        .values_list("author__following__user_id", "pk")
+    )
+    post_ids = defaultdict(list)
+    for user_id, pk in rows.iterator():
+        if len(post_ids[user_id]) < settings.DIGEST_MAX_POSTS:
+            post_ids[user_id].append(pk)
+    return post_ids
+
+
+def build_message(user, posts):
+    context = {
+        "user": user,
+        "posts": posts,
+        "site_url": settings.SITE_URL.rstrip("/"),
+    }
+    return mail.EmailMessage(
+        subject=f"Новые посты в подписках: {len(posts)}",
+        body=render_to_string("posts/email/digest.txt", context),
+        to=[user.email],
+    )
+
+
+def send_batch(states, now, connection):
+    post_ids = collect(states, now)
+    posts = Post.objects.feed().in_bulk(
+        {pk for ids in post_ids.values() for pk in ids}
+    )
+    recipients = [state for state in states if post_ids.get(state.pk)]
+    if not recipients:
+        return 0
+    connection.send_messages(
+        [
+            build_message(
+                state.user, [posts[pk] for pk in post_ids[state.pk]]
+            )
+            for state in recipients
+        ]
+    )
+    NotificationState.objects.filter(
+        pk__in=[state.pk for state in recipients]
+    ).update(digest_sent_at=now)
+    return len(recipients)
+
+
+def pending_digests(now):
+    border = now - timedelta(seconds=settings.DIGEST_MIN_INTERVAL)
+    return (
+        NotificationState.objects.filter(unread_count__gt=0)
+        .filter(Q(digest_sent_at__isnull=True) | Q(digest_sent_at__lte=border))
+        .exclude(user__email="")
+        .select_related("user")
+        .only("seen_at", "digest_sent_at", "user__username", "user__email")
+        .order_by("pk")
+    )
+
+
+def send_digests(batch_size=None):
+    """Рассылает дайджесты; возвращает число писем."""
+    batch_size = batch_size or settings.DIGEST_BATCH_SIZE
+    now = timezone.now()
+    states = pending_digests(now)
+    sent = last_id = 0
+    with mail.get_connection() as connection:
+        while True:
+            batch = list(states.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                return sent
+            last_id = batch[-1].pk
+            sent += send_batch(batch, now, connection)
@@ -0,0 +1,157 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Ключ страницы складывается из пути с параметрами и двух поколений:
+общего для сайта и поколения конкретной ленты ("index", "group:<slug>",
+"profile:<username>", "post:<id>"). Запись в ленту меняет её поколение,
+и старые страницы больше не находятся; они вытесняются по таймауту.
+
+Реплика может ещё не видеть запись, сменившую поколение. Поэтому
+первые REPLICA_PIN_SECONDS после смены поколения страницы собираются
+из основной базы (fill_reads), и в кэш не попадает старая копия
+под новым поколением.
+"""
+import hashlib
+import time
+import uuid
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core import routing
+
+SITE = "site"
+GENERATION_KEY = "page_generation:{}"
+PAGE_KEY = "page:{}"
+
+
+def _new_generation():
+    return f"{uuid.uuid4().hex}@{time.time():.3f}"
+
+
+def _issued(version):
+    # Поколения без времени остались от прежнего формата: они старые.
+    _, at, issued = version.partition("@")
+    return float(issued) if at else 0.0
+
+
+def _set_generations(keys):
+    cache.set_many({key: _new_generation() for key in keys}, None)
+
+
+def bump(*feeds):
+    """Сбрасывает закэшированные страницы лент сразу и после коммита.
+
+    Новое поколение, выданное до коммита, соседний анонимный запрос
+    успевает заполнить страницей со старыми данными; второй сброс
+    после коммита такие страницы отбрасывает.
+    """
+    keys = [GENERATION_KEY.format(feed) for feed in feeds]
+    _set_generations(keys)
+    transaction.on_commit(lambda: _set_generations(keys))
+
+
+def generations(feed):
+    keys = [GENERATION_KEY.format(SITE), GENERATION_KEY.format(feed)]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def fill_reads(versions):
+    """Откуда читать данные для кэша под поколениями versions.
+
+    Пока поколение моложе REPLICA_PIN_SECONDS, реплика может не видеть
+    сменившую его запись — читаем основную базу.
+    """
+    border = time.time() - settings.REPLICA_PIN_SECONDS
+    if all(_issued(version) < border for version in versions):
+        return nullcontext()
+    return routing.primary_reads()
+
+
+def _page_key(request, versions):
+    raw = ":".join([*versions, request.get_full_path()])
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_USED")
+    )
+
+
+def _finish(request, response, etag, last_modified, status):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["X-Page-Cache"] = status
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response
+    )
+
+
+def anonymous_page_cache(feed):
+    """Кэширует ответы view для анонимных GET/HEAD.
+
+    feed — шаблон имени ленты, подставляются аргументы view:
+    @anonymous_page_cache("group:{slug}").
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not settings.PAGE_CACHE_ENABLED
+                or request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            versions = generations(feed.format(**kwargs))
+            key = _page_key(request, versions)
+            entry = cache.get(key)
+            if entry is not None:
+                response = HttpResponse(
+                    entry["content"], content_type=entry["content_type"]
+                )
+                return _finish(
+                    request,
+                    response,
+                    entry["etag"],
+                    entry["last_modified"],
+                    "hit",
+                )
+            with fill_reads(versions):
+                response = view(request, *args, **kwargs)
+                if hasattr(response, "render") and callable(response.render):
+                    response.render()
+            if not _cacheable(request, response):
+                return response
+            entry = {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+                "last_modified": int(time.time()),
+            }
+            cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+            return _finish(
+                request,
+                response,
+                entry["etag"],
+                entry["last_modified"],
+                "miss",
+            )
+
+        return wrapper
+
+    return decorator
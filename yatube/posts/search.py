@@ -0,0 +1,291 @@
+"""Полнотекстовый поиск по постам.
+
+Документ поиска — пост целиком: его текст, тексты комментариев,
+название группы и имя автора. Бэкенд выбирается настройкой
+SEARCH_BACKEND; для SQLite это FTS5, для остальных баз — поиск
+через icontains.
+
+Комментарий меняет только свою часть документа и в той же
+транзакции (posts.signals): пост, автор и группа не перечитываются,
+остальные комментарии тоже.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class SearchBackend:
+    """Интерфейс бэкенда поиска."""
+
+    def index_posts(self, post_ids):
+        """Переиндексирует посты; удалённые убирает из индекса."""
+        raise NotImplementedError
+
+    def remove_posts(self, post_ids):
+        raise NotImplementedError
+
+    def add_comment(self, post_id, text):
+        """Дописывает текст комментария в документ поста."""
+        raise NotImplementedError
+
+    def remove_comment(self, post_id, text):
+        """Убирает текст комментария из документа поста."""
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        """Список id постов, самые подходящие первыми."""
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query):
+        """Оставляет в queryset только найденные посты, без ранжирования."""
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def rebuild(self, batch_size):
+        """Строит индекс заново, читая посты пачками. Возвращает их число."""
+        raise NotImplementedError
+
+
+class SimpleBackend(SearchBackend):
+    """Поиск без индекса: подходит для любой базы, ранжирует по дате."""
+
+    def index_posts(self, post_ids):
+        pass
+
+    def remove_posts(self, post_ids):
+        pass
+
+    def add_comment(self, post_id, text):
+        pass
+
+    def remove_comment(self, post_id, text):
+        pass
+
+    def _filter(self, query):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return Post.objects.none().values("pk")
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(text__icontains=token)
+                | Q(comments__text__icontains=token)
+                | Q(group__title__icontains=token)
+                | Q(author__username__icontains=token)
+                | Q(author__first_name__icontains=token)
+                | Q(author__last_name__icontains=token)
+            )
+        return Post.objects.filter(condition).values("pk").distinct()
+
+    def search(self, query, offset, limit):
+        posts = self._filter(query).order_by("-pub_date")
+        return [row["pk"] for row in posts[offset:offset + limit]]
+
+    def filter_queryset(self, queryset, query):
+        return queryset.filter(pk__in=self._filter(query))
+
+    def count(self, query):
+        return self._filter(query).count()
+
+    def rebuild(self, batch_size):
+        return 0
+
+
+class FTS5Backend(SearchBackend):
+    """Индекс в виртуальной таблице SQLite FTS5, ранжирование bm25.
+
+    rowid строки индекса совпадает с id поста.
+    """
+
+    table = "posts_post_search"
+    # Веса колонок text, comments, group_title, author для bm25.
+    weights = (10.0, 2.0, 5.0, 5.0)
+
+    @staticmethod
+    def match_expression(query):
+        """Превращает ввод пользователя в безопасный запрос FTS5.
+
+        Каждое слово ищется как префикс, все слова обязательны.
+        """
+        tokens = TOKEN_RE.findall(query.lower())
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def _documents(self, post_ids):
+        posts = Post.objects.filter(pk__in=post_ids).select_related(
+            "author", "group"
+        )
+        comments = {}
+        for post_id, text in Comment.objects.filter(
+            post_id__in=post_ids
+        ).values_list("post_id", "text"):
+            comments.setdefault(post_id, []).append(text)
+        for post in posts:
+            author = post.author
+            yield (
+                post.pk,
+                post.text,
+                "\n".join(comments.get(post.pk, [])),
+                post.group.title if post.group else "",
+                " ".join(
+                    filter(
+                        None,
+                        [author.username, author.first_name, author.last_name],
+                    )
+                ),
+            )
+
+    def remove_posts(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                post_ids,
+            )
+
+    def add_comment(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self.table} SET comments = CASE comments "
+                "WHEN '' THEN %s ELSE comments || char(10) || %s END "
+                "WHERE rowid = %s",
+                [text, text, post_id],
+            )
+
+    def remove_comment(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT comments FROM {self.table} WHERE rowid = %s",
+                [post_id],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return
+            # Тексты разделены переводом строки; рамка из них по краям
+            # не даёт найти комментарий внутри чужого слова.
+            document = f"\n{row[0]}\n"
+            start = document.find(f"\n{text}\n")
+            if start < 0:
+                return
+            document = document[:start] + document[start + len(text) + 1:]
+            cursor.execute(
+                f"UPDATE {self.table} SET comments = %s WHERE rowid = %s",
+                [document[1:-1], post_id],
+            )
+
+    def index_posts(self, post_ids):
+        post_ids = list(post_ids)
+        batch_size = settings.SEARCH_REBUILD_BATCH_SIZE
+        for start in range(0, len(post_ids), batch_size):
+            batch = post_ids[start:start + batch_size]
+            self.remove_posts(batch)
+            self._insert(self._documents(batch))
+
+    def _insert(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} "
+                "(rowid, text, comments, group_title, author) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+
+    def search(self, query, offset, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        weights = ", ".join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} "
+                f"WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) "
+                "LIMIT %s OFFSET %s",
+                [expression, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter_queryset(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {self.table} "
+                f"WHERE {self.table} MATCH %s",
+                [expression],
+            )
+        )
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {self.table} "
+                f"WHERE {self.table} MATCH %s",
+                [expression],
+            )
+            return cursor.fetchone()[0]
+
+    def rebuild(self, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        ids = Post.objects.order_by("pk").values_list("pk", flat=True)
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                return total
+            self._insert(self._documents(batch))
+            total += len(batch)
+            last_id = batch[-1]
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+class SearchResults:
+    """Ленивая выдача поиска для Paginator: посты читаются по срезу."""
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+
+    @cached_property
+    def _count(self):
+        return self.backend.count(self.query)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop or self._count) - offset
+        ids = self.backend.search(self.query, offset, limit)
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
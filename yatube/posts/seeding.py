@@ -0,0 +1,251 @@
+"""Генерация больших наборов данных для нагрузочных проверок.
+
+Данные зависят только от seed: один и тот же seed даёт те же
+пользователи, посты, комментарии и подписки. Авторы постов и популярные
+авторы в подписках выбираются по закону Ципфа — несколько авторов пишут
+и собирают подписчиков больше всех, как на живом сайте. Всё пишется
+bulk_create пачками по batch_size, поэтому объём памяти не растёт
+с числом постов.
+"""
+import datetime as dt
+import heapq
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    NotificationState,
+    Post,
+    TimelineEntry,
+    User,
+    UserCounter,
+)
+from .utils import batched, keep_auto_dates
+
+USERNAME_PREFIX = "seed_user_"
+GROUP_SLUG_PREFIX = "seed-"
+WORDS = (
+    "лето", "река", "город", "книга", "дорога", "утро", "поезд", "море",
+    "лес", "письмо", "кофе", "снег", "музыка", "окно", "друг", "работа",
+)
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса рангов 1..count: вес ранга k равен 1 / k**s."""
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def _text(rnd, words):
+    return " ".join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _raw_delete(queryset):
+    queryset._raw_delete(queryset.db)
+
+
+def clear():
+    """Удаляет данные прошлого засева.
+
+    Удаление идёт пачками SQL в обход сигналов: построчный каскад
+    на сотнях тысяч строк слишком долог. Счётчики, поисковый индекс
+    и кэши после этого нужно пересчитать (transfer.rebuild_derived).
+    Задачи очереди с id удалённых постов не трогаются: их обработчики
+    пропускают посты, которых уже нет.
+    """
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    groups = Group.objects.filter(slug__startswith=GROUP_SLUG_PREFIX)
+    posts = Post.objects.filter(author__in=users)
+    with transaction.atomic():
+        _raw_delete(
+            Comment.objects.filter(Q(author__in=users) | Q(post__in=posts))
+        )
+        _raw_delete(
+            TimelineEntry.objects.filter(Q(user__in=users) | Q(post__in=posts))
+        )
+        _raw_delete(
+            Follow.objects.filter(Q(user__in=users) | Q(author__in=users))
+        )
+        Post.objects.filter(group__in=groups).update(group=None)
+        _raw_delete(posts)
+        _raw_delete(groups)
+        _raw_delete(UserCounter.objects.filter(user__in=users))
+        _raw_delete(NotificationState.objects.filter(user__in=users))
+        _raw_delete(users)
+
+
+def _insert(model, objects, batch_size, dated_fields=()):
+    for batch in batched(objects, batch_size):
+        with transaction.atomic(), keep_auto_dates(model, dated_fields):
+            model.objects.bulk_create(batch)
+
+
+def _users(count):
+    password = make_password(None)
+    for i in range(count):
+        yield User(username=f"{USERNAME_PREFIX}{i}", password=password)
+
+
+def _groups(rnd, count):
+    for i in range(count):
+        yield Group(
+            title=f"Группа {i}",
+            slug=f"{GROUP_SLUG_PREFIX}{i}",
+            description=_text(rnd, 12),
+        )
+
+
+def _posts(rnd, count, user_ids, weights, group_ids, now, days):
+    period = dt.timedelta(days=days)
+    for _ in range(count):
+        group_id = None
+        if group_ids and rnd.random() < 0.7:
+            group_id = rnd.choice(group_ids)
+        yield Post(
+            author_id=rnd.choices(user_ids, cum_weights=weights)[0],
+            group_id=group_id,
+            text=_text(rnd, rnd.randint(5, 60)),
+            pub_date=now - period * rnd.random(),
+        )
+
+
+def _post_batches(posts, batch_size):
+    """Пары (id, дата) постов пачками по id, без открытого курсора."""
+    last_pk = 0
+    while True:
+        batch = list(
+            posts.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "pub_date")[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        yield batch
+
+
+def _comments(rnd, count, posts, user_ids, now, batch_size):
+    """Комментарии к случайным постам; посты читаются пачками.
+
+    На пачку приходится доля комментариев по числу её постов,
+    поэтому все посты в памяти не держатся.
+    """
+    remaining = posts.count()
+    for batch in _post_batches(posts, batch_size):
+        share = count * len(batch) / remaining
+        in_batch = int(share) + (rnd.random() < share - int(share))
+        count -= in_batch
+        remaining -= len(batch)
+        for _ in range(in_batch):
+            post_id, pub_date = rnd.choice(batch)
+            yield Comment(
+                post_id=post_id,
+                author_id=rnd.choice(user_ids),
+                text=_text(rnd, rnd.randint(3, 20)),
+                created=pub_date + (now - pub_date) * rnd.random(),
+            )
+
+
+def _authors(rnd, user_id, wanted, user_ids, weights, cum_weights):
+    """wanted разных авторов для user_id с весами по Ципфу."""
+    authors = set()
+    # Пока авторов нужно мало, повторы выпадают редко.
+    for _ in range(wanted * 4):
+        if len(authors) == wanted:
+            return authors
+        author_id = rnd.choices(user_ids, cum_weights=cum_weights)[0]
+        if author_id != user_id:
+            authors.add(author_id)
+    # Остальных — выборкой без возвращения (Efraimidis — Spirakis).
+    keys = (
+        (rnd.random() ** (1 / weight), author_id)
+        for author_id, weight in zip(user_ids, weights)
+        if author_id != user_id and author_id not in authors
+    )
+    authors.update(
+        author_id
+        for _, author_id in heapq.nlargest(wanted - len(authors), keys)
+    )
+    return authors
+
+
+def _follows(rnd, per_user, user_ids, cum_weights):
+    wanted = min(per_user, len(user_ids) - 1)
+    weights = [
+        high - low for low, high in zip([0, *cum_weights], cum_weights)
+    ]
+    for user_id in user_ids:
+        authors = _authors(
+            rnd, user_id, wanted, user_ids, weights, cum_weights
+        )
+        for author_id in sorted(authors):
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def seed(
+    users,
+    groups,
+    posts,
+    comments,
+    follows,
+    seed=0,
+    zipf_exponent=1.1,
+    days=365,
+    batch_size=1000,
+    now=None,
+):
+    """Засевает базу; follows — подписок на одного пользователя.
+
+    Даты постов раскладываются на days дней назад от now. Возвращает
+    словарь с числом созданных строк по таблицам.
+    """
+    rnd = random.Random(seed)
+    now = now or timezone.now()
+    _insert(User, _users(users), batch_size)
+    _insert(Group, _groups(rnd, groups), batch_size)
+    # Порядок id — это ранг пользователя по Ципфу.
+    user_ids = list(
+        User.objects.filter(username__startswith=USERNAME_PREFIX)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith=GROUP_SLUG_PREFIX)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    weights = zipf_weights(len(user_ids), zipf_exponent)
+    _insert(
+        Post,
+        _posts(rnd, posts, user_ids, weights, group_ids, now, days),
+        batch_size,
+        ["pub_date"],
+    )
+    seeded_posts = Post.objects.filter(
+        author__username__startswith=USERNAME_PREFIX
+    )
+    posts_created = seeded_posts.count()
+    if not posts_created:
+        comments = 0
+    _insert(
+        Comment,
+        _comments(rnd, comments, seeded_posts, user_ids, now, batch_size),
+        batch_size,
+        ["created"],
+    )
+    _insert(Follow, _follows(rnd, follows, user_ids, weights), batch_size)
+    return {
+        "users": len(user_ids),
+        "groups": len(group_ids),
+        "posts": posts_created,
+        "comments": comments,
+        "follows": Follow.objects.filter(
+            user__username__startswith=USERNAME_PREFIX
+        ).count(),
+    }
@@ -0,0 +1,288 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, notifications, page_cache, search, tasks, timeline
+from .models import Comment, Follow, Group, Post, User
+from .utils import invalidate_feed_counts
+
+
+def post_feeds(post):
+    feeds = {"index", f"profile:{post.author_id}"}
+    for group_id in (post.group_id, getattr(post, "_loaded_group_id", None)):
+        if group_id is not None:
+            feeds.add(f"group:{group_id}")
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    feeds.update(f"follow:{user_id}" for user_id in followers)
+    return feeds
+
+
+@receiver(pre_save, sender=Post)
+def load_saved_group(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, "_loaded_group_id"):
+        return
+    instance._loaded_group_id = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list("group_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Post)
+def reset_post_feed_counts(sender, instance, created, **kwargs):
+    # Правка текста не меняет число записей ни в одной ленте.
+    loaded_group_id = getattr(instance, "_loaded_group_id", None)
+    if created or instance.group_id != loaded_group_id:
+        invalidate_feed_counts(*post_feeds(instance))
+
+
+@receiver(post_delete, sender=Post)
+def reset_deleted_post_feed_counts(sender, instance, **kwargs):
+    invalidate_feed_counts(*post_feeds(instance))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_follow_feed_count(sender, instance, **kwargs):
+    invalidate_feed_counts(f"follow:{instance.user_id}")
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def notify_followers(sender, instance, created, **kwargs):
+    if created:
+        tasks.notify(instance)
+
+
+@receiver(post_save, sender=Follow)
+def create_notification_state(sender, instance, created, **kwargs):
+    if created:
+        notifications.ensure_state(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, create=False, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, create=False, following_count=-1)
+    counters.bump_user(instance.author_id, create=False, followers_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def update_pulled_author(sender, instance, **kwargs):
+    # После счётчиков: флаг раскладки сверяется с числом подписчиков.
+    tasks.update_pulled(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def bump_edited_post_version(sender, instance, created, **kwargs):
+    if not created:
+        Post.objects.filter(pk=instance.pk).update(version=F("version") + 1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group_posts_version(sender, instance, **kwargs):
+    Post.objects.filter(group=instance).update(version=F("version") + 1)
+
+
+NAME_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(pre_save, sender=User)
+def remember_display_name(sender, instance, update_fields=None, **kwargs):
+    # Имя автора выводят карточки и индекс поиска; пароль, last_login
+    # и прочие поля их не касаются.
+    instance._display_name_changed = False
+    if instance._state.adding:
+        return
+    if update_fields and not set(NAME_FIELDS) & set(update_fields):
+        return
+    saved = (
+        User.objects.filter(pk=instance.pk).values_list(*NAME_FIELDS).first()
+    )
+    current = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    instance._display_name_changed = saved not in (None, current)
+
+
+def display_name_changed(user):
+    """Сохранение пользователя поменяло имя, которое видно в постах."""
+    return getattr(user, "_display_name_changed", False)
+
+
+@receiver(post_save, sender=User)
+def bump_author_posts_version(sender, instance, **kwargs):
+    if display_name_changed(instance):
+        Post.objects.filter(author=instance).update(version=F("version") + 1)
+
+
+def post_pages(post):
+    group_ids = {post.group_id, getattr(post, "_loaded_group_id", None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        "slug", flat=True
+    )
+    return [
+        "index",
+        f"post:{post.pk}",
+        f"profile:{post.author.username}",
+        *(f"group:{slug}" for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def reset_post_pages(sender, instance, **kwargs):
+    page_cache.bump(*post_pages(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_comment_pages(sender, instance, **kwargs):
+    page_cache.bump(*post_pages(instance.post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_follow_pages(sender, instance, **kwargs):
+    page_cache.bump(
+        f"profile:{instance.user.username}",
+        f"profile:{instance.author.username}",
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reset_all_pages(sender, instance, **kwargs):
+    page_cache.bump(page_cache.SITE)
+
+
+@receiver(post_save, sender=User)
+def reset_pages_on_author_change(sender, instance, **kwargs):
+    if display_name_changed(instance):
+        page_cache.bump(page_cache.SITE)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    tasks.reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    tasks.reindex([instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post_before_comments(sender, instance, **kwargs):
+    # Каскад удаляет комментарии по одному: без строки индекса
+    # они не переписывают документ уходящего поста.
+    search.get_backend().remove_posts([instance.pk])
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_text(sender, instance, **kwargs):
+    # Правке нужен прежний текст, чтобы убрать его из документа поста.
+    if not instance._state.adding:
+        instance._search_indexed = (
+            Comment.objects.filter(pk=instance.pk)
+            .values_list("post_id", "text")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, **kwargs):
+    indexed = getattr(instance, "_search_indexed", None)
+    if indexed == (instance.post_id, instance.text):
+        return
+    backend = search.get_backend()
+    if indexed is not None:
+        backend.remove_comment(*indexed)
+    backend.add_comment(instance.post_id, instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    search.get_backend().remove_comment(instance.post_id, instance.text)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        tasks.reindex(instance.posts.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # После удаления group_id у постов уже обнулён, поэтому id берём заранее.
+    instance._search_post_ids = list(
+        instance.posts.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Group)
+def reindex_ungrouped_posts(sender, instance, **kwargs):
+    tasks.reindex(getattr(instance, "_search_post_ids", []))
+
+
+@receiver(post_save, sender=User)
+def reindex_author_posts(sender, instance, **kwargs):
+    if display_name_changed(instance):
+        tasks.reindex(instance.posts.values_list("pk", flat=True))
+
+
+# Подключается последним: обработчикам выше нужна группа до сохранения.
+@receiver(post_save, sender=Post)
+def remember_saved_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.group_id
@@ -0,0 +1,70 @@
+"""Обработчики очереди core.tasks для побочных работ записи постов.
+
+Счётчики и версии кэша страниц по-прежнему меняются в самой транзакции:
+автор должен сразу увидеть свой пост и верное число комментариев.
+В очередь уходит то, что может подождать воркера.
+"""
+from core import tasks
+
+from . import notifications, search, thumbnails, timeline
+from .models import Post
+
+INDEX = "posts.index"
+THUMBNAILS = "posts.thumbnails"
+FAN_OUT = "posts.fan_out"
+NOTIFY = "posts.notify"
+PUSH_AUTHOR = "posts.push_author"
+
+
+@tasks.handler(INDEX)
+def index_posts(payloads):
+    # Каждая задача — список id; удалённые посты index_posts убирает.
+    search.get_backend().index_posts(
+        sorted({pk for post_ids in payloads for pk in post_ids})
+    )
+
+
+# Миниатюры строятся вне транзакции, generate коммитит только UPDATE.
+@tasks.handler(THUMBNAILS, atomic=False)
+def generate_thumbnails(payloads):
+    for post_id in payloads:
+        thumbnails.generate(post_id)
+
+
+@tasks.handler(FAN_OUT)
+def fan_out_posts(payloads):
+    for post in Post.objects.filter(pk__in=payloads).only(
+        "author", "pub_date"
+    ):
+        timeline.fan_out_post(post)
+
+
+@tasks.handler(PUSH_AUTHOR)
+def push_authors(payloads):
+    for author_id in set(payloads):
+        timeline.push_author(author_id)
+
+
+@tasks.handler(NOTIFY)
+def count_unread(payloads):
+    notifications.count_new_posts(payloads)
+
+
+def reindex(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        tasks.enqueue(INDEX, post_ids)
+
+
+def fan_out(post):
+    if timeline.is_enabled():
+        tasks.enqueue(FAN_OUT, post.pk)
+
+
+def update_pulled(author_id):
+    if timeline.update_pulled(author_id):
+        tasks.enqueue(PUSH_AUTHOR, author_id)
+
+
+def notify(post):
+    tasks.enqueue(NOTIFY, post.pk)
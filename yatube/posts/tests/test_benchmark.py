@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import benchmark, seeding, transfer
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 95), 95)
+        self.assertEqual(benchmark.percentile([3], 95), 3)
+
+    def test_run_reports_every_view(self):
+        seeding.seed(users=5, groups=2, posts=30, comments=10, follows=2)
+        results = benchmark.run(repeat=2, warmup=0)
+        for name in (
+            "posts:index [anonymous]",
+            "posts:post_detail [user]",
+            "users:login [anonymous]",
+            "about:tech [user]",
+            "core:cache_stats [user]",
+        ):
+            self.assertIn(name, results)
+        self.assertNotIn("posts:profile_follow [user]", results)
+        self.assertNotIn("users:logout [user]", results)
+        self.assertEqual(results["posts:follow_index [user]"]["status"], 200)
+        self.assertGreater(results["posts:index [user]"]["render_ms"], 0)
+        for row in results.values():
+            self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+            self.assertIsInstance(row["queries"], int)
+
+    def test_measure_templates(self):
+        seeding.seed(users=5, groups=2, posts=30, comments=10, follows=2)
+        # Анонимам вторая страница пришла бы из кэша страниц.
+        client = Client()
+        client.force_login(benchmark.viewer())
+        results = benchmark.measure_templates(
+            client, [reverse("posts:index")], repeat=2
+        )
+        self.assertEqual(results["base.html"]["renders"], 1)
+        self.assertEqual(results["includes/header.html"]["loads"], 1)
+        self.assertEqual(
+            results["posts/includes/post_card.html"]["renders"],
+            settings.NUMBER_POSTS,
+        )
+        self.assertGreater(results["base.html"]["render_ms"], 0)
+
+    def test_benchmark_templates_command(self):
+        seeding.seed(users=5, groups=2, posts=30, comments=10, follows=2)
+        out = StringIO()
+        call_command(
+            "benchmark_templates",
+            "--repeat=1",
+            "--page=posts:index",
+            stdout=out,
+        )
+        report = out.getvalue()
+        self.assertIn("без кэша шаблонов", report)
+        self.assertIn("cached.Loader", report)
+        self.assertIn("includes/header.html", report)
+
+    def test_compare_reports_regressions(self):
+        baseline = {
+            "results": {
+                "a": {
+                    "status": 200,
+                    "p50_ms": 10.0,
+                    "render_ms": 4.0,
+                    "queries": 3,
+                },
+                "b": {
+                    "status": 200,
+                    "p50_ms": 1.0,
+                    "render_ms": 0.0,
+                    "queries": 0,
+                },
+            }
+        }
+        results = {
+            "a": {"status": 200, "p50_ms": 25.0, "render_ms": 5.0,
+                  "queries": 4},
+        }
+        self.assertEqual(
+            benchmark.compare(results, baseline, time_tolerance=0.5),
+            [
+                "a: запросов 3 -> 4",
+                "a: p50_ms 10.0 -> 25.0",
+                "b: адрес пропал из замера",
+            ],
+        )
+        self.assertEqual(
+            benchmark.compare(
+                results, baseline, query_slack=1, check_times=False
+            ),
+            ["b: адрес пропал из замера"],
+        )
+
+
+class QueryBaselineTest(TestCase):
+    """Число запросов каждой страницы не растёт относительно базовой линии.
+
+    Время здесь не проверяется: оно зависит от машины. Базовая линия
+    обновляется командой benchmark_views --fresh --save-baseline.
+    """
+
+    def test_queries_within_baseline(self):
+        cache.clear()
+        seeding.seed(**benchmark.BASELINE_DATASET)
+        transfer.rebuild_derived(StringIO(), 1000)
+        baseline = benchmark.load_baseline(settings.BENCHMARK_BASELINE)
+        self.assertEqual(baseline["dataset"], benchmark.BASELINE_DATASET)
+        results = benchmark.run(repeat=1, warmup=1)
+        problems = benchmark.compare(results, baseline, check_times=False)
+        self.assertEqual(problems, [])
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import run_on_commit
+from posts import comment_pages
+from posts.models import Comment, Post
+from posts.utils import CursorPaginator, keep_auto_dates
+
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPagesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="Vasy")
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(author=self.user, text="Пост")
+        # Пары комментариев с одним временем проверяют ключ (created, id).
+        now = timezone.now()
+        with keep_auto_dates(Comment, ["created"]):
+            Comment.objects.bulk_create(
+                Comment(
+                    post=self.post,
+                    author=self.user,
+                    text=f"Комментарий {i}",
+                    created=now + timezone.timedelta(seconds=i // 2),
+                )
+                for i in range(7)
+            )
+        self.texts = [f"Комментарий {i}" for i in range(7)]
+
+    def walk(self):
+        texts = []
+        cursor = None
+        while True:
+            comments, cursor = comment_pages.get_page(self.post.pk, cursor)
+            texts.extend(comment.text for comment in comments)
+            if cursor is None:
+                return texts
+
+    def test_pages_cover_all_comments_in_order(self):
+        self.assertEqual(self.walk(), self.texts)
+
+    def test_broken_cursor_gives_first_page(self):
+        # Курсор ленты постов длиннее ключа комментариев.
+        post_cursor = CursorPaginator.encode_cursor(
+            self.post, CursorPaginator.NEXT
+        )
+        for cursor in ("не курсор", post_cursor):
+            with self.subTest(cursor=cursor):
+                comments, _ = comment_pages.get_page(self.post.pk, cursor)
+                self.assertEqual(
+                    [comment.text for comment in comments], self.texts[:3]
+                )
+
+    def test_post_detail_shows_first_page(self):
+        response = self.client.get(
+            reverse("posts:post_detail", args=[self.post.pk])
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            self.texts[:3],
+        )
+        self.assertContains(
+            response,
+            reverse("posts:post_comments", args=[self.post.pk])
+            + f"?after={response.context['next_cursor']}",
+        )
+
+    def test_fragment_loads_next_chunk_in_one_query(self):
+        _, cursor = comment_pages.get_page(self.post.pk)
+        self.client.logout()
+        url = reverse("posts:post_comments", args=[self.post.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"after": cursor})
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            self.texts[3:6],
+        )
+        self.assertContains(response, "Vasy")
+        self.assertContains(response, "data-comments-more")
+
+    def test_first_page_cached_until_new_comment(self):
+        comment_pages.first_page(self.post.pk)
+        with self.assertNumQueries(0):
+            comment_pages.first_page(self.post.pk)
+        Comment.objects.filter(text="Комментарий 0").update(text="Изменён")
+        self.assertEqual(
+            comment_pages.first_page(self.post.pk)[0][0].text,
+            "Комментарий 0",
+        )
+        with run_on_commit():
+            self.client.post(
+                reverse("posts:add_comment", args=[self.post.pk]),
+                {"text": "Новый"},
+            )
+        comments, cursor = comment_pages.first_page(self.post.pk)
+        self.assertEqual(comments[0].text, "Изменён")
+        self.assertIsNotNone(cursor)
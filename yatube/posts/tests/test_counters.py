@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, UserCounter
+
+
+User = get_user_model()
+
+
+class CounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.author = User.objects.create_user(username="Fedy")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_post_create_and_delete_update_posts_count(self):
+        self.authorized_client.post(
+            reverse("posts:post_create"), {"text": "Новый пост"}
+        )
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        Post.objects.get(author=self.user).delete()
+        self.assertEqual(self.counters(self.user).posts_count, 0)
+
+    def test_add_comment_updates_comments_count(self):
+        post = Post.objects.create(author=self.author, text="Пост")
+        self.authorized_client.post(
+            reverse("posts:add_comment", kwargs={"post_id": post.id}),
+            {"text": "Комментарий"},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_drifted_counters_stay_at_zero(self):
+        post = Post.objects.create(author=self.author, text="Пост")
+        Comment.objects.create(post=post, author=self.user, text="Текст")
+        Post.objects.update(comments_count=0)
+        UserCounter.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_follow_and_unfollow_update_counts(self):
+        kwargs = {"username": self.author.username}
+        self.authorized_client.get(
+            reverse("posts:profile_follow", kwargs=kwargs)
+        )
+        self.assertEqual(self.counters(self.user).following_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.authorized_client.get(
+            reverse("posts:profile_unfollow", kwargs=kwargs)
+        )
+        self.assertEqual(self.counters(self.user).following_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+
+    def test_profile_reads_counters(self):
+        Post.objects.create(author=self.author, text="Пост")
+        response = self.client.get(
+            reverse("posts:profile", kwargs={"username": self.author})
+        )
+        self.assertEqual(response.context["counters"].posts_count, 1)
+        self.assertContains(response, "Всего постов: 1")
+
+    def test_rebuild_counters_command(self):
+        post = Post.objects.create(author=self.author, text="Пост")
+        Comment.objects.create(post=post, author=self.user, text="Текст")
+        Follow.objects.create(user=self.user, author=self.author)
+        UserCounter.objects.update(posts_count=42, followers_count=42)
+        Post.objects.update(comments_count=42)
+        call_command("rebuild_counters", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.user).following_count, 1)
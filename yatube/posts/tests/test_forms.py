@@ -1,11 +1,16 @@
+import os
 import tempfile
 import shutil
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.db.models import F
+from django.shortcuts import get_object_or_404
 
 from posts.models import Group, Post, Comment
 from posts.forms import CommentForm
@@ -15,6 +20,14 @@ User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00"
+    b"\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00"
+    b"\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
@@ -39,15 +52,8 @@ class PostFormTests(TestCase):
 
     def test_create_post(self):
         """Валидная форма создает запись."""
-        small_gif = (
-            b"\x47\x49\x46\x38\x39\x61\x01\x00"
-            b"\x01\x00\x00\x00\x00\x21\xf9\x04"
-            b"\x01\x0a\x00\x01\x00\x2c\x00\x00"
-            b"\x00\x00\x01\x00\x01\x00\x00\x02"
-            b"\x02\x4c\x01\x00\x3b"
-        )
         img = SimpleUploadedFile(
-            name="small.gif", content=small_gif, content_type="image/gif"
+            name="small.gif", content=SMALL_GIF, content_type="image/gif"
         )
         id_old = list(
             Post.objects.filter(author=self.user).values_list("id", flat=True)
@@ -73,6 +79,20 @@ class PostFormTests(TestCase):
             result_post.image.name, f'posts/{form_data["image"].name}'
         )
 
+    def test_failed_create_removes_image(self):
+        """Картинка непрошедшей записи не остаётся в хранилище."""
+        img = SimpleUploadedFile(
+            name="failed.gif", content=SMALL_GIF, content_type="image/gif"
+        )
+        form_data = {"text": "Пост", "image": img}
+        with mock.patch.object(Post, "save", side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.authorized_client.post(
+                    reverse("posts:post_create"), data=form_data
+                )
+        path = os.path.join(TEMP_MEDIA_ROOT, "posts", "failed.gif")
+        self.assertFalse(os.path.exists(path))
+
     def test_post_edit(self):
         """Валидная форма обновляет выбранный пост."""
         post = PostFormTests.post
@@ -93,6 +113,27 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data["text"])
         self.assertEqual(post.group.id, form_data["group"])
 
+    def test_post_edit_keeps_concurrent_counters(self):
+        """Правка не затирает счётчик, сдвинутый после чтения поста."""
+
+        def load_then_comment(*args, **kwargs):
+            post = get_object_or_404(*args, **kwargs)
+            Post.objects.filter(pk=post.pk).update(
+                comments_count=F("comments_count") + 1
+            )
+            return post
+
+        with mock.patch(
+            "posts.views.get_object_or_404", side_effect=load_then_comment
+        ):
+            self.authorized_client.post(
+                reverse("posts:post_edit", kwargs={"post_id": self.post.id}),
+                data={"text": "Правка", "group": self.group.id},
+            )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, "Правка")
+        self.assertEqual(post.comments_count, 1)
+
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
@@ -0,0 +1,139 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import notifications, transfer
+from posts.models import Follow, NotificationState, Post
+
+
+User = get_user_model()
+
+
+class NotificationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="Fedy")
+        self.user = User.objects.create_user(
+            username="Vasy", email="vasy@example.com"
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def unread(self, user):
+        return NotificationState.objects.get(user=user).unread_count
+
+    def test_new_posts_counted_for_followers(self):
+        Post.objects.create(author=self.author, text="Первый")
+        Post.objects.create(author=self.author, text="Второй")
+        Post.objects.create(author=self.user, text="Свой пост")
+        self.assertEqual(self.unread(self.user), 2)
+        response = self.authorized_client.get(reverse("posts:index"))
+        self.assertEqual(response.context["unread_posts"], 2)
+
+    def test_one_update_per_post_for_any_number_of_followers(self):
+        for number in range(20):
+            follower = User.objects.create_user(username=f"follower{number}")
+            Follow.objects.create(user=follower, author=self.author)
+        post = Post.objects.create(author=self.author, text="Пост")
+        NotificationState.objects.update(unread_count=0)
+        with self.assertNumQueries(2):
+            notifications.count_new_posts([post.pk])
+        self.assertEqual(
+            NotificationState.objects.filter(unread_count=1).count(), 21
+        )
+
+    def test_feed_is_read_only_and_seen_resets_counter(self):
+        Post.objects.create(author=self.author, text="Пост")
+        self.authorized_client.get(reverse("posts:follow_index"))
+        self.assertEqual(self.unread(self.user), 1)
+        url = reverse("posts:follow_seen")
+        self.assertEqual(self.authorized_client.get(url).status_code, 405)
+        self.assertEqual(self.authorized_client.post(url).status_code, 204)
+        self.assertEqual(self.unread(self.user), 0)
+
+    def test_digest_contains_new_posts_once(self):
+        post = Post.objects.create(author=self.author, text="Новости дня")
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ["vasy@example.com"])
+        self.assertIn("Новости дня", message.body)
+        self.assertIn(
+            reverse("posts:post_detail", kwargs={"post_id": post.pk}),
+            message.body,
+        )
+        self.assertEqual(notifications.send_digests(), 0)
+
+    def test_digest_rate_limit(self):
+        Post.objects.create(author=self.author, text="Первый")
+        notifications.send_digests()
+        Post.objects.create(author=self.author, text="Второй")
+        self.assertEqual(notifications.send_digests(), 0)
+        with self.settings(DIGEST_MIN_INTERVAL=0):
+            self.assertEqual(notifications.send_digests(), 1)
+        self.assertNotIn("Первый", mail.outbox[1].body)
+        self.assertIn("Второй", mail.outbox[1].body)
+
+    def test_seen_posts_and_users_without_email_skipped(self):
+        reader = User.objects.create_user(username="Nomail")
+        Follow.objects.create(user=reader, author=self.author)
+        Post.objects.create(author=self.author, text="Пост")
+        self.authorized_client.post(reverse("posts:follow_seen"))
+        self.assertEqual(notifications.send_digests(), 0)
+
+    @override_settings(DIGEST_MAX_POSTS=2)
+    def test_digest_is_limited(self):
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f"Пост {number}")
+        notifications.send_digests()
+        self.assertNotIn("Пост 0", mail.outbox[0].body)
+        self.assertIn("Пост 2", mail.outbox[0].body)
+
+    def test_digest_queries_do_not_grow_with_followers(self):
+        for number in range(10):
+            follower = User.objects.create_user(
+                username=f"follower{number}",
+                email=f"follower{number}@example.com",
+            )
+            Follow.objects.create(user=follower, author=self.author)
+        Post.objects.create(author=self.author, text="Пост")
+        # Пачка пользователей, посты, карточки, отметка и пустая пачка.
+        with self.assertNumQueries(5):
+            self.assertEqual(notifications.send_digests(), 11)
+
+    def test_digest_since_is_per_user(self):
+        reader = User.objects.create_user(
+            username="Reader", email="reader@example.com"
+        )
+        Follow.objects.create(user=reader, author=self.author)
+        Post.objects.create(author=self.author, text="Старый")
+        notifications.mark_seen(reader)
+        Post.objects.create(author=self.author, text="Свежий")
+        notifications.send_digests()
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertIn("Старый", bodies["vasy@example.com"])
+        self.assertNotIn("Старый", bodies["reader@example.com"])
+        self.assertIn("Свежий", bodies["reader@example.com"])
+
+    def test_states_created_for_bulk_follows(self):
+        reader = User.objects.create_user(username="Bulk")
+        Follow.objects.bulk_create([Follow(user=reader, author=self.author)])
+        self.assertFalse(
+            NotificationState.objects.filter(user=reader).exists()
+        )
+        transfer.rebuild_derived(StringIO(), 10)
+        self.assertTrue(
+            NotificationState.objects.filter(user=reader).exists()
+        )
+
+    def test_command(self):
+        Post.objects.create(author=self.author, text="Пост")
+        out = StringIO()
+        call_command("send_digests", stdout=out)
+        self.assertIn("Отправлено писем: 1", out.getvalue())
@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts.models import Comment, Group, Post
+
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text="Тестовый текст", group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user}),
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id}),
+        )
+
+    def test_second_anonymous_request_is_served_from_cache(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first["X-Page-Cache"], "miss")
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second["X-Page-Cache"], "hit")
+                self.assertEqual(first.content, second.content)
+
+    def test_if_none_match_returns_304(self):
+        url = reverse("posts:index")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_authenticated_users_bypass_cache(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse("posts:index"))
+        response = client.get(reverse("posts:index"))
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+    def test_writes_bump_feed_generation(self):
+        for url in self.urls:
+            self.client.get(url)
+        with run_on_commit():
+            Post.objects.create(
+                author=self.user, text="Новый пост", group=self.group
+            )
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response["X-Page-Cache"], "miss")
+                self.assertContains(response, "Новый пост")
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.user, text="Ок"
+            )
+        response = self.client.get(self.urls[3])
+        self.assertContains(response, "Ок")
+
+    def test_only_name_change_resets_pages(self):
+        url = reverse("posts:index")
+        self.client.get(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("новый пароль")
+        with run_on_commit():
+            user.save()
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "hit")
+        user.first_name = "Василий"
+        with run_on_commit():
+            user.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Василий")
+
+    def test_bump_waits_for_commit(self):
+        url = reverse("posts:index")
+        self.client.get(url)
+        with run_on_commit():
+            Post.objects.create(author=self.user, text="Новый пост")
+            # Страница, собранная до коммита, после коммита не находится.
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "hit")
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+
+    def test_query_string_is_part_of_key(self):
+        url = reverse("posts:index")
+        self.client.get(url)
+        response = self.client.get(url + "?page=2")
+        self.assertEqual(response["X-Page-Cache"], "miss")
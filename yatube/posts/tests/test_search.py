@@ -0,0 +1,186 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.search import FTS5Backend, SearchResults
+
+
+User = get_user_model()
+
+
+class SearchIndexTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username="Vasy", first_name="Василий"
+        )
+        cls.group = Group.objects.create(
+            title="Рыбалка", slug="fishing", description="Описание"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return list(SearchResults(query)[:100])
+
+    def test_post_text_is_found_by_prefix(self):
+        post = Post.objects.create(author=self.user, text="Поймал щуку")
+        self.assertEqual(self.found("щук"), [post])
+        self.assertEqual(self.found("карп"), [])
+
+    def test_comment_group_and_author_are_indexed(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text="Клёво")
+        for query in ("клёво", "рыбалка", "василий", "vasy"):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [post])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        self.group.title = "Охота"
+        self.group.save()
+        self.assertEqual(self.found("охота"), [post])
+        self.user.last_name = "Пупкин"
+        self.user.save()
+        self.assertEqual(self.found("пупкин"), [post])
+        comment = Comment.objects.create(
+            post=post, author=self.user, text="Ружьё"
+        )
+        comment.delete()
+        self.assertEqual(self.found("ружьё"), [])
+        post.delete()
+        self.assertEqual(self.found("пост"), [])
+
+    def test_comment_changes_update_only_their_text(self):
+        post = Post.objects.create(author=self.user, text="Пост")
+        first = Comment.objects.create(post=post, author=self.user, text="Сом")
+        Comment.objects.create(post=post, author=self.user, text="Карась")
+        first.text = "Налим"
+        first.save()
+        self.assertEqual(self.found("сом"), [])
+        self.assertEqual(self.found("налим"), [post])
+        first.delete()
+        self.assertEqual(self.found("налим"), [])
+        self.assertEqual(self.found("карась"), [post])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT comments FROM {FTS5Backend.table} WHERE rowid = %s",
+                [post.pk],
+            )
+            self.assertEqual(cursor.fetchone(), ("Карась",))
+
+    def test_post_with_comments_is_removed(self):
+        post = Post.objects.create(author=self.user, text="Плотва")
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=self.user, text=f"Плотва {number}"
+            )
+        post.delete()
+        self.assertEqual(self.found("плотва"), [])
+
+    def test_password_change_does_not_reindex(self):
+        Post.objects.create(author=self.user, text="Пост")
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("новый пароль")
+        with mock.patch("posts.tasks.reindex") as reindex:
+            user.save()
+        reindex.assert_not_called()
+
+    def test_deleted_group_is_removed_from_index(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertEqual(self.found("рыбалка"), [])
+        self.assertEqual(self.found("пост"), [post])
+
+    def test_text_match_ranks_above_comment_match(self):
+        commented = Post.objects.create(author=self.user, text="Пост")
+        Comment.objects.create(post=commented, author=self.user, text="Лещ")
+        matched = Post.objects.create(author=self.user, text="Лещ")
+        self.assertEqual(self.found("лещ"), [matched, commented])
+
+    def test_query_syntax_is_escaped(self):
+        post = Post.objects.create(author=self.user, text="Пост про NEAR and")
+        self.assertEqual(self.found('NEAR "пост* AND ('), [post])
+        self.assertEqual(self.found('*"()'), [])
+
+    def test_rebuild_command_streams_batches(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f"Судак {i}") for i in range(5)
+        )
+        self.assertEqual(self.found("судак"), [])
+        out = StringIO()
+        call_command("rebuild_search_index", batch_size=2, stdout=out)
+        self.assertIn("5", out.getvalue())
+        self.assertEqual(len(self.found("судак")), 5)
+
+    def test_search_view_paginates_and_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f"Окунь {i}") for i in range(13)
+        )
+        call_command("rebuild_search_index", stdout=StringIO())
+        response = self.client.get(reverse("posts:search"), {"q": "окунь"})
+        self.assertEqual(response.context["paginator"].count, 13)
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.NUMBER_POSTS
+        )
+        self.assertContains(response, "?q=%D0%BE%D0%BA%D1%83%D0%BD%D1%8C")
+        response = self.client.get(
+            reverse("posts:search"), {"q": "окунь", "page": 2}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+    def test_admin_search_uses_index(self):
+        post = Post.objects.create(author=self.user, text="Поймал щуку")
+        Post.objects.create(author=self.user, text="Поймал окуня")
+        admin = site._registry[Post]
+        request = RequestFactory().get("/")
+        queryset, distinct = admin.get_search_results(
+            request, Post.objects.all(), "щук"
+        )
+        self.assertEqual(list(queryset), [post])
+        self.assertFalse(distinct)
+
+    @override_settings(SEARCH_BACKEND="posts.search.SimpleBackend")
+    def test_simple_backend(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        self.assertEqual(self.found("Рыбал"), [post])
+        self.assertEqual(self.found("карп"), [])
+
+    def test_query_without_words_finds_nothing(self):
+        Post.objects.create(author=self.user, text="Пост")
+        for backend in ("FTS5Backend", "SimpleBackend"):
+            with self.settings(SEARCH_BACKEND=f"posts.search.{backend}"):
+                for query in ("", "*()"):
+                    with self.subTest(backend=backend, query=query):
+                        searcher = SearchResults(query).backend
+                        self.assertEqual(self.found(query), [])
+                        self.assertFalse(
+                            searcher.filter_queryset(
+                                Post.objects.all(), query
+                            ).exists()
+                        )
+
+
+class SearchTableTest(TestCase):
+    def test_search_table_exists(self):
+        tables = connection.introspection.table_names()
+        self.assertIn(FTS5Backend.table, tables)
@@ -0,0 +1,100 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import seeding, transfer
+from posts.models import Comment, Follow, NotificationState, Post, User
+
+
+class SeedingTest(TestCase):
+    options = {
+        "users": 30,
+        "groups": 3,
+        "posts": 300,
+        "comments": 100,
+        "follows": 5,
+        "batch_size": 40,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def snapshot(self):
+        return (
+            list(
+                Post.objects.order_by("pk").values_list(
+                    "author__username", "group__slug", "text", "pub_date"
+                )
+            ),
+            list(
+                Follow.objects.order_by("pk").values_list(
+                    "user__username", "author__username"
+                )
+            ),
+        )
+
+    def test_same_seed_gives_same_data(self):
+        now = timezone.now()
+        created = seeding.seed(seed=7, now=now, **self.options)
+        self.assertEqual(
+            created,
+            {
+                "users": 30,
+                "groups": 3,
+                "posts": 300,
+                "comments": 100,
+                "follows": 150,
+            },
+        )
+        first = self.snapshot()
+        seeding.clear()
+        self.assertFalse(Post.objects.exists())
+        seeding.seed(seed=7, now=now, **self.options)
+        self.assertEqual(self.snapshot(), first)
+        seeding.clear()
+        seeding.seed(seed=8, now=now, **self.options)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_clear_removes_notification_states(self):
+        seeding.seed(**self.options)
+        transfer.rebuild_derived(StringIO(), 40)
+        self.assertEqual(NotificationState.objects.count(), 30)
+        seeding.clear()
+        self.assertFalse(NotificationState.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_everyone_can_follow_everyone(self):
+        created = seeding.seed(**{**self.options, "follows": 29})
+        self.assertEqual(created["follows"], 30 * 29)
+
+    def test_authors_follow_zipf(self):
+        seeding.seed(**self.options)
+        totals = list(
+            User.objects.annotate(total=Count("posts"))
+            .order_by("pk")
+            .values_list("total", flat=True)
+        )
+        self.assertGreater(totals[0], totals[len(totals) // 2] * 3)
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F("post__pub_date")).exists()
+        )
+
+    def test_command_rebuilds_counters_and_refuses_reseed(self):
+        call_command(
+            "seed_data",
+            users=5,
+            groups=1,
+            posts=20,
+            comments=10,
+            follows=2,
+            stdout=StringIO(),
+        )
+        author = User.objects.get(username=f"{seeding.USERNAME_PREFIX}0")
+        self.assertEqual(author.counters.posts_count, author.posts.count())
+        with self.assertRaises(CommandError):
+            call_command("seed_data", posts=1, stdout=StringIO())
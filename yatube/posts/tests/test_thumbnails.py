@@ -0,0 +1,144 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.forms import PostForm
+from posts.images import normalize_upload
+from posts.models import Post
+
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name="image.png", size=(40, 20)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="PNG")
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type="image/png"
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text="Пост с картинкой", image=make_image()
+        )
+
+    def test_generate_stores_urls_for_current_image(self):
+        self.assertTrue(thumbnails.generate(self.post.pk))
+        post = Post.objects.get(pk=self.post.pk)
+        card = post.precomputed_thumbnails["card"]
+        self.assertTrue(card.startswith(settings.MEDIA_URL))
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, f'src="{card}"')
+
+    def test_generate_refreshes_cached_card(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotContains(response, "srcset=")
+        thumbnails.generate(self.post.pk)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "srcset=")
+
+    @override_settings(THUMBNAIL_FORMATS=("PNG", "JPEG"))
+    def test_variants_cover_widths_and_formats(self):
+        thumbnails.generate(self.post.pk)
+        thumbs = Post.objects.get(pk=self.post.pk).precomputed_thumbnails
+        self.assertEqual(thumbs["srcset"].count("w,"), 1)
+        self.assertIn("960w", thumbs["srcset"])
+        self.assertEqual(
+            [source["type"] for source in thumbs["sources"]], ["image/png"]
+        )
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, '<source type="image/png"')
+        self.assertContains(response, "480w")
+
+    def test_replaced_image_ignores_old_thumbnails(self):
+        thumbnails.generate(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = make_image("other.png")
+        post.save()
+        self.assertEqual(post.precomputed_thumbnails, {})
+        self.assertIn("image", json.loads(post.thumbnails))
+
+    def test_post_without_image_is_skipped(self):
+        post = Post.objects.create(author=self.user, text="Без картинки")
+        self.assertFalse(thumbnails.generate(post.pk))
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command("generate_thumbnails", "--workers=0", stdout=out)
+        self.assertIn("Готово: 1", out.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn("card", post.precomputed_thumbnails)
+
+
+class UploadNormalizeTest(TestCase):
+    def make_jpeg(self, size):
+        exif = Image.Exif()
+        exif[0x010E] = "секретное описание"
+        buffer = BytesIO()
+        Image.new("RGB", size, "blue").save(
+            buffer, format="JPEG", exif=exif.tobytes()
+        )
+        return SimpleUploadedFile(
+            "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=100)
+    def test_big_upload_is_downscaled_without_exif(self):
+        form = PostForm(
+            data={"text": "Текст"},
+            files={"image": self.make_jpeg((400, 200))},
+        )
+        self.assertTrue(form.is_valid())
+        image = Image.open(form.cleaned_data["image"])
+        self.assertEqual(image.size, (100, 50))
+        self.assertNotIn("exif", image.info)
+        self.assertEqual(form.cleaned_data["image"].name, "photo.jpg")
+
+    def test_png_upload_loses_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = "Камера"
+        buffer = BytesIO()
+        Image.new("RGB", (40, 20), "blue").save(
+            buffer, format="PNG", exif=exif.tobytes()
+        )
+        upload = SimpleUploadedFile(
+            "photo.png", buffer.getvalue(), content_type="image/png"
+        )
+        normalized = normalize_upload(upload)
+        content = normalized.read()
+        self.assertNotIn(b"eXIf", content)
+        image = Image.open(BytesIO(content))
+        self.assertEqual(image.format, "PNG")
+        self.assertNotIn("exif", image.info)
+
+    def test_small_upload_without_exif_is_kept(self):
+        upload = make_image()
+        self.assertIs(normalize_upload(upload), upload)
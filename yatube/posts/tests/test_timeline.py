@@ -0,0 +1,131 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+
+User = get_user_model()
+
+
+@override_settings(
+    FOLLOW_FEED_MATERIALIZED=True,
+    FOLLOW_FEED_FANOUT_LIMIT=2,
+    FOLLOW_FEED_PUSH_LIMIT=2,
+)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.star = User.objects.create_user(username="star")
+        cls.fan = User.objects.create_user(username="fan")
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        old = Post.objects.create(author=self.author, text="Старый")
+        self.client.get(
+            reverse("posts:profile_follow", kwargs={"username": "author"})
+        )
+        new = Post.objects.create(author=self.author, text="Новый")
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(self.feed(), [new, old])
+
+    def test_unfollow_and_delete_clear_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Пост")
+        Post.objects.create(author=self.author, text="Второй")
+        post.delete()
+        self.assertEqual(len(self.feed()), 1)
+        self.client.get(
+            reverse("posts:profile_unfollow", kwargs={"username": "author"})
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_popular_author_is_pulled_at_read_time(self):
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        post = Post.objects.create(author=self.star, text="Пост звезды")
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=3)
+    def test_unpopular_author_pushed_back_with_missed_posts(self):
+        other = User.objects.create_user(username="other")
+        for user in (self.reader, self.fan, other):
+            Follow.objects.create(user=user, author=self.star)
+        post = Post.objects.create(author=self.star, text="Пост звезды")
+        self.assertFalse(TimelineEntry.objects.exists())
+        # Между порогами автор остаётся без раскладки.
+        Follow.objects.filter(user=other).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list("user", "post")),
+            [(self.reader.pk, post.pk)],
+        )
+        self.assertEqual(self.feed(), [post])
+
+    def test_feed_without_pulled_authors_reads_timeline_only(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text="Пост")
+        self.feed()
+        # Срез ленты по её индексу, затем посты страницы.
+        with CaptureQueriesContext(connection) as queries:
+            list(timeline.follow_feed(self.reader)[:10])
+        self.assertEqual(len(queries), 2)
+        self.assertIn("posts_timelineentry", queries[0]["sql"])
+        self.assertNotIn("posts_post", queries[0]["sql"])
+
+    def test_pulled_posts_are_merged_once(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.star)
+        first = Post.objects.create(author=self.star, text="До славы")
+        Follow.objects.create(user=self.fan, author=self.star)
+        posts = [
+            Post.objects.create(author=self.author, text="Автор"),
+            Post.objects.create(author=self.star, text="Звезда"),
+            Post.objects.create(author=self.author, text="Снова автор"),
+        ]
+        # Ранний пост звезды разложен в ленту и вытягивается снова.
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=first).exists()
+        )
+        feed = timeline.follow_feed(self.reader)
+        self.assertEqual(feed.count(), 4)
+        self.assertEqual(feed[0:4], [*reversed(posts), first])
+        self.assertEqual(feed[1:3], [posts[1], posts[0]])
+        self.assertEqual(self.feed(), [*reversed(posts), first])
+
+    @override_settings(PAGINATION_MODE="cursor")
+    def test_feed_is_paged_by_number_in_cursor_mode(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Пост")
+        self.assertEqual(self.feed(), [post])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Пост")
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self.feed(), [post])
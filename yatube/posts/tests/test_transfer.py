@@ -0,0 +1,230 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post, UserCounter
+
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt(message):
+    raise Interrupted(message)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.author = User.objects.create_user(username="Fedy")
+        self.reader = User.objects.create_user(username="Vasy")
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        self.pub_date = timezone.now() - dt.timedelta(days=30)
+        Post.objects.bulk_create(
+            Post(
+                author=self.author,
+                text=f"Пост {i}",
+                group=self.group if i % 2 else None,
+            )
+            for i in range(7)
+        )
+        Post.objects.update(pub_date=self.pub_date)
+        self.post = Post.objects.create(
+            author=self.author,
+            text="Пост с картинкой",
+            image=SimpleUploadedFile("small.gif", SMALL_GIF, "image/gif"),
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text="Комментарий"
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def snapshot(self):
+        return {
+            "groups": list(Group.objects.values_list("pk", "slug")),
+            "posts": list(
+                Post.objects.order_by("pk").values_list(
+                    "pk",
+                    "text",
+                    "pub_date",
+                    "author__username",
+                    "group_id",
+                    "image",
+                )
+            ),
+            "comments": list(
+                Comment.objects.values_list(
+                    "pk", "post_id", "author__username", "text", "created"
+                )
+            ),
+            "follows": list(
+                Follow.objects.values_list(
+                    "user__username", "author__username"
+                )
+            ),
+        }
+
+    def wipe(self):
+        default_storage.delete(self.post.image.name)
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def run_command(self, name, *args, **options):
+        call_command(name, self.directory, *args, stdout=StringIO(), **options)
+
+    def test_round_trip(self):
+        for file_format in transfer.FORMATS:
+            with self.subTest(file_format=file_format):
+                before = self.snapshot()
+                self.run_command(
+                    "export_content", format=file_format, batch_size=3
+                )
+                self.wipe()
+                self.run_command(
+                    "import_content", format=file_format, batch_size=3
+                )
+                self.assertEqual(self.snapshot(), before)
+                self.assertTrue(default_storage.exists(self.post.image.name))
+                self.assertFalse(
+                    User.objects.get(username="Fedy").has_usable_password()
+                )
+                self.assertEqual(
+                    UserCounter.objects.get(user__username="Fedy").posts_count,
+                    8,
+                )
+                self.assertEqual(
+                    Post.objects.get(pk=self.post.pk).comments_count, 1
+                )
+
+    def test_import_skips_existing_rows(self):
+        self.run_command("export_content")
+        before = self.snapshot()
+        self.run_command("import_content")
+        self.assertEqual(self.snapshot(), before)
+
+    def test_import_stops_on_taken_post_id(self):
+        self.run_command("export_content")
+        Comment.objects.all().delete()
+        # Под id поста из выгрузки теперь другой пост.
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        with self.assertRaisesMessage(CommandError, f"id {self.post.pk}"):
+            self.run_command("import_content")
+        self.assertFalse(Comment.objects.exists())
+
+    def test_failed_batch_removes_copied_images(self):
+        self.run_command("export_content")
+        name = self.post.image.name
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(b"other"))
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        files = default_storage.listdir(os.path.dirname(name))[1]
+        with self.assertRaises(CommandError):
+            self.run_command("import_content")
+        self.assertEqual(
+            default_storage.listdir(os.path.dirname(name))[1], files
+        )
+
+    def test_import_stops_on_taken_group_slug(self):
+        self.run_command("export_content")
+        self.group.delete()
+        Group.objects.create(title="Новая", slug="group", description="")
+        with self.assertRaisesMessage(CommandError, "slug group"):
+            self.run_command("import_content")
+
+    def test_other_image_with_same_name_kept(self):
+        self.run_command("export_content")
+        name = self.post.image.name
+        self.wipe()
+        default_storage.save(name, ContentFile(b"other"))
+        self.run_command("import_content")
+        imported = Post.objects.get(pk=self.post.pk).image
+        self.assertNotEqual(imported.name, name)
+        self.assertEqual(imported.read(), SMALL_GIF)
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), b"other")
+
+    def test_interrupted_export_resumes(self):
+        checkpoint = transfer.Checkpoint(
+            self.directory, transfer.EXPORT_CHECKPOINT, resume=False
+        )
+        transfer.export_table(
+            transfer.TABLES[0], self.directory, "ndjson", 2, checkpoint
+        )
+        with self.assertRaises(Interrupted):
+            transfer.export_table(
+                transfer.TABLES[1],
+                self.directory,
+                "ndjson",
+                2,
+                checkpoint,
+                log=interrupt,
+            )
+        self.run_command("export_content", batch_size=2, resume=True)
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.directory, transfer.EXPORT_CHECKPOINT)
+            )
+        )
+        with open(os.path.join(self.directory, "posts.ndjson")) as file:
+            self.assertEqual(len(file.readlines()), Post.objects.count())
+
+    def test_interrupted_import_resumes(self):
+        self.run_command("export_content")
+        before = self.snapshot()
+        self.wipe()
+        checkpoint = transfer.Checkpoint(
+            self.directory, transfer.IMPORT_CHECKPOINT, resume=False
+        )
+        transfer.import_table(
+            transfer.TABLES[0], self.directory, "ndjson", 2, checkpoint
+        )
+        with self.assertRaises(Interrupted):
+            transfer.import_table(
+                transfer.TABLES[1],
+                self.directory,
+                "ndjson",
+                2,
+                checkpoint,
+                log=interrupt,
+            )
+        self.assertEqual(Post.objects.count(), 2)
+        self.run_command("import_content", batch_size=2, resume=True)
+        self.assertEqual(self.snapshot(), before)
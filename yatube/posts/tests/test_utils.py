@@ -0,0 +1,198 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts.models import Group, Post
+from posts.utils import CursorPaginator, FeedPaginator
+
+
+User = get_user_model()
+
+
+@override_settings(PAGINATION_MODE="cursor")
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        cls.BATCH_SIZE = 23
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f"Текст {i}", group=cls.group)
+            for i in range(cls.BATCH_SIZE)
+        )
+        cls.ordered = list(Post.objects.order_by("-pub_date", "-pk"))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Курсоры next проходят всю ленту без пропусков и повторов."""
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_POSTS)
+        page = paginator.get_page(None)
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.ordered)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_POSTS)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_POSTS)
+        for cursor in ("garbage", "W1sx", "e30"):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(cursor)
+                self.assertEqual(list(page), self.ordered[:10])
+
+    def test_list_views_use_cursor_pages(self):
+        reverse_names = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user}),
+        )
+        for reverse_name in reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.client.get(reverse_name)
+                page = response.context["page_obj"]
+                self.assertEqual(len(page), settings.NUMBER_POSTS)
+                response = self.client.get(
+                    reverse_name, {"cursor": page.next_cursor}
+                )
+                self.assertEqual(
+                    list(response.context["page_obj"]), self.ordered[10:20]
+                )
+                self.assertContains(response, "?cursor=")
+
+
+class FeedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f"Текст {i}", group=cls.group)
+            for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached_per_feed(self):
+        FeedPaginator(Post.objects.all(), 10, feed="index").count
+        with self.assertNumQueries(0):
+            count = FeedPaginator(Post.objects.all(), 10, feed="index").count
+        self.assertEqual(count, 5)
+
+    def test_post_save_and_delete_reset_count(self):
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.client.get(url)
+        with run_on_commit():
+            post = Post.objects.create(
+                author=self.user, text="Новый пост", group=self.group
+            )
+        response = self.client.get(url)
+        self.assertEqual(response.context["paginator"].count, 6)
+        with run_on_commit():
+            post.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.context["paginator"].count, 5)
+
+    def test_group_change_resets_old_group_count(self):
+        other = Group.objects.create(
+            title="Другая группа", slug="other", description="Описание"
+        )
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.client.get(url)
+        post = Post.objects.filter(group=self.group).first()
+        post.group = other
+        with run_on_commit():
+            post.save()
+        response = self.client.get(url)
+        self.assertEqual(response.context["paginator"].count, 4)
+
+    def test_text_edit_keeps_counts(self):
+        post = Post.objects.filter(group=self.group).first()
+        post.text = "Исправленный текст"
+        with CaptureQueriesContext(connection) as queries:
+            with run_on_commit():
+                post.save()
+        self.assertFalse(
+            any("posts_follow" in query["sql"] for query in queries)
+        )
+        deferred = Post.objects.only("text").get(pk=post.pk)
+        deferred.text = "Ещё правка"
+        FeedPaginator(Post.objects.all(), 10, feed="index").count
+        with run_on_commit():
+            deferred.save()
+        with self.assertNumQueries(0):
+            FeedPaginator(Post.objects.all(), 10, feed="index").count
+
+    @override_settings(FEED_COUNT_EXACT_LIMIT=3)
+    def test_large_feed_has_no_last_page(self):
+        paginator = FeedPaginator(Post.objects.all(), 2, feed="index")
+        self.assertEqual(paginator.count, 4)
+        self.assertTrue(paginator.count_is_estimate)
+        self.assertEqual(paginator.num_pages, 2)
+        page = paginator.get_page(2)
+        self.assertTrue(page.has_next())
+        page = paginator.get_page(3)
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_next())
+        self.assertEqual(paginator.get_page(10).number, 2)
+        self.assertEqual(
+            list(paginator.get_page_window(1)),
+            [1, 2, FeedPaginator.ELLIPSIS],
+        )
+
+    @override_settings(FEED_COUNT_EXACT_LIMIT=3, NUMBER_POSTS=2)
+    def test_large_filtered_feed_links_to_existing_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f"Без группы {i}") for i in range(20)
+        )
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        response = self.client.get(url, {"page": 3})
+        self.assertEqual(len(response.context["page_obj"]), 1)
+        self.assertFalse(response.context["page_obj"].has_next())
+        self.assertNotContains(response, "Последняя")
+        numbers = [
+            number
+            for number in response.context["page_range"]
+            if number != FeedPaginator.ELLIPSIS
+        ]
+        self.assertEqual(numbers, [1, 2, 3])
+
+    def test_page_window(self):
+        paginator = FeedPaginator(range(100), 5)
+        ellipsis = FeedPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_page_window(10)),
+            [1, ellipsis, 8, 9, 10, 11, 12, ellipsis, 20],
+        )
+        self.assertEqual(
+            list(paginator.get_page_window(1)),
+            [1, 2, 3, ellipsis, 20],
+        )
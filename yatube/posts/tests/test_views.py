@@ -8,6 +8,8 @@ from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from posts.models import Group, Post, Follow
 
@@ -48,6 +50,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client2 = Client()
         self.authorized_client.force_login(self.user)
@@ -137,19 +140,47 @@ class PostPagesTests(TestCase):
         self.assertEqual(post_img, self.post.image)
 
     def test_cache_index_page_correct_context(self):
-        """Кэш index сформирован с правильным контекстом."""
+        """Карточка поста берётся из кэша, пока не сменится её версия."""
         response = self.authorized_client.get(reverse("posts:index"))
-        content = response.content
-        post_id = PostPagesTests.post.id
-        instance = Post.objects.get(pk=post_id)
-        instance.delete()
+        Post.objects.filter(pk=self.post.pk).update(text="Текст без сигнала")
         new_response = self.authorized_client.get(reverse("posts:index"))
-        new_content = new_response.content
-        self.assertEqual(content, new_content)
-        cache.clear()
+        self.assertEqual(response.content, new_response.content)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = "Отредактированный текст"
+        post.save()
         new_new_response = self.authorized_client.get(reverse("posts:index"))
-        new_new_content = new_new_response.content
-        self.assertNotEqual(content, new_new_content)
+        self.assertContains(new_new_response, "Отредактированный текст")
+
+    def test_cache_card_changes_with_comment_and_group(self):
+        url = reverse("posts:index")
+        self.authorized_client.get(url)
+        self.authorized_client2.post(
+            reverse("posts:add_comment", kwargs={"post_id": self.post.id}),
+            {"text": "Комментарий"},
+        )
+        self.assertContains(self.authorized_client.get(url), "(1 комм.)")
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = "new_slug"
+        group.save()
+        self.assertContains(self.authorized_client.get(url), "new_slug")
+
+    def test_card_version_follows_author_name_only(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("новый пароль")
+        user.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, 0)
+        user.last_name = "Пупкин"
+        user.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, 1)
+
+    def test_cache_pages_do_not_share_cards(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f"Пост {i}") for i in range(10)
+        )
+        first = self.authorized_client.get(reverse("posts:index"))
+        second = self.authorized_client.get(reverse("posts:index") + "?page=2")
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, self.post.text)
 
     def test_follow_creat(self):
         follow_cut = Follow.objects.filter(
@@ -170,6 +201,19 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(Follow.objects.count(), follow_cut - 1)
 
+    def test_follow_twice_creates_one_row(self):
+        url = reverse("posts:profile_follow", kwargs={"username": self.user})
+        self.authorized_client2.get(url)
+        response = self.authorized_client2.get(url)
+        self.assertRedirects(
+            response,
+            reverse("posts:profile", kwargs={"username": self.user}),
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=self.user2, author=self.user).count(),
+            1,
+        )
+
     def test_follow_creat_our_user(self):
         response = self.authorized_client.get(
             reverse("posts:profile_follow", kwargs={"username": self.user})
@@ -204,6 +248,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(cls.obj_list)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_first_page_contains_ten_records(self):
@@ -241,6 +286,9 @@ class AdditionalGroupPostTest(TestCase):
             author=cls.user, text="Тестовый текст поста", group=cls.group
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_pages_contains_test_group_post(self):
         """При создании поста с группой он появляется на всех страницах."""
         adresses = [
@@ -255,3 +303,48 @@ class AdditionalGroupPostTest(TestCase):
             post_group = first_object.group.title
             self.assertEqual(post_text, self.post.text)
             self.assertEqual(post_group, self.post.group.title)
+
+
+class FeedQueryCountTest(TestCase):
+    """Число запросов лент не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Vasy")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        authors = [
+            User.objects.create_user(username=f"author{i}") for i in range(5)
+        ]
+        for i in range(15):
+            Post.objects.create(
+                author=authors[i % 5], text=f"Текст {i}", group=cls.group
+            )
+            Follow.objects.get_or_create(user=cls.user, author=authors[i % 5])
+        cls.post = Post.objects.latest("pub_date")
+        for i in range(5):
+            cls.post.comments.create(author=authors[i], text=f"Коммент {i}")
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_query_ceilings(self):
+        ceilings = {
+            reverse("posts:index"): 4,
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}): 5,
+            reverse("posts:profile", kwargs={"username": "author0"}): 5,
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id}): 4,
+            reverse("posts:follow_index"): 4,
+        }
+        for url, ceiling in ceilings.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), ceiling)
@@ -0,0 +1,107 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+После сохранения поста с новой картинкой её миниатюры строит воркер
+очереди core.tasks, а адреса записываются в Post.thumbnails. Шаблон
+берёт готовый адрес и не трогает sorl-thumbnail в запросе; пока
+миниатюр нет, includes/image.html строит их по-старому.
+
+Для каждой ширины и формата строится свой вариант: шаблон отдаёт их
+через <picture> и srcset. Последний формат THUMBNAIL_FORMATS — запасной
+для <img>, остальные выводятся как <source>.
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from core import perf, tasks
+from core.db import write_transaction
+from .models import Post
+
+MIME_TYPES = {
+    "AVIF": "image/avif",
+    "GIF": "image/gif",
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+}
+
+
+def available_formats():
+    """Форматы из THUMBNAIL_FORMATS, которые умеют Pillow и sorl."""
+    Image.init()
+    formats = [
+        image_format
+        for image_format in settings.THUMBNAIL_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+    return formats or ["JPEG"]
+
+
+def build(image):
+    """Строит карточку во всех ширинах и форматах.
+
+    Возвращает адрес основной миниатюры, srcset запасного формата
+    и список <source> для остальных.
+    """
+    card_width, card_height = settings.THUMBNAIL_CARD_SIZE
+    widths = sorted({*settings.THUMBNAIL_WIDTHS, card_width})
+    sources = []
+    card = None
+    for image_format in available_formats():
+        srcset = []
+        for width in widths:
+            height = round(card_height * width / card_width)
+            thumbnail = get_thumbnail(
+                image,
+                f"{width}x{height}",
+                crop="center",
+                upscale=True,
+                format=image_format,
+            )
+            srcset.append(f"{thumbnail.url} {width}w")
+            if width == card_width:
+                card = thumbnail.url
+        sources.append(
+            {"type": MIME_TYPES[image_format], "srcset": ", ".join(srcset)}
+        )
+    fallback = sources.pop()
+    return {"card": card, "srcset": fallback["srcset"], "sources": sources}
+
+
+@write_transaction
+def _save_urls(post_id, image_name, urls):
+    # Картинку могли заменить, пока строились миниатюры. Новая версия
+    # сбрасывает закэшированные карточки поста без srcset.
+    return Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnails=json.dumps({"image": image_name, **urls}),
+        version=F("version") + 1,
+    )
+
+
+def generate(post_id):
+    post = Post.objects.filter(pk=post_id).only("image").first()
+    if post is None or not post.image:
+        return False
+    with perf.thumbnail_timer():
+        urls = build(post.image)
+    return bool(_save_urls(post_id, post.image.name, urls))
+
+
+def schedule(post):
+    """Ставит пост в очередь задач вместе с транзакцией поста."""
+    if not post.image:
+        return
+    if settings.THUMBNAIL_ASYNC:
+        # Ключ с именем файла: одну картинку второй раз не строим.
+        tasks.enqueue(
+            "posts.thumbnails",
+            post.pk,
+            key=f"thumbnails:{post.pk}:{post.image.name}",
+        )
+    else:
+        transaction.on_commit(lambda: generate(post.pk))
@@ -0,0 +1,209 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации id поста раскладывается по лентам подписчиков, поэтому
+follow_index читает готовый список вместо подзапроса по подпискам.
+Посты авторов, у которых подписчиков не меньше FOLLOW_FEED_FANOUT_LIMIT,
+не раскладываются: они подмешиваются в ленту при чтении. Флаг
+UserCounter.feed_pulled снимается, только когда подписчиков стало
+меньше FOLLOW_FEED_PUSH_LIMIT, и тогда же задача push_author
+раскладывает посты автора, пропущенные за время без раскладки.
+Множество таких авторов невелико и хранится в кэше.
+
+Лента читается срезом TimelineEntry по индексу (user, -pub_date):
+сначала ключи страницы, потом сами посты. Посты вытянутых авторов
+читаются отдельно по индексу (author, -pub_date) и сливаются с ней.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+
+PULLED_KEY = "timeline:pulled"
+
+
+def is_enabled():
+    return settings.FOLLOW_FEED_MATERIALIZED
+
+
+def pulled_ids():
+    """id всех авторов, чьи посты читаются без раскладки."""
+    pulled = cache.get(PULLED_KEY)
+    if pulled is None:
+        pulled = list(
+            UserCounter.objects.filter(feed_pulled=True).values_list(
+                "user_id", flat=True
+            )
+        )
+        cache.set(PULLED_KEY, pulled, None)
+    return pulled
+
+
+def _reset_pulled():
+    cache.delete(PULLED_KEY)
+    transaction.on_commit(lambda: cache.delete(PULLED_KEY))
+
+
+def is_pulled(author_id):
+    return UserCounter.objects.filter(
+        user_id=author_id, feed_pulled=True
+    ).exists()
+
+
+def update_pulled(author_id):
+    """Сверяет флаг автора с порогами после подписки или отписки.
+
+    Возвращает True, если автора пора вернуть в раскладку (push_author).
+    """
+    counter = UserCounter.objects.filter(user_id=author_id)
+    if counter.filter(
+        feed_pulled=False,
+        followers_count__gte=settings.FOLLOW_FEED_FANOUT_LIMIT,
+    ).update(feed_pulled=True):
+        _reset_pulled()
+        return False
+    return counter.filter(
+        feed_pulled=True,
+        followers_count__lt=settings.FOLLOW_FEED_PUSH_LIMIT,
+    ).exists()
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    if not is_enabled() or is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Переносит в ленту user_id все посты нового автора."""
+    if not is_enabled() or is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "pk", "pub_date"
+    )
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def push_author(author_id):
+    """Раскладывает посты автора по лентам и снимает флаг feed_pulled."""
+    counter = UserCounter.objects.filter(
+        user_id=author_id,
+        feed_pulled=True,
+        followers_count__lt=settings.FOLLOW_FEED_PUSH_LIMIT,
+    )
+    if not counter.update(feed_pulled=False):
+        return
+    _reset_pulled()
+    if not is_enabled():
+        return
+    for user_id in Follow.objects.filter(author_id=author_id).values_list(
+        "user_id", flat=True
+    ):
+        add_author(user_id, author_id)
+
+
+def remove_author(user_id, author_id):
+    if not is_enabled():
+        return
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    for author_id in user.follower.values_list("author_id", flat=True):
+        add_author(user.pk, author_id)
+
+
+class TimelineFeed:
+    """Материализованная лента для Paginator: посты читаются по срезу."""
+
+    def __init__(self, user, pulled=()):
+        self.user = user
+        self.pulled = list(pulled)
+
+    def entries(self):
+        return self.user.timeline.order_by("-pub_date", "-post_id")
+
+    def pulled_posts(self, author_id):
+        return Post.objects.filter(author_id=author_id).order_by(
+            "-pub_date", "-pk"
+        )
+
+    @cached_property
+    def _count(self):
+        if not self.pulled:
+            return self.entries().count()
+        # Посты, разложенные до того, как автора вытянули, не считаем.
+        entries = self.entries().exclude(post__author_id__in=self.pulled)
+        pulled = Post.objects.filter(author_id__in=self.pulled)
+        return entries.count() + pulled.count()
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def keys(self, stop):
+        """Первые stop пар (pub_date, id поста), новые первыми."""
+        sources = [
+            self.entries().values_list("pub_date", "post_id")[:stop]
+        ]
+        sources.extend(
+            self.pulled_posts(author_id).values_list("pub_date", "pk")[:stop]
+            for author_id in self.pulled
+        )
+        if len(sources) == 1:
+            return list(sources[0])
+        keys = []
+        for key in heapq.merge(*sources, reverse=True):
+            # Пост вытянутого автора мог остаться и в ленте.
+            if not keys or keys[-1] != key:
+                keys.append(key)
+        return keys
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self._count if index.stop is None else index.stop
+        ids = [pk for _, pk in islice(self.keys(stop), start, stop)]
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def follow_feed(user):
+    """Посты авторов, на которых подписан user."""
+    if not is_enabled():
+        return Post.objects.feed().filter(
+            author__in=user.follower.values("author")
+        )
+    pulled = pulled_ids()
+    if pulled:
+        pulled = user.follower.filter(author_id__in=pulled).values_list(
+            "author_id", flat=True
+        )
+    return TimelineFeed(user, pulled)
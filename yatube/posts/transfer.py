@@ -0,0 +1,453 @@
+"""Выгрузка и загрузка контента пачками (export_content, import_content).
+
+Каталог выгрузки — по файлу на таблицу (groups, posts, comments, follows)
+в формате NDJSON или CSV и каталог media с картинками постов. Авторы
+пишутся по username и при загрузке создаются, если их нет. Группы, посты
+и комментарии сохраняют свои id: ссылки между таблицами не переводятся
+через словарь в памяти, а уже загруженные строки пропускаются. Строка
+считается уже загруженной, только если совпадает её естественный ключ
+(slug группы, автор и дата поста или комментария); id или slug, занятые
+другой строкой, останавливают загрузку с ConflictError, и пачка
+откатывается. Картинка с именем, занятым другим файлом, сохраняется
+под новым именем.
+
+После каждой пачки прогресс пишется в файл контрольной точки, поэтому
+прерванную команду можно продолжить с --resume.
+"""
+import csv
+import json
+import os
+import shutil
+from functools import partial
+from itertools import chain
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import notifications, page_cache, timeline
+from .models import Comment, Follow, Group, Post, User
+from .utils import batched, invalidate_feed_counts, keep_auto_dates
+
+FORMATS = ("ndjson", "csv")
+MEDIA_DIR = "media"
+EXPORT_CHECKPOINT = ".export-checkpoint.json"
+IMPORT_CHECKPOINT = ".import-checkpoint.json"
+CHUNK_SIZE = 64 * 1024
+
+
+class ConflictError(Exception):
+    """Строка выгрузки занимает id или slug другой строки базы."""
+
+
+def _username_map(usernames):
+    """id пользователей по username; недостающие создаются без пароля."""
+    usernames = set(usernames)
+    found = dict(
+        User.objects.filter(username__in=usernames).values_list(
+            "username", "pk"
+        )
+    )
+    missing = usernames - set(found)
+    if missing:
+        User.objects.bulk_create(
+            User(username=username, password=make_password(None))
+            for username in missing
+        )
+        found.update(
+            User.objects.filter(username__in=missing).values_list(
+                "username", "pk"
+            )
+        )
+    return found
+
+
+def _datetime(value):
+    return parse_datetime(value) if isinstance(value, str) else value
+
+
+def _optional_int(value):
+    return None if value in (None, "") else int(value)
+
+
+class Table:
+    """Описание выгружаемой таблицы: колонки, чтение и сборка объектов."""
+
+    name = None
+    model = None
+    columns = ()
+    # Откуда берётся каждая колонка; по умолчанию — одноимённое поле.
+    sources = ()
+    # Поля auto_now_add, значения которых нужно взять из выгрузки.
+    dated_fields = ()
+    # Поля, по которым строка с тем же id считается той же строкой.
+    natural_key = ()
+
+    def build(self, rows):
+        """Объекты модели для пачки строк из файла."""
+        raise NotImplementedError
+
+    def _key(self, values):
+        return tuple(values)
+
+    def check_conflicts(self, objects):
+        """ConflictError, если id объекта заняты другими строками."""
+        if not self.natural_key:
+            return
+        existing = {
+            pk: self._key(key)
+            for pk, *key in self.model.objects.filter(
+                pk__in=[obj.pk for obj in objects]
+            ).values_list("pk", *self.natural_key)
+        }
+        for obj in objects:
+            key = self._key(getattr(obj, field) for field in self.natural_key)
+            if existing.get(obj.pk, key) != key:
+                raise ConflictError(
+                    f"{self.name}: id {obj.pk} занят другой строкой"
+                )
+
+    def rows(self, last_pk):
+        """Кортежи колонок с pk больше last_pk, по возрастанию pk."""
+        return (
+            self.model.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list(*(self.sources or self.columns))
+        )
+
+
+class GroupTable(Table):
+    name = "groups"
+    model = Group
+    columns = ("id", "title", "slug", "description")
+    natural_key = ("slug",)
+
+    def check_conflicts(self, objects):
+        super().check_conflicts(objects)
+        taken = Group.objects.filter(
+            slug__in=[group.slug for group in objects]
+        ).values_list("slug", "pk")
+        ids = {group.slug: group.pk for group in objects}
+        for slug, pk in taken:
+            if ids[slug] != pk:
+                raise ConflictError(
+                    f"{self.name}: slug {slug} занят группой с id {pk}"
+                )
+
+    def build(self, rows):
+        return [
+            Group(
+                pk=int(row["id"]),
+                title=row["title"],
+                slug=row["slug"],
+                description=row["description"],
+            )
+            for row in rows
+        ]
+
+
+class PostTable(Table):
+    name = "posts"
+    model = Post
+    columns = ("id", "text", "pub_date", "author", "group", "image")
+    sources = (
+        "id", "text", "pub_date", "author__username", "group_id", "image"
+    )
+    dated_fields = ("pub_date",)
+    natural_key = ("author_id", "pub_date")
+
+    def build(self, rows):
+        authors = _username_map(row["author"] for row in rows)
+        return [
+            Post(
+                pk=int(row["id"]),
+                text=row["text"],
+                pub_date=_datetime(row["pub_date"]),
+                author_id=authors[row["author"]],
+                group_id=_optional_int(row["group"]),
+                image=row["image"] or "",
+            )
+            for row in rows
+        ]
+
+
+class CommentTable(Table):
+    name = "comments"
+    model = Comment
+    columns = ("id", "post", "author", "text", "created")
+    sources = ("id", "post_id", "author__username", "text", "created")
+    dated_fields = ("created",)
+    natural_key = ("post_id", "author_id", "created")
+
+    def build(self, rows):
+        authors = _username_map(row["author"] for row in rows)
+        return [
+            Comment(
+                pk=int(row["id"]),
+                post_id=int(row["post"]),
+                author_id=authors[row["author"]],
+                text=row["text"],
+                created=_datetime(row["created"]),
+            )
+            for row in rows
+        ]
+
+
+class FollowTable(Table):
+    name = "follows"
+    model = Follow
+    columns = ("id", "user", "author")
+    sources = ("id", "user__username", "author__username")
+
+    def build(self, rows):
+        users = _username_map(
+            name for row in rows for name in (row["user"], row["author"])
+        )
+        # id подписки не переносится: строку задаёт пара (user, author).
+        return [
+            Follow(user_id=users[row["user"]], author_id=users[row["author"]])
+            for row in rows
+            if row["user"] != row["author"]
+        ]
+
+
+TABLES = (GroupTable(), PostTable(), CommentTable(), FollowTable())
+
+
+def _plain(row):
+    # isoformat, а не DjangoJSONEncoder: тот отбрасывает микросекунды.
+    return {
+        key: value.isoformat() if hasattr(value, "isoformat") else value
+        for key, value in row.items()
+    }
+
+
+def table_path(directory, table, file_format):
+    return os.path.join(directory, f"{table.name}.{file_format}")
+
+
+class NDJSONFormat:
+    @staticmethod
+    def writer(file, columns):
+        def write(row):
+            file.write(json.dumps(_plain(row), ensure_ascii=False))
+            file.write("\n")
+
+        return write
+
+    @staticmethod
+    def reader(file):
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CSVFormat:
+    @staticmethod
+    def writer(file, columns):
+        writer = csv.DictWriter(file, columns)
+        if file.tell() == 0:
+            writer.writeheader()
+
+        def write(row):
+            writer.writerow(_plain(row))
+
+        return write
+
+    @staticmethod
+    def reader(file):
+        return csv.DictReader(file)
+
+
+FORMAT_CLASSES = {"ndjson": NDJSONFormat, "csv": CSVFormat}
+
+
+class Checkpoint:
+    """Прогресс команды в JSON-файле внутри каталога выгрузки."""
+
+    def __init__(self, directory, name, resume):
+        self.path = os.path.join(directory, name)
+        self.state = {"done": []}
+        if resume and os.path.exists(self.path):
+            with open(self.path) as file:
+                self.state = json.load(file)
+
+    def is_done(self, table):
+        return table.name in self.state["done"]
+
+    def position(self, table):
+        """Сохранённая позиция в таблице или пустой словарь."""
+        if self.state.get("table") != table.name:
+            return {}
+        return self.state
+
+    def save(self, table, **position):
+        self.state = {"done": self.state["done"], "table": table.name}
+        self.state.update(position)
+        self._write()
+
+    def finish(self, table):
+        self.state = {"done": [*self.state["done"], table.name]}
+        self._write()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _write(self):
+        # Сначала во временный файл: обрыв не оставит битую точку.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.state, file)
+        os.replace(tmp_path, self.path)
+
+
+def _copy_image_out(name, directory):
+    target = os.path.join(directory, MEDIA_DIR, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name) as source, open(target, "wb") as dest:
+        shutil.copyfileobj(source, dest)
+
+
+def _same_file(name, path):
+    if default_storage.size(name) != os.path.getsize(path):
+        return False
+    with default_storage.open(name) as stored, open(path, "rb") as source:
+        return all(
+            stored_chunk == source_chunk
+            for stored_chunk, source_chunk in zip(
+                iter(partial(stored.read, CHUNK_SIZE), b""),
+                iter(partial(source.read, CHUNK_SIZE), b""),
+            )
+        )
+
+
+def _copy_image_in(name, directory, stored):
+    """Кладёт картинку из выгрузки в хранилище, возвращает её имя там.
+
+    Тот же файл под тем же именем не копируется второй раз; другой файл
+    с этим именем storage сохраняет под новым. Имена новых файлов
+    добавляются в stored.
+    """
+    source_path = os.path.join(directory, MEDIA_DIR, name)
+    if not os.path.exists(source_path):
+        return name
+    if default_storage.exists(name) and _same_file(name, source_path):
+        return name
+    with open(source_path, "rb") as source:
+        name = default_storage.save(name, source)
+    stored.append(name)
+    return name
+
+
+def _import_batch(table, batch, directory):
+    """Пишет пачку в одной транзакции; картинки копирует до неё.
+
+    Если пачка не записалась, скопированные для неё файлы удаляются
+    и не остаются в хранилище сиротами.
+    """
+    stored = []
+    try:
+        if table.name == "posts":
+            for row in batch:
+                if row["image"]:
+                    row["image"] = _copy_image_in(
+                        row["image"], directory, stored
+                    )
+        with transaction.atomic(), keep_auto_dates(
+            table.model, table.dated_fields
+        ):
+            objects = table.build(batch)
+            table.check_conflicts(objects)
+            table.model.objects.bulk_create(objects, ignore_conflicts=True)
+    except Exception:
+        for name in stored:
+            default_storage.delete(name)
+        raise
+
+
+def export_table(table, directory, file_format, batch_size, checkpoint,
+                 log=None):
+    """Пишет таблицу в файл, сохраняя позицию после каждой пачки.
+
+    Строки читаются iterator() кусками по batch_size, так что память
+    не зависит от размера таблицы. Возвращает число выгруженных строк.
+    """
+    position = checkpoint.position(table)
+    path = table_path(directory, table, file_format)
+    with open(path, "a+" if position else "w", newline="") as file:
+        if position:
+            # Всё, что записано после контрольной точки, пишем заново.
+            file.seek(position["offset"])
+            file.truncate()
+        write = FORMAT_CLASSES[file_format].writer(file, table.columns)
+        rows = table.rows(position.get("last_pk", 0))
+        exported = 0
+        for values in rows.iterator(chunk_size=batch_size):
+            row = dict(zip(table.columns, values))
+            if table.name == "posts" and row["image"]:
+                _copy_image_out(row["image"], directory)
+            write(row)
+            exported += 1
+            if exported % batch_size == 0:
+                file.flush()
+                checkpoint.save(
+                    table, last_pk=row["id"], offset=file.tell()
+                )
+                if log:
+                    log(f"{table.name}: {exported}")
+    checkpoint.finish(table)
+    return exported
+
+
+def import_table(table, directory, file_format, batch_size, checkpoint,
+                 log=None):
+    """Загружает файл таблицы пачками, каждую в своей транзакции.
+
+    Возвращает число прочитанных строк; уже загруженные строки
+    пропускаются, id или slug другой строки — ConflictError.
+    """
+    path = table_path(directory, table, file_format)
+    if not os.path.exists(path):
+        checkpoint.finish(table)
+        return 0
+    skip = checkpoint.position(table).get("records", 0)
+    done = skip
+    with open(path, newline="") as file:
+        rows = FORMAT_CLASSES[file_format].reader(file)
+        for _ in zip(range(skip), rows):
+            pass
+        for batch in batched(rows, batch_size):
+            _import_batch(table, batch, directory)
+            done += len(batch)
+            checkpoint.save(table, records=done)
+            if log:
+                log(f"{table.name}: {done}")
+    checkpoint.finish(table)
+    return done
+
+
+def reset_caches(batch_size):
+    """Сбрасывает кэши лент: bulk_create не посылает сигналов."""
+    page_cache.bump(page_cache.SITE)
+    invalidate_feed_counts("index")
+    group_ids = Group.objects.values_list("pk", flat=True)
+    follower_ids = Follow.objects.values_list("user_id", flat=True).distinct()
+    feeds = chain(
+        (f"group:{pk}" for pk in group_ids.iterator()),
+        (f"follow:{pk}" for pk in follower_ids.iterator()),
+    )
+    for batch in batched(feeds, batch_size):
+        invalidate_feed_counts(*batch)
+
+
+def rebuild_derived(stdout, batch_size):
+    """Пересчитывает то, что при обычном сохранении делают сигналы."""
+    call_command("rebuild_counters", stdout=stdout)
+    notifications.create_states(batch_size)
+    call_command("rebuild_search_index", stdout=stdout)
+    if timeline.is_enabled():
+        call_command("rebuild_timelines", stdout=stdout)
+    reset_caches(batch_size)
@@ -1,13 +1,343 @@
-from django.core.paginator import Paginator
+import base64
+import json
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core import routing
+
+
+FEED_COUNT_KEY = "feed_count:{}"
+
+
+def feed_count_key(feed):
+    return FEED_COUNT_KEY.format(feed)
+
+
+def invalidate_feed_counts(*feeds):
+    """Сбрасывает счётчики лент после коммита текущей транзакции.
+
+    Сброс до коммита даёт соседнему запросу снова посчитать ленту
+    по старым данным и положить устаревшее число в кэш.
+    """
+    keys = [feed_count_key(feed) for feed in feeds]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def batched(iterable, size):
+    """Режет поток на списки по size элементов, не читая его целиком."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def keep_auto_dates(model, fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты.
+
+    Меняет поле модели для всего процесса — только для команд.
+    """
+    fields = [model._meta.get_field(name) for name in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def encode_position(moment, pk, *extra):
+    """Курсор по ключу (дата, id): JSON в base64 без дополнения "="."""
+    raw = json.dumps([moment.isoformat(), pk, *extra])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_position(cursor, size=2):
+    """Ключ (дата, id, ...) из size значений или None для битого курсора."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        moment, pk, *extra = values
+        moment = parse_datetime(moment)
+    except (TypeError, ValueError):
+        return None
+    if len(values) != size or moment is None or not isinstance(pk, int):
+        return None
+    return (moment, pk, *extra)
+
+
+class OpenPage(Page):
+    """Страница ленты без точного числа записей: дальше есть, если
+    при выборке нашлась лишняя запись."""
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+
+class FeedPaginator(Paginator):
+    """Paginator, который берёт число записей ленты из кэша.
+
+    Если число уже известно (денормализованный счётчик), оно передаётся
+    в count и не запрашивается вовсе. Для лент больше
+    FEED_COUNT_EXACT_LIMIT COUNT(*) не считается: известно только, что
+    записей больше лимита. Тогда num_pages — число страниц в пределах
+    лимита, последней страницы нет, а дальше лимита можно идти кнопкой
+    «Следующая». Номера страниц выводятся окном.
+    """
+
+    ELLIPSIS = "…"
+
+    def __init__(
+        self, object_list, per_page, feed=None, count=None, **kwargs
+    ):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+        self.known_count = count
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if self.feed is None:
+            return self._count()
+        key = feed_count_key(self.feed)
+        cached = cache.get(key)
+        if cached is not None:
+            self.count_is_estimate = cached[1]
+            return cached[0]
+        # Кэш сброшен записью, которую реплика может ещё не видеть.
+        with routing.primary_reads():
+            count = self._count()
+        cache.set(
+            key, (count, self.count_is_estimate), settings.FEED_COUNT_TIMEOUT
+        )
+        return count
+
+    def _count(self):
+        if not hasattr(self.object_list, "order_by"):
+            return len(self.object_list)
+        limit = settings.FEED_COUNT_EXACT_LIMIT
+        queryset = self.object_list.order_by()
+        count = queryset[:limit + 1].count()
+        if count > limit:
+            # Оценка снизу: записей не меньше limit + 1.
+            self.count_is_estimate = True
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # За оценкой страницы могут быть; пустую отбросит page.
+            if not self.count_is_estimate or int(number) < 1:
+                raise
+            return int(number)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            return self.page(self.num_pages)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage("That page contains no results")
+        more = len(items) > self.per_page
+        return OpenPage(items[:self.per_page], number, self, more)
+
+    def get_page_window(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей, края и многоточия между ними."""
+        number = self.validate_number(number)
+        if self.count_is_estimate:
+            yield from self._open_page_window(number, on_each_side, on_ends)
+            return
+        if self.num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def _open_page_window(self, number, on_each_side, on_ends):
+        """Окно без последней страницы: сколько их всего, неизвестно."""
+        if number > on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        last = min(number + on_each_side, self.num_pages)
+        yield from range(number + 1, last + 1)
+        yield self.ELLIPSIS
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Страница N стоит столько же, сколько первая: выборка идёт
+    по индексу от курсора, а не от начала ленты.
+    """
+
+    NEXT = "n"
+    PREVIOUS = "p"
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(post, direction):
+        return encode_position(post.pub_date, post.pk, direction)
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Возвращает (pub_date, id, direction) или None для битого курсора."""
+        position = decode_position(cursor, size=3)
+        if position is None:
+            return None
+        if position[2] not in (CursorPaginator.NEXT, CursorPaginator.PREVIOUS):
+            return None
+        return position
+
+    @staticmethod
+    def after(queryset, pub_date, pk):
+        """Записи ленты, идущие после (pub_date, pk), новые первыми."""
+        return queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        ).order_by("-pub_date", "-pk")
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._page(
+                self.queryset.order_by("-pub_date", "-pk"), cursor_used=False
+            )
+        pub_date, pk, direction = position
+        if direction == self.NEXT:
+            queryset = self.after(self.queryset, pub_date, pk)
+            return self._page(queryset, cursor_used=True)
+        queryset = self.queryset.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).order_by("pub_date", "pk")
+        return self._page(queryset, cursor_used=True, backwards=True)
+
+    def _page(self, queryset, cursor_used, backwards=False):
+        # Берём на одну запись больше, чтобы узнать, есть ли что-то дальше.
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if backwards:
+            object_list.reverse()
+            return CursorPage(
+                object_list, self, has_next=True, has_previous=has_more
+            )
+        return CursorPage(
+            object_list, self, has_next=has_more, has_previous=cursor_used
+        )
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f"<Cursor page of {len(self)} objects>"
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(
+            self.object_list[-1], CursorPaginator.NEXT
+        )
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(
+            self.object_list[0], CursorPaginator.PREVIOUS
+        )
+
+
+def cursor_paginator_out(queryset, request):
+    paginator = CursorPaginator(queryset, settings.NUMBER_POSTS)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
+    return {
+        'paginator': paginator,
+        'cursor': cursor,
+        'page_obj': page_obj,
+    }
 
 
-def paginator_out(queryset, request):
-    paginator = Paginator(queryset, settings.NUMBER_POSTS)
+def paginator_out(queryset, request, feed=None, count=None):
+    # Ленты без queryset (материализованная лента подписок) читаются
+    # срезами, поэтому только постранично.
+    if settings.PAGINATION_MODE == 'cursor' and hasattr(queryset, "filter"):
+        return cursor_paginator_out(queryset, request)
+    paginator = FeedPaginator(
+        queryset, settings.NUMBER_POSTS, feed=feed, count=count
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        'page_range': list(paginator.get_page_window(page_obj.number)),
     }
@@ -1,60 +1,134 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from posts.utils import paginator_out
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+
+from core.db import write_transaction
+from core.routing import replica_reads
+from posts import comment_pages, notifications, thumbnails, timeline
+from posts.page_cache import anonymous_page_cache
+from posts.counters import get_user_counters
+from posts.search import SearchResults
+from posts.utils import FeedPaginator, paginator_out
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Follow
 
 
+@anonymous_page_cache("index")
+@replica_reads
 def index(request):
-    posts = Post.objects.select_related("group").all()
+    posts = Post.objects.feed()
     context = {"index": True}
-    context.update(paginator_out(posts, request))
+    context.update(paginator_out(posts, request, feed="index"))
     return render(request, "posts/index.html", context)
 
 
+@anonymous_page_cache("group:{slug}")
+@replica_reads
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.feed()
     context = {
         "group": group,
     }
-    context.update(paginator_out(posts, request))
+    context.update(paginator_out(posts, request, feed=f"group:{group.pk}"))
     return render(request, "posts/group_list.html", context)
 
 
+@anonymous_page_cache("profile:{username}")
+@replica_reads
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("counters"), username=username
+    )
+    counters = get_user_counters(author)
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(author=author, user=request.user).exists()
     )
-    posts = Post.objects.filter(author=author)
-    context = {"author": author, "following": following}
-    context.update(paginator_out(posts, request))
+    posts = author.posts.feed()
+    context = {
+        "author": author,
+        "following": following,
+        "counters": counters,
+    }
+    context.update(
+        paginator_out(posts, request, count=counters.posts_count)
+    )
     return render(request, "posts/profile.html", context)
 
 
+@anonymous_page_cache("post:{post_id}")
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related("author__counters", "group"), id=post_id
+    )
+    comments, next_cursor = comment_pages.first_page(post.pk)
     form = CommentForm(request.POST or None, files=request.FILES or None)
     context = {
         "post": post,
         "form": form,
         "comments": comments,
+        "next_cursor": next_cursor,
         "post_id": post_id,
+        "author_counters": get_user_counters(post.author),
     }
     return render(request, "posts/post_detail.html", context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    comments, next_cursor = comment_pages.get_page(
+        post_id, request.GET.get("after")
+    )
+    context = {
+        "comments": comments,
+        "next_cursor": next_cursor,
+        "post_id": post_id,
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
+@write_transaction
+def _write_post(post, new_image, update_fields):
+    post.save(update_fields=update_fields)
+    if new_image:
+        thumbnails.schedule(post)
+
+
+def save_post(post, new_image=True, update_fields=None):
+    """Сохраняет пост; новую картинку пишет в хранилище до транзакции.
+
+    Блокировка записи SQLite не ждёт работы с файлом, а при ошибке
+    записи строки файл удаляется и не остаётся в хранилище сиротой.
+    update_fields ограничивает UPDATE правки полями формы: счётчик
+    комментариев и версию, сдвинутые через F() за время правки,
+    сохранение не перезаписывает.
+    """
+    stored = None
+    if post.image and not post.image._committed:
+        post.image.save(post.image.name, post.image.file, save=False)
+        stored = post.image.name
+    try:
+        _write_post(post, new_image, update_fields)
+    except Exception:
+        if stored:
+            post.image.storage.delete(stored)
+        raise
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        save_post(post)
         user_name = request.user
         return redirect("posts:profile", user_name)
     return render(request, "posts/creat_post.html", {"form": form})
@@ -71,7 +145,11 @@ def post_edit(request, post_id):
         request.POST or None, instance=post, files=request.FILES or None
     )
     if form.is_valid():
-        form.save()
+        save_post(
+            form.save(commit=False),
+            "image" in form.changed_data,
+            update_fields=list(form.fields),
+        )
         return redirect("posts:post_detail", post_id=post_id)
     context = {
         "form": form,
@@ -89,31 +167,64 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write_transaction(comment.save)()
     return redirect("posts:post_detail", post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
     user = request.user
-    authors = user.follower.all().values("author")
-    posts = Post.objects.filter(author__in=authors)
+    posts = timeline.follow_feed(user)
     context = {"follow": True}
-    context.update(paginator_out(posts, request))
+    context.update(paginator_out(posts, request, feed=f"follow:{user.pk}"))
     return render(request, "posts/follow.html", context)
 
 
 @login_required
+@require_POST
+@write_transaction
+def follow_seen(request):
+    """Обнуляет счётчик новых постов: лента подписок открыта.
+
+    Страница ленты отправляет запрос сама, поэтому view ленты только
+    читает и может идти на реплику.
+    """
+    notifications.mark_seen(request.user)
+    return HttpResponse(status=204)
+
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    # Выдача упорядочена по релевантности, поэтому только постранично.
+    paginator = FeedPaginator(SearchResults(query), settings.NUMBER_POSTS)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    context = {
+        "query": query,
+        "query_string": urlencode({"q": query}) + "&",
+        "paginator": paginator,
+        "page_obj": page_obj,
+        "page_range": list(paginator.get_page_window(page_obj.number)),
+    }
+    return render(request, "posts/search.html", context)
+
+
+@login_required
+@write_transaction
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    # если убираю проверку pytest не проходит
-    follow = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not follow.exists():
-        Follow.objects.get_or_create(user=request.user, author=author)
+    if request.user != author:
+        # Повторную подписку отбивает уникальный индекс (user, author).
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect("posts:profile", username=author)
 
 
 @login_required
+@write_transaction
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
@@ -0,0 +1,20 @@
+from django.contrib.auth import backends, get_user_model
+
+User = get_user_model()
+
+
+class ModelBackend(backends.ModelBackend):
+    """Грузит пользователя сессии вместе со счётчиком уведомлений.
+
+    Шапка каждой страницы показывает число новых постов подписок;
+    с join оно приходит тем же запросом, что и сам пользователь.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related(
+                "notification_state"
+            ).get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
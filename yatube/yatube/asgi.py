@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 has no ASGI support of its own: core.asgi.ASGIHandler runs
+the regular WSGI handler in a thread pool. Serve it with any ASGI
+server, e.g. ``uvicorn yatube.asgi:application``.
+"""
+
+import os
+
+from core.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = ASGIHandler()
+
+# Шаблоны разбираются до первого запроса (TEMPLATE_CACHE).
+from core.warmup import warm_up  # noqa: E402
+
+warm_up()
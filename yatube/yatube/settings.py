@@ -34,14 +34,100 @@ ALLOWED_HOSTS = [
 
 # yatube/settings.py
 
+AUTHENTICATION_BACKENDS = ["users.backends.ModelBackend"]
+
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:index"
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = "django.core.mail.backends.filebased.Email"
+EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+DEFAULT_FROM_EMAIL = "Yatube <noreply@yatube.local>"
+# Адрес сайта для ссылок в письмах.
+SITE_URL = os.getenv("YATUBE_SITE_URL", "http://127.0.0.1:8000")
+
+# Дайджест новых постов подписок (posts.notifications, manage.py
+# send_digests): письмо пользователю не чаще раза в DIGEST_MIN_INTERVAL
+# секунд и не больше DIGEST_MAX_POSTS постов в нём.
+DIGEST_MIN_INTERVAL = 6 * 60 * 60
+DIGEST_MAX_POSTS = 20
+DIGEST_BATCH_SIZE = 200
 
 NUMBER_POSTS = 10
 
+# "page" — номера страниц (OFFSET), "cursor" — по ключу (pub_date, id)
+PAGINATION_MODE = "page"
+
+# Число записей ленты хранится в кэше и сбрасывается при изменении постов;
+# ленты длиннее лимита не считаются целиком: известно только, что записей
+# больше лимита (оценка снизу), и последней страницы у них нет.
+FEED_COUNT_TIMEOUT = 60 * 60
+FEED_COUNT_EXACT_LIMIT = 10000
+
+# Материализованная лента подписок: посты раскладываются по лентам
+# подписчиков при публикации. Авторы с FOLLOW_FEED_FANOUT_LIMIT подписчиков
+# и больше не раскладываются и подмешиваются при чтении, пока подписчиков
+# не станет меньше FOLLOW_FEED_PUSH_LIMIT (не больше FANOUT_LIMIT).
+FOLLOW_FEED_MATERIALIZED = False
+FOLLOW_FEED_FANOUT_LIMIT = 1000
+FOLLOW_FEED_PUSH_LIMIT = 800
+FOLLOW_FEED_BATCH_SIZE = 500
+
+# ASGI-вход (yatube/asgi.py, core.asgi): view выполняются в пуле потоков,
+# куски потокового ответа передаются через очередь ограниченной длины.
+ASGI_THREADS = 20
+ASGI_RESPONSE_QUEUE_SIZE = 16
+
+# Кэш целых страниц лент для анонимных пользователей (posts.page_cache).
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Комментарии на странице поста идут порциями по ключу (created, id);
+# первая порция кэшируется до нового комментария (posts.comment_pages).
+COMMENTS_PER_PAGE = 20
+COMMENTS_CACHE_TIMEOUT = 60 * 10
+
+# Замеры запросов (core.middleware.PerformanceMiddleware): Server-Timing,
+# гистограммы по view на /stats/perf/ и строки лога core.perf. Запросы
+# дольше PERF_SLOW_REQUEST_MS пишутся с уровнем INFO, остальные — DEBUG.
+PERF_INSTRUMENTATION = True
+PERF_SERVER_TIMING = True
+PERF_SLOW_REQUEST_MS = 500
+
+# Журнал медленных SQL-запросов (core.querylog): запросы дольше
+# QUERY_LOG_SLOW_MS пишутся с планом в QUERY_LOG_FILE, отчёт по нему —
+# manage.py slow_queries. Сводка по отпечаткам процесса — /stats/queries/.
+QUERY_LOG_ENABLED = True
+QUERY_LOG_SLOW_MS = 100
+QUERY_LOG_FILE = os.path.join(BASE_DIR, "slow_queries.log")
+QUERY_LOG_FINGERPRINTS = 200
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.perf": {
+            "handlers": ["console"],
+            "level": os.getenv("YATUBE_PERF_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        "core.querylog": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
+# Базовая линия замеров страниц: manage.py benchmark_views --check.
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+
+# JSON API (api): размер страницы задаётся ?limit= не больше максимума.
+API_MAX_PAGE_SIZE = 100
+
 
 # Application definition
 
@@ -50,6 +136,7 @@ INSTALLED_APPS = [
     "core.apps.CoreConfig",
     "users.apps.UsersConfig",
     "posts.apps.PostsConfig",
+    "api.apps.ApiConfig",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -60,6 +147,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.PerformanceMiddleware",
+    "core.middleware.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -73,6 +162,14 @@ ROOT_URLCONF = "yatube.urls"
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
+# Производственный режим шаблонов (по умолчанию без DEBUG): разобранные
+# шаблоны хранит cached.Loader, а yatube/wsgi.py и yatube/asgi.py
+# загружают их все при старте процесса (core.warmup). Без него Django
+# сам кэширует шаблоны только при DEBUG = False.
+TEMPLATE_CACHE = os.getenv(
+    "YATUBE_TEMPLATE_CACHE", "0" if DEBUG else "1"
+) == "1"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -85,10 +182,24 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "core.context_processors.year.year",
+                "core.context_processors.notifications.unread_posts",
+                "core.context_processors.nav.nav",
             ],
         },
     },
 ]
+TEMPLATE_CACHED_LOADERS = [
+    (
+        "django.template.loaders.cached.Loader",
+        [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    ),
+]
+if TEMPLATE_CACHE:
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = TEMPLATE_CACHED_LOADERS
 
 WSGI_APPLICATION = "yatube.wsgi.application"
 
@@ -96,13 +207,58 @@ WSGI_APPLICATION = "yatube.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль SQLite выбирается переменной окружения YATUBE_SQLITE:
+# "production" — WAL, постоянные соединения и ожидание занятой базы
+# (по умолчанию без DEBUG), "default" — настройки SQLite и Django
+# как есть (по умолчанию с DEBUG). PRAGMA применяются к каждому новому
+# соединению (core.db).
+SQLITE_PROFILE = os.environ.get(
+    "YATUBE_SQLITE", "default" if DEBUG else "production"
+)
+SQLITE_PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        # Отрицательное значение — размер в килобайтах.
+        "cache_size": -64 * 1024,
+        "busy_timeout": 5000,
+    },
+    "default": {},
+}
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+
+# Пишущие view (core.db.write_transaction): записи потоков процесса идут
+# по очереди, BEGIN IMMEDIATE, упавший на "database is locked", повторяется.
+SQLITE_SERIALIZE_WRITES = True
+SQLITE_WRITE_RETRIES = 5
+SQLITE_WRITE_RETRY_DELAY = 0.05
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "CONN_MAX_AGE": 60 if SQLITE_PROFILE == "production" else 0,
     }
 }
 
+# Реплики для чтения лент (core.routing): пути к копиям базы через запятую
+# в YATUBE_DB_REPLICAS, копии обновляет внешняя репликация. После записи
+# браузер REPLICA_PIN_SECONDS читает только основную базу.
+DATABASE_REPLICAS = []
+for _number, _path in enumerate(
+    filter(None, os.environ.get("YATUBE_DB_REPLICAS", "").split(","))
+):
+    DATABASES[f"replica{_number}"] = {
+        **DATABASES["default"],
+        "NAME": _path,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_number}")
+DATABASE_ROUTERS = ["core.routing.ReplicaRouter"]
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = "pin_primary"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -150,8 +306,74 @@ CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+# Уровень кэша выбирается переменной окружения YATUBE_CACHE:
+# "locmem" — свой кэш у каждого процесса (по умолчанию),
+# "file" — общий файловый кэш для всех воркеров машины,
+# "tiered" — файловый кэш и перед ним небольшой LRU в памяти процесса.
+CACHE_TIER = os.environ.get("YATUBE_CACHE", "locmem")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+
+_SHARED_CACHE = {
+    "BACKEND": "core.cache.FileBasedCache",
+    "LOCATION": CACHE_DIR,
+    "OPTIONS": {"MAX_ENTRIES": 50000},
 }
+
+if CACHE_TIER == "file":
+    CACHES = {"default": _SHARED_CACHE}
+elif CACHE_TIER == "tiered":
+    CACHES = {
+        "default": {
+            "BACKEND": "core.cache.TieredCache",
+            "LOCATION": "l1",
+            "OPTIONS": {
+                "L2": "shared",
+                "L1_MAX_ENTRIES": 2000,
+                "L1_TIMEOUT": 5,
+            },
+        },
+        "shared": _SHARED_CACHE,
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "core.cache.LocMemCache",
+        }
+    }
+
+# Миниатюры картинок постов строятся заранее воркером очереди задач
+# (posts.thumbnails); адреса готовых вариантов берут шаблоны.
+# THUMBNAIL_WORKERS — потоки manage.py generate_thumbnails.
+# Карточка строится в каждой ширине THUMBNAIL_WIDTHS и в каждом формате
+# THUMBNAIL_FORMATS, который поддерживают Pillow и sorl-thumbnail.
+# В режиме отладки (и в тестах) миниатюры строятся сразу после коммита:
+# фоновые потоки переживают запрос и пишут в MEDIA_ROOT, когда тест
+# уже удаляет свою временную папку.
+THUMBNAIL_ASYNC = os.getenv(
+    "YATUBE_THUMBNAIL_ASYNC", "0" if DEBUG else "1"
+) == "1"
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_CARD_SIZE = (960, 339)
+THUMBNAIL_WIDTHS = (480, 960)
+THUMBNAIL_FORMATS = ("WEBP", "JPEG")
+
+# Очередь задач в таблице базы (core.tasks): поиск, миниатюры, раскладку
+# лент и счётчики уведомлений после записи выполняет воркер
+# manage.py run_tasks. В режиме отладки (и в тестах) задача выполняется
+# сразу при постановке.
+TASKS_EAGER = os.getenv("YATUBE_TASKS_EAGER", "1" if DEBUG else "0") == "1"
+TASKS_BATCH_SIZE = 100
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_LEASE_SECONDS = 5 * 60
+TASKS_POLL_INTERVAL = 1.0
+TASKS_KEEP_DONE = 7 * 24 * 60 * 60
+
+# Полнотекстовый поиск (posts.search): FTS5 для SQLite,
+# posts.search.SimpleBackend для остальных баз.
+SEARCH_BACKEND = "posts.search.FTS5Backend"
+SEARCH_REBUILD_BATCH_SIZE = 1000
+
+# Загруженные картинки уменьшаются до этой стороны и теряют EXIF.
+IMAGE_UPLOAD_MAX_SIDE = 2048
+IMAGE_UPLOAD_QUALITY = 85